@@ -1,7 +1,7 @@
 """
 app.py — Screener FCF Yield "Antigravity"
 Dashboard profissional para Streamlit Cloud.
-Dados carregados de CSVs pré-gerados (atualizados diariamente via GitHub Actions).
+Dados carregados de snapshots Parquet pré-gerados (atualizados diariamente via GitHub Actions).
 """
 
 import streamlit as st
@@ -12,8 +12,14 @@ import plotly.graph_objects as go
 import json
 import os
 from pathlib import Path
-from datetime import datetime, timezone
-from engine import run_screener, COMMODITY_SECTORS
+from datetime import datetime
+from engine import EXPANSION_TRIGGER, YIELD_TARGET, COMMODITY_YIELD_TARGET, FAIR_BAND
+from snapshot import compact_frame
+from filter_index import FilterIndex
+from shared_snapshot import SharedSnapshot
+from history import load_history
+from refresh_worker import RefreshWorker
+from scenario import Scenario, Components, apply as apply_scenario, sensitivity
 
 # ─────────────────────────────────────────
 # Page Config
@@ -28,11 +34,11 @@ st.set_page_config(
 # ─────────────────────────────────────────
 # Data Paths
 # ─────────────────────────────────────────
-DATA_DIR = Path(__file__).parent / "data"
-CSV_NORMAL = DATA_DIR / "screener_normal.csv"
-CSV_CONSERVATIVE = DATA_DIR / "screener_conservative.csv"
+DATA_DIR = Path(os.environ.get("SCREENER_DATA_DIR", Path(__file__).parent / "data"))
 METADATA_FILE = DATA_DIR / "metadata.json"
 
+REFRESH_POLL_INTERVAL = 1.0  # seconds between refresh status polls
+
 # ─────────────────────────────────────────
 # Custom CSS — Premium Dark Theme
 # ─────────────────────────────────────────
@@ -287,12 +293,286 @@ st.markdown("""
 # ─────────────────────────────────────────
 # Load cached data
 # ─────────────────────────────────────────
-@st.cache_data(ttl=3600)
-def load_cached_data(csv_path: str) -> pd.DataFrame:
-    """Load pre-generated CSV data. Returns empty DataFrame if file doesn't exist."""
-    if os.path.exists(csv_path):
-        return pd.read_csv(csv_path)
-    return pd.DataFrame()
+@st.cache_resource
+def get_shared_snapshot() -> SharedSnapshot:
+    """
+    Process-wide holder of the published snapshots: both modes loaded once,
+    compact and indexed for every filter / KPI of the page, and shared
+    read-only by every session. A new publication (new data_version in
+    metadata.json) is swapped in on the first rerun after it lands, and is
+    never re-read otherwise (see shared_snapshot.py).
+    """
+    return SharedSnapshot(DATA_DIR)
+
+
+@st.cache_resource(max_entries=16)
+def load_scenario_index(_base: FilterIndex, version: str, mode: str, scenario_key: str,
+                        _scenario: Scenario) -> FilterIndex:
+    """Snapshot re-ranked under a what-if scenario (no refetch, see scenario.py)."""
+    return FilterIndex.build(compact_frame(apply_scenario(_base.df, _scenario)),
+                             version=f"{version}:{scenario_key}")
+
+
+@st.cache_resource(max_entries=4)
+def load_components(_index: FilterIndex, version: str, mode: str) -> Components:
+    """Raw FCF components of a snapshot, aligned with its FilterIndex rows."""
+    return Components.from_frame(_index.df)
+
+
+@st.cache_data(max_entries=16)
+def memory_usage(_snapshot, _index: FilterIndex, _components: Components, version: str,
+                 mode: str, scenario_key: str | None) -> tuple[int, int]:
+    """
+    (bytes shared by every session: both snapshots + indexes, bytes this
+    view adds on top: the mode's components and the scenario index, if any).
+    """
+    view = _components.memory_bytes() + (_index.memory_bytes() if scenario_key else 0)
+    return _snapshot.memory_bytes(), view
+
+
+@st.cache_data(max_entries=32)
+def load_yield_history(mode: str, version: str, tickers: tuple[str, ...]) -> pd.DataFrame:
+    """FCF Yield history of the selected tickers (see history.py)."""
+    return load_history(mode, tickers=list(tickers),
+                        columns=['Date', 'Ticker', 'FCF Yield', 'Status'],
+                        history_dir=DATA_DIR / "history")
+
+
+# ─────────────────────────────────────────
+# Render cache (tables / figures per data version + filter state)
+# ─────────────────────────────────────────
+RENDER_CACHE_ENTRIES = 64
+
+
+def _view(index: FilterIndex, market, status, ascending, sectors=None) -> pd.DataFrame:
+    mask = index.mask(market=market, status=status,
+                      sectors=list(sectors) if sectors is not None else None)
+    return index.select(mask, ascending=ascending)
+
+
+def _scaled(values: pd.Series, factor: float) -> pd.Series:
+    """values / factor, with 0 shown as empty like missing values."""
+    v = values.astype(float) / factor
+    return v.mask(v == 0)
+
+
+@st.cache_resource(max_entries=RENDER_CACHE_ENTRIES)
+def render_ranking(_index: FilterIndex, version: str, mode: str, market, status,
+                   ascending: bool, sectors: tuple | None):
+    """Ranking table (typed columns) + column config for one view."""
+    table_df = _view(_index, market, status, ascending, sectors)
+
+    display_cols = ['Ticker', 'Preço', 'FCF Yield', 'FCF Yield Mediana 5A', 'Volatilidade FCF',
+                    'Status', 'Rev Growth 5Y', 'Setor', 'Market Cap', 'FCF']
+    if 'Ajuste Expansão' in table_df.columns:
+        display_cols.append('Ajuste Expansão')
+    if 'Base' in table_df.columns:
+        display_cols.append('Base')
+    display = table_df[[c for c in display_cols if c in table_df.columns]].copy()
+
+    # Vectorized scaling; number formats are applied by the grid itself
+    display['FCF Yield'] = table_df['FCF Yield'].astype(float) * 100
+    display['Rev Growth 5Y'] = table_df['Rev Growth 5Y'].astype(float) * 100
+    for col in ('FCF Yield Mediana 5A', 'Volatilidade FCF'):   # older snapshots lack them
+        if col in display.columns:
+            display[col] = table_df[col].astype(float) * 100
+    display['Market Cap'] = _scaled(table_df['Market Cap'], 1e9)
+    display['FCF'] = _scaled(table_df['FCF'], 1e9)
+    display['Preço'] = _scaled(table_df['Preço'], 1)
+    if 'Ajuste Expansão' in display.columns:
+        display['Ajuste Expansão'] = np.where(
+            display['Ajuste Expansão'].fillna(False).astype(bool), "⚠️ Sim", "–"
+        )
+
+    col_config = {
+        "Ticker": st.column_config.TextColumn("Ativo", width="small"),
+        "Preço": st.column_config.NumberColumn("Preço", width="small", format="%.2f"),
+        "FCF Yield": st.column_config.NumberColumn("FCF Yield", width="small", format="%.2f%%"),
+        "FCF Yield Mediana 5A": st.column_config.NumberColumn(
+            "Yield Mediano 5A", width="small", format="%.2f%%",
+            help="Mediana do FCF dos últimos 5 exercícios (até) ÷ market cap atual"),
+        "Volatilidade FCF": st.column_config.NumberColumn(
+            "Vol. Yield", width="small", format="%.2f pp",
+            help="Desvio-padrão do FCF Yield anual nos últimos 5 exercícios"),
+        "Status": st.column_config.TextColumn("Status", width="small"),
+        "Rev Growth 5Y": st.column_config.NumberColumn("Cresc. Receita 5A", width="small",
+                                                       format="%.2f%%"),
+        "Setor": st.column_config.TextColumn("Setor", width="medium"),
+        "Market Cap": st.column_config.NumberColumn("Market Cap", width="small", format="%.2f B"),
+        "FCF": st.column_config.NumberColumn("FCF", width="small", format="%.2f B"),
+    }
+    if 'Ajuste Expansão' in display.columns:
+        col_config["Ajuste Expansão"] = st.column_config.TextColumn("Ajuste Capex", width="small")
+    if 'Base' in display.columns:
+        col_config["Base"] = st.column_config.TextColumn(
+            "Base", width="small", help="TTM = soma dos últimos 4 trimestres; Anual = último balanço anual")
+    return display, col_config
+
+
+@st.cache_resource(max_entries=RENDER_CACHE_ENTRIES)
+def render_bubble_chart(_index: FilterIndex, version: str, mode: str, market, status,
+                        ascending: bool, targets: tuple = (YIELD_TARGET, COMMODITY_YIELD_TARGET)
+                        ) -> go.Figure:
+    """FCF Yield × revenue growth bubble chart for one view."""
+    chart_df = _view(_index, market, status, ascending)
+    chart_df['Yield %'] = chart_df['FCF Yield'] * 100
+    chart_df['Rev Growth %'] = chart_df['Rev Growth 5Y'] * 100
+    chart_df['MCap B'] = (chart_df['Market Cap'] / 1e9).clip(lower=1)
+
+    fig = px.scatter(
+        chart_df,
+        x='Yield %',
+        y='Rev Growth %',
+        size='MCap B',
+        color='Status',
+        hover_name='Ticker',
+        hover_data={
+            'Yield %': ':.2f',
+            'Rev Growth %': ':.2f',
+            'MCap B': ':.1f',
+            'Setor': True,
+            'Status': False,
+        },
+        color_discrete_map={
+            '🟢 Barato': '#00e676',
+            '🟡 Justo': '#ffab00',
+            '🔴 Caro': '#ff1744',
+        },
+        size_max=60,
+        template='plotly_dark',
+    )
+
+    for target in targets:
+        fig.add_vline(x=target * 100, line_dash="dot", line_color="rgba(255,255,255,0.2)",
+                      annotation_text=f"{target:.0%}",
+                      annotation_font_color="rgba(255,255,255,0.5)")
+    fig.add_hline(y=0, line_dash="solid", line_color="rgba(255,255,255,0.1)")
+
+    fig.update_layout(
+        xaxis_title="FCF Yield (%)",
+        yaxis_title="Crescimento Receita 5A (%)",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font={"family": "Inter", "size": 13, "color": "#ccc"},
+        legend_title_text="",
+        height=550,
+        margin={"l": 50, "r": 30, "t": 30, "b": 50},
+    )
+    return fig
+
+
+@st.cache_resource(max_entries=RENDER_CACHE_ENTRIES)
+def render_breakdown(_index: FilterIndex, version: str, mode: str, market, status,
+                     ascending: bool):
+    """FCF component breakdown (millions) + column config for one view."""
+    filtered_df = _view(_index, market, status, ascending)
+    detail_cols = ['Ticker', 'FCO', 'Δ Capital de Giro', 'Adjusted FCO', 'Capex', 'Capex (Raw)',
+                   'Depreciação', 'Juros', 'Impostos', 'Arrendamentos', 'FCF']
+    detail = filtered_df[[c for c in detail_cols if c in filtered_df.columns]].copy()
+    config = {}
+    for col in detail.columns:
+        if col == 'Ticker':
+            continue
+        detail[col] = _scaled(detail[col], 1e6)
+        config[col] = st.column_config.NumberColumn(col, format="%.0f M")
+    return detail, config
+
+
+SENSITIVITY_TARGETS = np.round(np.arange(0.05, 0.2001, 0.01), 3)
+SENSITIVITY_TRIGGERS = np.round(np.arange(1.0, 3.001, 0.1), 2)
+
+
+def _sensitivity_axis(scenario: Scenario) -> str:
+    """Second grid axis: the expansion trigger when it applies, else the commodity target."""
+    return 'expansion_trigger' if scenario.expansion_trigger is not None \
+        else 'commodity_yield_target'
+
+
+def _sensitivity_key(scenario: Scenario) -> tuple:
+    """The scenario parameters the grid does not vary, by name (its cache key)."""
+    gridded = ('yield_target', _sensitivity_axis(scenario))
+    return tuple((name, getattr(scenario, name)) for name in
+                 ('adjust_wc', 'fair_band', 'expansion_trigger', 'commodity_yield_target',
+                  'commodity_sectors') if name not in gridded)
+
+
+@st.cache_resource(max_entries=RENDER_CACHE_ENTRIES)
+def sensitivity_grid(_components: Components, version: str, mode: str, market,
+                     fixed_key: tuple, _scenario: Scenario) -> pd.DataFrame:
+    """
+    🟢 Baratos for every (general target × second axis) cell. Keyed only on
+    the parameters that are not gridded (_sensitivity_key), so moving a
+    gridded slider reuses it.
+    """
+    y_name = _sensitivity_axis(_scenario)
+    y_values = SENSITIVITY_TRIGGERS if y_name == 'expansion_trigger' else SENSITIVITY_TARGETS
+    grid = sensitivity(_components, _scenario, yield_target=SENSITIVITY_TARGETS,
+                       **{y_name: y_values})
+    return grid.pivot(index=y_name, columns='yield_target', values='🟢 Barato')
+
+
+def render_sensitivity(z: pd.DataFrame, scenario: Scenario) -> go.Figure:
+    """Heatmap of the sensitivity grid with the active scenario marked."""
+    y_name = _sensitivity_axis(scenario)
+    y_scale = 1 if y_name == 'expansion_trigger' else 100
+    y_label = "Gatilho de Expansão (× Depreciação)" if y_name == 'expansion_trigger' \
+        else "Yield Alvo — Commodities (%)"
+
+    fig = go.Figure(go.Heatmap(
+        z=z.to_numpy(), x=z.columns * 100, y=z.index * y_scale,
+        colorscale='Viridis', colorbar={"title": "Baratos"},
+        hovertemplate="Alvo geral %{x:.0f}% · %{y}<br>%{z} baratos<extra></extra>",
+    ))
+    fig.add_trace(go.Scatter(
+        x=[scenario.yield_target * 100], y=[getattr(scenario, y_name) * y_scale],
+        mode='markers', marker={"symbol": "x", "size": 14, "color": "#ff1744"},
+        hoverinfo='skip',
+    ))
+    fig.update_layout(
+        xaxis_title="Yield Alvo — Geral (%)",
+        yaxis_title=y_label,
+        template='plotly_dark',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font={"family": "Inter", "size": 13, "color": "#ccc"},
+        showlegend=False,
+        height=500,
+        margin={"l": 50, "r": 30, "t": 30, "b": 50},
+    )
+    return fig
+
+
+@st.cache_resource
+def get_refresh_worker() -> RefreshWorker:
+    """Process-wide refresh worker shared by every session."""
+    return RefreshWorker(DATA_DIR)
+
+
+@st.fragment(run_every=REFRESH_POLL_INTERVAL)
+def refresh_status():
+    """Progress + partial ranking of the running refresh; reruns the app when it ends."""
+    job = get_refresh_worker().current
+    if job is None or not job.running:
+        st.rerun()
+    st.progress(job.completed / max(job.total, 1),
+                text=f"⏳ Processando {job.completed}/{job.total} ativos "
+                     f"({job.concurrency} em paralelo)...")
+    if job.partial is None:
+        return
+    part = job.partial[1] if conservative else job.partial[0]
+    if part.empty:
+        return
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Calculados", f"{len(part)}/{job.total}")
+    c2.metric("🟢 Baratos", int((part['Status'] == '🟢 Barato').sum()))
+    c3.metric("Yield mediano", f"{part['FCF Yield'].median():.2%}")
+    c4.metric("Maior Yield", part['Ticker'].iloc[0], f"{part['FCF Yield'].iloc[0]:.2%}")
+    st.dataframe(
+        part[['Ticker', 'Preço', 'FCF Yield', 'Status', 'Setor']].head(25),
+        use_container_width=True,
+        hide_index=True,
+        column_config={"FCF Yield": st.column_config.NumberColumn(format="percent")},
+    )
 
 
 def get_last_updated() -> str:
@@ -323,10 +603,36 @@ with st.sidebar:
         value=False,
         help=(
             "**Ajuste de Capital de Giro**: Subtrai Δ Working Capital do FCO.\n\n"
-            "**Ajuste de Expansão**: Se Capex > 1.5× Depreciação → Capex = Depreciação."
+            f"**Ajuste de Expansão**: Se Capex > "
+            f"{st.session_state.get('sc_trigger', EXPANSION_TRIGGER):g}× Depreciação "
+            f"→ Capex = Depreciação."
         ),
     )
 
+    # What-if scenario (recomputed from the snapshot's raw components)
+    SCENARIO_DEFAULTS = {"sc_trigger": EXPANSION_TRIGGER, "sc_target": YIELD_TARGET * 100,
+                         "sc_commodity": COMMODITY_YIELD_TARGET * 100,
+                         "sc_band": FAIR_BAND * 100}
+
+    for key, value in SCENARIO_DEFAULTS.items():
+        st.session_state.setdefault(key, value)
+
+    def reset_scenario():
+        st.session_state.update(SCENARIO_DEFAULTS)
+
+    with st.expander("🧪 Cenário (e se...?)", expanded=False):
+        sc_trigger = st.slider(
+            "Gatilho de Expansão (× Depreciação)", 1.0, 3.0, step=0.1, key="sc_trigger",
+            disabled=not conservative,
+            help="Capex acima deste múltiplo da Depreciação é tratado como expansão "
+                 "(só no Modo Conservador).",
+        )
+        sc_target = st.slider("Yield Alvo — Geral (%)", 5.0, 20.0, step=0.5, key="sc_target")
+        sc_commodity = st.slider("Yield Alvo — Commodities (%)", 5.0, 25.0, step=0.5,
+                                 key="sc_commodity")
+        sc_band = st.slider("Faixa \"Justo\" (% do alvo)", 50.0, 95.0, step=5.0, key="sc_band")
+        st.button("↺ Restaurar padrão", on_click=reset_scenario, use_container_width=True)
+
     st.markdown("---")
 
     # Filter preference
@@ -384,71 +690,72 @@ with st.sidebar:
     )
 
 # ─────────────────────────────────────────
-# Load Data (from CSV or live refresh)
+# Load Data (from snapshot or live refresh)
 # ─────────────────────────────────────────
-csv_path = str(CSV_CONSERVATIVE if conservative else CSV_NORMAL)
+mode = "conservative" if conservative else "normal"
 
+worker = get_refresh_worker()
 if refresh_btn:
-    # ── Live refresh from Yahoo Finance ──
+    # ── Hand the refresh to the shared worker (joins one already running) ──
     from update_data import ALL_TICKERS
-    st.cache_data.clear()
-
-    progress_bar = st.progress(0, text="⏳ Conectando ao Yahoo Finance...")
-    status_text = st.empty()
-    total = len(ALL_TICKERS)
-
-    def update_progress(current, total_count):
-        pct = current / total_count
-        progress_bar.progress(pct, text=f"⏳ Processando {current}/{total_count} ativos...")
-
-    # Fetch data for the selected mode
-    status_text.info(f"🔄 Buscando dados {'(Modo Conservador)' if conservative else '(Modo Normal)'}...")
-    df = run_screener(ALL_TICKERS, conservative=conservative, progress_callback=update_progress)
-
-    if not df.empty:
-        # Save to CSV
-        os.makedirs(str(DATA_DIR), exist_ok=True)
-        df.to_csv(csv_path, index=False)
-
-        # Also fetch the other mode
-        other_conservative = not conservative
-        other_csv = str(CSV_CONSERVATIVE if other_conservative else CSV_NORMAL)
-        status_text.info(f"🔄 Buscando dados {'(Modo Conservador)' if other_conservative else '(Modo Normal)'}...")
-        progress_bar.progress(0, text="⏳ Buscando segundo modo...")
-        df_other = run_screener(ALL_TICKERS, conservative=other_conservative, progress_callback=update_progress)
-        if not df_other.empty:
-            df_other.to_csv(other_csv, index=False)
-
-        # Update metadata
-        now = datetime.now(timezone.utc)
-        meta = {
-            "last_updated": now.isoformat(),
-            "tickers_total": len(ALL_TICKERS),
-            "tickers_normal_ok": len(df) if not conservative else len(df_other) if not df_other.empty else 0,
-            "tickers_conservative_ok": len(df) if conservative else len(df_other) if not df_other.empty else 0,
-        }
-        pd.Series(meta).to_json(str(METADATA_FILE))
-
-        progress_bar.empty()
-        status_text.success(f"✅ Dados atualizados! {len(df)} ativos processados.")
+    st.session_state.refresh_job = worker.submit(ALL_TICKERS).id
+
+job = worker.current
+if job is not None and job.running:
+    refresh_status()
+elif job is not None and st.session_state.get("refresh_job") == job.id:
+    if job.state == 'done':
+        st.success(f"✅ Dados atualizados! {job.rows} ativos processados.")
     else:
-        progress_bar.empty()
-        status_text.error("❌ Erro ao buscar dados. Tente novamente em alguns minutos.")
-        st.stop()
-else:
-    # ── Load from cached CSV ──
-    df = load_cached_data(csv_path)
-
-    if df.empty:
+        st.error("❌ Erro ao buscar dados. Tente novamente em alguns minutos.")
+    del st.session_state.refresh_job
+
+# ── Shared snapshot (swapped process-wide when a refresh publishes) ──
+# One reference for the whole rerun: a swap mid-run never mixes versions
+snapshot = get_shared_snapshot().current()
+version = snapshot.version
+base_index = index = snapshot[mode]
+components = load_components(base_index, version, mode)
+
+# ── What-if scenario: same snapshot, re-ranked with the sidebar parameters ──
+scenario = Scenario.for_mode(
+    conservative,
+    expansion_trigger=round(sc_trigger, 2) if conservative else None,
+    yield_target=round(sc_target / 100, 4),
+    commodity_yield_target=round(sc_commodity / 100, 4),
+    fair_band=round(sc_band / 100, 4),
+)
+scenario_active = scenario != Scenario.for_mode(conservative)
+if scenario_active:
+    index = load_scenario_index(base_index, version, mode, scenario.key, scenario)
+df = index.df
+
+if df.empty:
+    if job is None or not job.running:
         st.error(
             "❌ Dados ainda não disponíveis.\n\n"
             "Clique em **🔄 Atualizar Dados Agora** na barra lateral para buscar os dados."
         )
-        st.stop()
+    st.stop()
 
 # Show data freshness
 last_updated = get_last_updated()
 st.markdown(f'<div class="freshness">📅 Dados de: <b>{last_updated}</b> · {len(df)} ativos analisados · Atualização automática a cada 24h</div>', unsafe_allow_html=True)
+if scenario_active:
+    st.info(
+        f"🧪 **Cenário ativo** — metas {scenario.yield_target:.1%} / "
+        f"{scenario.commodity_yield_target:.1%}, faixa Justo {scenario.fair_band:.0%}"
+        + (f", gatilho {scenario.expansion_trigger:g}× Depreciação" if conservative else "")
+        + ". Yields e status recalculados a partir dos componentes salvos, sem nova coleta."
+        + (" Médias 3A/5A e volatilidade indisponíveis com o gatilho alterado."
+           if conservative and scenario.expansion_trigger != EXPANSION_TRIGGER else "")
+    )
+
+# Memory diagnostics: the shared snapshot pair and what this session's view adds
+shared_bytes, view_bytes = memory_usage(snapshot, index, components, version, mode,
+                                        scenario.key if scenario_active else None)
+st.sidebar.caption(f"💾 Memória: {shared_bytes / 2**20:.1f} MB de snapshots compartilhados "
+                   f"entre sessões · +{view_bytes / 2**20:.2f} MB nesta visão")
 
 # ─────────────────────────────────────────
 # Methodology (collapsible)
@@ -456,7 +763,7 @@ st.markdown(f'<div class="freshness">📅 Dados de: <b>{last_updated}</b> · {le
 with st.expander("📐 Metodologia — Como o FCF Yield é calculado?", expanded=False):
     col_m1, col_m2 = st.columns(2)
     with col_m1:
-        st.markdown("""
+        st.markdown(f"""
 **Fórmula:**
 ```
 FCF = FCO − Capex − Juros − Impostos − Arrendamentos
@@ -465,7 +772,7 @@ Yield = FCF ÷ Market Cap
 
 **Modo Conservador:**
 - FCO ajustado (remove variação do Capital de Giro)
-- Capex limitado à Depreciação se > 1.5× Deprec.
+- Capex limitado à Depreciação se > {round(sc_trigger, 2):g}× Deprec.
         """)
     with col_m2:
         st.markdown("""
@@ -482,12 +789,11 @@ Yield = FCF ÷ Market Cap
 # ─────────────────────────────────────────
 # Apply Market Filter
 # ─────────────────────────────────────────
-if market_filter == "🇧🇷 Apenas B3":
-    df = df[df['Ticker'].str.endswith('.SA')].copy()
-elif market_filter == "🇺🇸 Apenas NYSE/NASDAQ":
-    df = df[~df['Ticker'].str.endswith('.SA')].copy()
+MARKET_OPTIONS = {"Todos": None, "🇧🇷 Apenas B3": "B3", "🇺🇸 Apenas NYSE/NASDAQ": "US"}
+market_key = MARKET_OPTIONS[market_filter]
+market_mask = index.mask(market=market_key)
 
-if df.empty:
+if not market_mask.any():
     st.info("Nenhum ativo encontrado para esse mercado.")
     st.stop()
 
@@ -495,24 +801,13 @@ if df.empty:
 # Apply View Filter + Smart Sorting
 # ─────────────────────────────────────────
 
-# We use robust keyword matching to ensure filtering ALWAYS works
-# This handles any discrepancies in emojis, plural/singular, or whitespace
-if "Baratos" in view_filter:
-    # Use exact word boundaries or direct substring checks
-    filtered = df[df['Status'].str.contains('Barato', na=False, case=False)].copy()
-    filtered.sort_values('FCF Yield', ascending=False, inplace=True)
-elif "Caros" in view_filter:
-    filtered = df[df['Status'].str.contains('Caro', na=False, case=False)].copy()
-    filtered.sort_values('FCF Yield', ascending=True, inplace=True)
-elif "Justos" in view_filter:
-    filtered = df[df['Status'].str.contains('Justo', na=False, case=False)].copy()
-    filtered.sort_values('FCF Yield', ascending=False, inplace=True)
-else:
-    # Mode "Todos"
-    filtered = df.copy()
-    filtered.sort_values('FCF Yield', ascending=False, inplace=True)
-
-filtered.reset_index(drop=True, inplace=True)
+# Status codes are matched by keyword once, in FilterIndex.build(), so the
+# view filter is a mask intersection on the presorted yield order
+VIEW_STATUS = {"Baratos": "🟢 Barato", "Caros": "🔴 Caro", "Justos": "🟡 Justo"}
+view_status = next((s for k, s in VIEW_STATUS.items() if k in view_filter), None)
+view_ascending = view_status == "🔴 Caro"   # most expensive first
+view_mask = market_mask & index.mask(status=view_status)
+filtered = index.select(view_mask, ascending=view_ascending, columns=['Ticker'])
 
 if filtered.empty:
     st.info(f"Nenhum ativo encontrado com o filtro '{view_filter}'.")
@@ -521,12 +816,12 @@ if filtered.empty:
 # ─────────────────────────────────────────
 # KPI Cards (Interactive)
 # ─────────────────────────────────────────
-n_total = len(df)
-n_cheap = int(df['Status'].str.contains('Barato').sum())
-n_fair = int(df['Status'].str.contains('Justo').sum())
-n_expensive = int(df['Status'].str.contains('Caro').sum())
-best_idx = df['FCF Yield'].idxmax()
-best = df.loc[best_idx]
+n_total = int(market_mask.sum())
+status_counts = index.status_counts(market_mask)
+n_cheap = status_counts["🟢 Barato"]
+n_fair = status_counts["🟡 Justo"]
+n_expensive = status_counts["🔴 Caro"]
+best = index.best(market_mask)
 
 # Layout for KPI cards
 k1, k2, k3, k4, k5 = st.columns(5)
@@ -555,14 +850,16 @@ st.markdown("<br>", unsafe_allow_html=True)
 # ─────────────────────────────────────────
 # Main Content Tabs
 # ─────────────────────────────────────────
-tab_table, tab_chart, tab_detail = st.tabs(["📋 Ranking", "📊 Gráfico de Bolhas", "🔍 Breakdown"])
+tab_table, tab_chart, tab_detail, tab_history, tab_sensitivity = st.tabs(
+    ["📋 Ranking", "📊 Gráfico de Bolhas", "🔍 Breakdown", "📈 Histórico", "🧪 Sensibilidade"])
 
 # ── Tab 1: Table ─────────────────────
 with tab_table:
     st.markdown(f'<div class="section-title">Ranking por FCF Yield — {view_filter}</div>', unsafe_allow_html=True)
 
     # Sector sub-filter
-    available_sectors = sorted(filtered['Setor'].dropna().unique())
+    available_sectors = index.sectors_in(view_mask)
+    selected_sectors = None
     if len(available_sectors) > 1:
         selected_sectors = st.multiselect(
             "Filtrar por Setor:",
@@ -570,56 +867,12 @@ with tab_table:
             default=available_sectors,
             key="sector_filter"
         )
-        table_df = filtered[filtered['Setor'].isin(selected_sectors)].copy()
-    else:
-        table_df = filtered.copy()
-
-    # Columns to display
-    display_cols = ['Ticker', 'Preço', 'FCF Yield', 'Status',
-                    'Rev Growth 5Y', 'Setor', 'Market Cap', 'FCF']
-    if 'Ajuste Expansão' in table_df.columns:
-        display_cols.append('Ajuste Expansão')
-
-    display = table_df[[c for c in display_cols if c in table_df.columns]].copy()
-
-    # Format
-    def fmt_pct(v):
-        try:
-            return f"{float(v):.2%}" if pd.notna(v) else "–"
-        except (ValueError, TypeError):
-            return "–"
-
-    def fmt_brl(v):
-        try:
-            v = float(v)
-            if pd.isna(v) or v == 0:
-                return "–"
-            return f"{v/1e9:,.2f} B"
-        except (ValueError, TypeError):
-            return "–"
-
-    display['FCF Yield'] = table_df['FCF Yield'].map(fmt_pct)
-    display['Rev Growth 5Y'] = table_df['Rev Growth 5Y'].map(fmt_pct)
-    display['Market Cap'] = table_df['Market Cap'].map(fmt_brl)
-    display['FCF'] = table_df['FCF'].map(fmt_brl)
-    display['Preço'] = table_df['Preço'].map(lambda v: f"{v:,.2f}" if pd.notna(v) and v else "–")
-    if 'Ajuste Expansão' in display.columns:
-        display['Ajuste Expansão'] = display['Ajuste Expansão'].map(
-            lambda v: "⚠️ Sim" if v is True or v == "True" else "–"
-        )
+        if set(selected_sectors) == set(available_sectors):
+            selected_sectors = None  # same rows as no sub-filter → same cache entry
 
-    col_config = {
-        "Ticker": st.column_config.TextColumn("Ativo", width="small"),
-        "Preço": st.column_config.TextColumn("Preço", width="small"),
-        "FCF Yield": st.column_config.TextColumn("FCF Yield", width="small"),
-        "Status": st.column_config.TextColumn("Status", width="small"),
-        "Rev Growth 5Y": st.column_config.TextColumn("Cresc. Receita 5A", width="small"),
-        "Setor": st.column_config.TextColumn("Setor", width="medium"),
-        "Market Cap": st.column_config.TextColumn("Market Cap", width="small"),
-        "FCF": st.column_config.TextColumn("FCF", width="small"),
-    }
-    if 'Ajuste Expansão' in display.columns:
-        col_config["Ajuste Expansão"] = st.column_config.TextColumn("Ajuste Capex", width="small")
+    display, col_config = render_ranking(index, index.version, mode, market_key, view_status,
+                                         view_ascending, tuple(sorted(selected_sectors))
+                                         if selected_sectors is not None else None)
 
     st.dataframe(
         display,
@@ -635,51 +888,8 @@ with tab_table:
 with tab_chart:
     st.markdown('<div class="section-title">Joias de Crescimento — FCF Yield vs Receita 5Y</div>', unsafe_allow_html=True)
 
-    chart_df = filtered.copy()
-    chart_df['Yield %'] = chart_df['FCF Yield'] * 100
-    chart_df['Rev Growth %'] = chart_df['Rev Growth 5Y'] * 100
-    chart_df['MCap B'] = (chart_df['Market Cap'] / 1e9).clip(lower=1)
-
-    fig = px.scatter(
-        chart_df,
-        x='Yield %',
-        y='Rev Growth %',
-        size='MCap B',
-        color='Status',
-        hover_name='Ticker',
-        hover_data={
-            'Yield %': ':.2f',
-            'Rev Growth %': ':.2f',
-            'MCap B': ':.1f',
-            'Setor': True,
-            'Status': False,
-        },
-        color_discrete_map={
-            '🟢 Barato': '#00e676',
-            '🟡 Justo': '#ffab00',
-            '🔴 Caro': '#ff1744',
-        },
-        size_max=60,
-        template='plotly_dark',
-    )
-
-    fig.add_vline(x=10, line_dash="dot", line_color="rgba(255,255,255,0.2)",
-                  annotation_text="10%", annotation_font_color="rgba(255,255,255,0.5)")
-    fig.add_vline(x=15, line_dash="dot", line_color="rgba(255,255,255,0.2)",
-                  annotation_text="15%", annotation_font_color="rgba(255,255,255,0.5)")
-    fig.add_hline(y=0, line_dash="solid", line_color="rgba(255,255,255,0.1)")
-
-    fig.update_layout(
-        xaxis_title="FCF Yield (%)",
-        yaxis_title="Crescimento Receita 5A (%)",
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font={"family": "Inter", "size": 13, "color": "#ccc"},
-        legend_title_text="",
-        height=550,
-        margin={"l": 50, "r": 30, "t": 30, "b": 50},
-    )
-
+    fig = render_bubble_chart(index, index.version, mode, market_key, view_status, view_ascending,
+                              (scenario.yield_target, scenario.commodity_yield_target))
     st.plotly_chart(fig, use_container_width=True)
 
     st.info(
@@ -691,21 +901,58 @@ with tab_chart:
 with tab_detail:
     st.markdown('<div class="section-title">Breakdown dos Componentes do FCF</div>', unsafe_allow_html=True)
 
-    detail_cols = ['Ticker', 'FCO', 'Adjusted FCO', 'Capex', 'Capex (Raw)',
-                   'Depreciação', 'Juros', 'Impostos', 'Arrendamentos', 'FCF']
-    available_detail = [c for c in detail_cols if c in filtered.columns]
-    detail = filtered[available_detail].copy()
+    detail, detail_config = render_breakdown(index, index.version, mode, market_key,
+                                             view_status, view_ascending)
+    st.dataframe(detail, use_container_width=True, hide_index=True, column_config=detail_config)
 
-    for col in detail.columns:
-        if col == 'Ticker':
-            continue
-        detail[col] = detail[col].map(
-            lambda v: f"{float(v)/1e6:,.0f} M" if pd.notna(v) and float(v) != 0 else "–"
-        )
+    st.caption("Valores em milhões (M) na moeda local do ativo.")
 
-    st.dataframe(detail, use_container_width=True, hide_index=True)
+# ── Tab 4: Yield History ────────────
+with tab_history:
+    st.markdown('<div class="section-title">Evolução do FCF Yield</div>', unsafe_allow_html=True)
 
-    st.caption("Valores em milhões (M) na moeda local do ativo.")
+    history_tickers = st.multiselect(
+        "Ativos:",
+        filtered['Ticker'].tolist(),
+        default=filtered['Ticker'].head(5).tolist(),
+        key="history_tickers",
+    )
+    # History doesn't depend on the scenario: keyed on the snapshot version only
+    hist = load_yield_history(mode, version, tuple(history_tickers)) if history_tickers else pd.DataFrame()
+
+    if hist.empty:
+        st.info("📭 Ainda não há histórico para os ativos selecionados — ele é gravado a cada atualização diária.")
+    else:
+        hist = hist.assign(**{'Yield %': hist['FCF Yield'] * 100})
+        fig_hist = px.line(
+            hist, x='Date', y='Yield %', color='Ticker',
+            hover_data={'Status': True, 'Yield %': ':.2f'},
+            template='plotly_dark',
+        )
+        fig_hist.update_layout(
+            xaxis_title="",
+            yaxis_title="FCF Yield (%)",
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font={"family": "Inter", "size": 13, "color": "#ccc"},
+            legend_title_text="",
+            height=450,
+            margin={"l": 50, "r": 30, "t": 30, "b": 50},
+        )
+        st.plotly_chart(fig_hist, use_container_width=True)
+        st.caption(f"{hist['Date'].nunique()} dias de histórico · Modo {'Conservador' if conservative else 'Normal'}")
+
+# ── Tab 5: Sensitivity ──────────────
+with tab_sensitivity:
+    st.markdown('<div class="section-title">Sensibilidade — Quantos ativos ficam baratos?</div>', unsafe_allow_html=True)
+
+    base_market_mask = base_index.mask(market=market_key)
+    z = sensitivity_grid(components.take(base_market_mask), version, mode, market_key,
+                         _sensitivity_key(scenario), scenario)
+    fig_sens = render_sensitivity(z, scenario)
+    st.plotly_chart(fig_sens, use_container_width=True)
+    st.caption("Cada célula recalcula FCF, Yield e Status de todos os ativos do mercado "
+               "selecionado; o ✕ marca o cenário atual da barra lateral.")
 
 # ─────────────────────────────────────────
 # Footer
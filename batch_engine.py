@@ -0,0 +1,419 @@
+"""
+batch_engine.py — Vectorized FCF engine for the whole universe at once.
+
+All tickers' statements are normalized once into a dense tensor indexed by
+ticker × line item × period (period 0 = most recent period end; statements
+are aligned on their column dates). Field aliases
+from engine.FIELD_ALIASES are resolved once per ticker, then FCF, the
+conservative adjustments, revenue CAGR and Status are computed with array
+operations. Results match engine.compute_fcf() row for row.
+
+Besides the headline FCF (latest value of each line item), FCF is computed
+for every period in the tensor at once, giving normalized yields (3- and
+5-period mean / median FCF over the current market cap) and the volatility
+of the yearly yields — cyclicals are not ranked on a single year. A TTM
+column (ttm.with_ttm) only feeds the headline: the history is annual.
+"""
+
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from engine import (FIELD_ALIASES, REVENUE_KEYS, EXPANSION_TRIGGER, classify_status_array,
+                    _market_cap, _price)
+from instrumentation import get_tracer
+
+
+FIELDS = tuple(FIELD_ALIASES)
+
+# Flattened (statement, row label) pairs, in alias order per field
+_ALIAS_ROWS = [pair for f in FIELDS for pair in FIELD_ALIASES[f]]
+_FIELD_SLICES = {}
+_start = 0
+for _f in FIELDS:
+    _FIELD_SLICES[_f] = slice(_start, _start + len(FIELD_ALIASES[_f]))
+    _start += len(FIELD_ALIASES[_f])
+
+# Statement → (tensor row positions, row labels) for one reindex per statement
+_STATEMENT_ROWS = {
+    statement: ([k for k, (s, _) in enumerate(_ALIAS_ROWS) if s == statement],
+                [key for s, key in _ALIAS_ROWS if s == statement])
+    for statement in ('cashflow', 'income_stmt', 'balance_sheet')
+}
+
+
+@dataclass
+class StatementTensor:
+    """Universe statements normalized into dense arrays."""
+    tickers: list[str]
+    values: np.ndarray       # (T, F, P) — canonical fields, NaN = missing
+    annual: np.ndarray       # (T, F, P) — same without TTM columns (may be `values`)
+    revenue: np.ndarray      # (T, P)
+    has_balance_sheet: np.ndarray  # (T,) bool
+    market_cap: np.ndarray   # (T,)
+    price: list              # raw info values (may be None)
+    sectors: list
+
+    def field(self, name: str, annual: bool = False) -> np.ndarray:
+        """(T, P) slice for a canonical field (annual periods only if `annual`)."""
+        return (self.annual if annual else self.values)[:, FIELDS.index(name), :]
+
+
+def _rows(df: pd.DataFrame, keys: list[str], at: np.ndarray, n_periods: int) -> np.ndarray:
+    """
+    Rows of a statement as a (len(keys), n_periods) float matrix, column j
+    of the statement going to period at[j].
+    """
+    out = np.full((len(keys), n_periods), np.nan)
+    if df.empty:
+        return out
+    first = {}
+    for i, label in enumerate(df.index.tolist()):
+        first.setdefault(label, i)  # duplicate labels: keep the first
+    pos = np.array([first.get(k, -1) for k in keys])
+    hit = pos >= 0
+    if not hit.any():
+        return out
+    try:
+        m = df.to_numpy(dtype=float)
+    except (TypeError, ValueError):
+        m = df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    if np.array_equal(at, np.arange(len(at))):     # the usual case: already aligned
+        out[hit, :len(at)] = m[pos[hit]]
+    else:
+        out[np.ix_(np.flatnonzero(hit), at)] = m[pos[hit]]
+    return out
+
+
+def _period_axis(dates: dict[str, list]) -> tuple[dict[str, np.ndarray], int]:
+    """
+    Period position of every statement column on the union of the
+    statements' period end dates, most recent first, and the number of
+    periods. Statements are aligned by date, not by column position, so a
+    year missing from one of them stays a gap.
+    """
+    axis = sorted(set().union(*dates.values()), reverse=True)
+    where = {period: k for k, period in enumerate(axis)}
+    return ({statement: np.array([where[p] for p in d], dtype=np.intp)
+             for statement, d in dates.items()}, len(axis))
+
+
+def _profile(info: dict) -> tuple[float, object, str]:
+    """
+    (market cap, price, sector) from a yfinance info dict. Raises on a
+    missing info dict or a non-numeric market cap, where compute_fcf()
+    fails (and returns None) too.
+    """
+    market_cap = _market_cap(info)
+    if isinstance(market_cap, bool) or not isinstance(market_cap, (int, float, np.number)):
+        raise TypeError(f"market cap is not a number: {market_cap!r}")
+    return float(market_cap), _price(info), info.get('sector', 'Desconhecido')
+
+
+def _resolve_aliases(raw: np.ndarray) -> np.ndarray:
+    """(T, K, P) alias rows → (T, F, P) fields: first alias with any usable value wins."""
+    has_any = (np.isfinite(raw) & (raw != 0)).any(axis=2)        # (T, K)
+    values = np.full((raw.shape[0], len(FIELDS), raw.shape[2]), np.nan)
+    rows = np.arange(raw.shape[0])
+    for f, name in enumerate(FIELDS):
+        sl = _FIELD_SLICES[name]
+        pick = sl.start + has_any[:, sl].argmax(axis=1)
+        found = has_any[:, sl].any(axis=1)
+        values[found, f, :] = raw[rows[found], pick[found], :]
+    return values
+
+
+def build_tensor(data_by_ticker: dict[str, dict]) -> StatementTensor:
+    """
+    Normalize every ticker's statements into one StatementTensor.
+
+    Tickers without a cash flow or income statement, or whose data can't be
+    read (malformed info or statements), are dropped — the per-ticker
+    engine returns None for them too — so one bad ticker never fails the
+    whole universe. Periods are aligned on the statements' column dates.
+    Statements with a TTM column (data['ttm_columns'], see ttm.with_ttm) are
+    also read without it, on their own annual period axis, for the annual view.
+    """
+    usable = {}
+    for t, d in data_by_ticker.items():
+        try:
+            if d is not None and not d['cashflow'].empty and not d['income_stmt'].empty:
+                dates = {s: d[s].columns.tolist() for s in _STATEMENT_ROWS}
+                ttm_columns = d.get('ttm_columns') or ()
+                annual = None
+                if ttm_columns:
+                    annual, _ = _period_axis({s: x[1:] if s in ttm_columns else x
+                                              for s, x in dates.items()})
+                usable[t] = (d, _profile(d['info']), _period_axis(dates), annual)
+        except Exception:
+            continue
+    n_periods = max([n for _, _, (_, n), _ in usable.values()] or [0])
+    n_periods = max(n_periods, 1)
+
+    raw = np.full((len(usable), len(_ALIAS_ROWS), n_periods), np.nan)
+    revenue = np.full((len(usable), n_periods), np.nan)
+    has_bs = np.zeros(len(usable), dtype=bool)
+    market_cap = np.zeros(len(usable))
+    tickers, price, sectors = [], [], []
+
+    annual_raw = {}          # row → (K, P) alias rows without the TTM columns
+
+    tracer = get_tracer()
+    for t, (d, profile, (at, _), annual_at) in usable.items():
+        i = len(tickers)
+        # The per-ticker part of the batch (the array math is in compute:batch)
+        with tracer.span(t, 'compute'):
+            try:
+                for statement, (idx, keys) in _STATEMENT_ROWS.items():
+                    raw[i, idx, :] = _rows(d[statement], keys, at[statement], n_periods)
+                if annual_at is not None:
+                    annual_raw[i] = np.full_like(raw[i], np.nan)
+                    for statement, (idx, keys) in _STATEMENT_ROWS.items():
+                        df = d[statement]
+                        if statement in d['ttm_columns']:
+                            df = df.iloc[:, 1:]
+                        annual_raw[i][idx, :] = _rows(df, keys, annual_at[statement], n_periods)
+                inc = d['income_stmt']
+                rev_key = REVENUE_KEYS[0] if REVENUE_KEYS[0] in inc.index else REVENUE_KEYS[1]
+                revenue[i] = _rows(inc, [rev_key], at['income_stmt'], n_periods)[0]
+                has_bs[i] = not d['balance_sheet'].empty
+            except Exception:
+                raw[i], revenue[i], has_bs[i] = np.nan, np.nan, False   # slot reused by the next ticker
+                annual_raw.pop(i, None)
+                continue
+        tickers.append(t)
+        market_cap[i], p, sector = profile
+        price.append(p)
+        sectors.append(sector)
+
+    n = len(tickers)
+    raw, revenue, has_bs, market_cap = raw[:n], revenue[:n], has_bs[:n], market_cap[:n]
+
+    # ── Resolve aliases once ──
+    values = _resolve_aliases(raw)
+    annual = values
+    if annual_raw:
+        # Aliases resolved again: the TTM column alone may pick another alias
+        rows = list(annual_raw)
+        annual = values.copy()
+        annual[rows] = _resolve_aliases(np.stack([annual_raw[i] for i in rows]))
+
+    return StatementTensor(tickers, values, annual, revenue, has_bs,
+                           market_cap, price, sectors)
+
+
+# ─────────────────────────────────────────────
+# Array primitives
+# ─────────────────────────────────────────────
+
+def latest_valid(x: np.ndarray) -> np.ndarray:
+    """Most recent non-NaN, non-zero value along the last axis (0 if none)."""
+    valid = np.isfinite(x) & (x != 0)
+    idx = valid.argmax(axis=-1)
+    val = np.take_along_axis(x, idx[..., None], axis=-1)[..., 0]
+    return np.where(valid.any(axis=-1), val, 0.0)
+
+
+def revenue_cagr(revenue: np.ndarray) -> np.ndarray:
+    """
+    Annualized revenue growth between the latest and the oldest positive
+    revenue of each row of a (T, P) matrix, as a decimal (0.12 = 12%).
+    0 with fewer than 2 periods.
+    """
+    valid = np.isfinite(revenue) & (revenue > 0)
+    count = valid.sum(axis=1)
+    n_periods = revenue.shape[1]
+    first = valid.argmax(axis=1)
+    last = n_periods - 1 - valid[:, ::-1].argmax(axis=1)
+    rows = np.arange(revenue.shape[0])
+    latest = revenue[rows, first]
+    oldest = revenue[rows, last]
+    n_years = np.maximum(count - 1, 1)
+    ok = count >= 2
+    ratio = np.where(ok, latest / np.where(ok, oldest, 1.0), 1.0)
+    # Scalar pow keeps results bit-identical with the per-ticker engine
+    # (NumPy's SIMD power can differ in the last ulp); it is only O(T).
+    cagr = np.array([float(r) ** (1 / int(n)) - 1 for r, n in zip(ratio, n_years)])
+    return np.where(ok, cagr, 0.0)
+
+
+# ─────────────────────────────────────────────
+# Multi-period FCF
+# ─────────────────────────────────────────────
+
+HISTORY_WINDOWS = (3, 5)     # most recent periods averaged (up to; at least 2 valid)
+HISTORY_COLUMNS = tuple([f'FCF Yield {stat} {n}A' for n in HISTORY_WINDOWS
+                         for stat in ('Média', 'Mediana')] + ['Volatilidade FCF'])
+
+
+def period_fcf(tensor: StatementTensor, conservative: bool = False) -> np.ndarray:
+    """
+    FCF of every annual period, (T, P): the headline formula applied column
+    by column, TTM columns left out. A missing line item counts as 0;
+    periods without FCO are NaN.
+    """
+    v = {name: tensor.field(name, annual=True) for name in FIELDS}
+    z = {name: np.nan_to_num(x) for name, x in v.items()}
+
+    fco = v['fco']
+    adjusted_fco = fco - z['wc_change'] if conservative else fco
+
+    capex_raw = np.where(z['capex'] > 0, -np.abs(z['capex']), z['capex'])
+    depreciation = z['depreciation']
+    capex = capex_raw
+    if conservative:
+        expansion = (depreciation != 0) & \
+                    (np.abs(capex_raw) > np.abs(depreciation) * EXPANSION_TRIGGER)
+        capex = np.where(expansion, -np.abs(depreciation), capex_raw)
+
+    leases = np.abs(z['leases'])
+    leases = np.where(leases == 0, np.abs(z['leases_long_term']) + np.abs(z['leases_current']),
+                      leases)
+    leases = np.where(tensor.has_balance_sheet[:, None], leases, 0.0)
+
+    fcf = adjusted_fco + capex - np.abs(z['interest']) - np.abs(z['taxes']) - leases
+    return np.where(np.isfinite(fco) & (fco != 0), fcf, np.nan)
+
+
+def history_stats(fcf: np.ndarray, market_cap: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Normalized yields from period_fcf(): mean / median FCF of the most recent
+    3 and 5 periods over the current market cap, and the standard deviation
+    of the yearly yields over 5 periods. NaN with fewer than 2 valid periods.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        yields = fcf / np.where(market_cap != 0, market_cap, np.nan)[:, None]
+    out = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)   # all-NaN rows
+        for n in HISTORY_WINDOWS:
+            window = yields[:, :n]
+            enough = np.isfinite(window).sum(axis=1) >= 2
+            out[f'FCF Yield Média {n}A'] = np.where(enough, np.nanmean(window, axis=1), np.nan)
+            out[f'FCF Yield Mediana {n}A'] = np.where(enough, np.nanmedian(window, axis=1),
+                                                      np.nan)
+        window = yields[:, :max(HISTORY_WINDOWS)]
+        enough = np.isfinite(window).sum(axis=1) >= 2
+        out['Volatilidade FCF'] = np.where(enough, np.nanstd(window, axis=1, ddof=1), np.nan)
+    return {name: out[name] for name in HISTORY_COLUMNS}
+
+
+# ─────────────────────────────────────────────
+# Batch Calculation
+# ─────────────────────────────────────────────
+
+def compute_batch(tensor: StatementTensor, conservative: bool = False) -> pd.DataFrame:
+    """
+    Calculate FCF Yield + Status for every ticker in the tensor.
+
+    Returns:
+        Ranked DataFrame with the same columns as engine.results_to_frame().
+    """
+    if not tensor.tickers:
+        return pd.DataFrame()
+
+    latest = {name: latest_valid(tensor.field(name)) for name in FIELDS}
+
+    fco = latest['fco']
+    adjusted_fco = fco - latest['wc_change'] if conservative else fco
+
+    capex_raw = latest['capex']
+    capex_raw = np.where(capex_raw > 0, -np.abs(capex_raw), capex_raw)
+
+    depreciation = latest['depreciation']
+    expansion = np.zeros(len(tensor.tickers), dtype=bool)
+    if conservative:
+        expansion = (depreciation != 0) & (np.abs(capex_raw) > np.abs(depreciation) * EXPANSION_TRIGGER)
+    capex = np.where(expansion, -np.abs(depreciation), capex_raw)
+
+    interest = np.abs(latest['interest'])
+    taxes = np.abs(latest['taxes'])
+
+    leases = np.abs(latest['leases'])
+    leases = np.where(leases == 0,
+                      np.abs(latest['leases_long_term']) + np.abs(latest['leases_current']),
+                      leases)
+    leases = np.where(tensor.has_balance_sheet, leases, 0.0)
+
+    fcf = adjusted_fco + capex - interest - taxes - leases
+
+    market_cap = tensor.market_cap
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fcf_yield = np.where(market_cap != 0, fcf / np.where(market_cap != 0, market_cap, 1), 0.0)
+
+    df = pd.DataFrame({
+        'Ticker': tensor.tickers,
+        'Preço': tensor.price,
+        'Market Cap': market_cap,
+        'FCO': fco,
+        'Adjusted FCO': adjusted_fco,
+        'Δ Capital de Giro': latest['wc_change'],
+        'Capex': capex,
+        'Capex (Raw)': capex_raw,
+        'Depreciação': depreciation,
+        'Ajuste Expansão': expansion,
+        'Juros': interest,
+        'Impostos': taxes,
+        'Arrendamentos': leases,
+        'FCF': fcf,
+        'FCF Yield': fcf_yield,
+        'Rev Growth 5Y': revenue_cagr(tensor.revenue),
+        **history_stats(period_fcf(tensor, conservative), market_cap),
+        'Setor': tensor.sectors,
+    })
+    df['Status'] = classify_status_array(fcf_yield, df['Setor'].to_numpy())
+    df.sort_values('FCF Yield', ascending=False, inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def screen_batch(data_by_ticker: dict[str, dict]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Build the tensor once and compute both modes from it.
+
+    Returns:
+        (df_normal, df_conservative)
+    """
+    with get_tracer().span(None, 'compute:batch'):
+        tensor = build_tensor(data_by_ticker)
+        return compute_batch(tensor, conservative=False), compute_batch(tensor, conservative=True)
+
+
+def reprice(df: pd.DataFrame, quotes: dict[str, dict]) -> pd.DataFrame:
+    """
+    Refresh Preço / Market Cap and recompute FCF Yield + Status for rows whose
+    statements did not change. Tickers without a quote keep their old values.
+
+    Args:
+        df: Ranked screener DataFrame (one mode)
+        quotes: {ticker: {'price': ..., 'market_cap': ...}}
+    """
+    if df.empty or not quotes:
+        return df
+    df = df.copy()
+    quoted = df['Ticker'].isin(list(quotes))
+    tickers = df.loc[quoted, 'Ticker']
+    price = tickers.map(lambda t: quotes[t]['price'])
+    market_cap = tickers.map(lambda t: quotes[t]['market_cap']).astype(float).to_numpy()
+    fcf = df.loc[quoted, 'FCF'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fcf_yield = np.where(market_cap != 0, fcf / np.where(market_cap != 0, market_cap, 1), 0.0)
+
+    # Normalized yields share the FCF history: rescale by old / new market cap
+    old_cap = df.loc[quoted, 'Market Cap'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scale = np.where(market_cap != 0, old_cap / np.where(market_cap != 0, market_cap, 1),
+                         np.nan)
+    for col in HISTORY_COLUMNS:
+        if col in df.columns:
+            df.loc[quoted, col] = df.loc[quoted, col].to_numpy(dtype=float) * scale
+
+    df.loc[quoted, 'Preço'] = price.to_numpy(dtype=float)
+    df.loc[quoted, 'Market Cap'] = market_cap
+    df.loc[quoted, 'FCF Yield'] = fcf_yield
+    df['Status'] = classify_status_array(df['FCF Yield'].to_numpy(), df['Setor'].to_numpy())
+    df.sort_values('FCF Yield', ascending=False, inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
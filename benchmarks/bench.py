@@ -0,0 +1,433 @@
+"""
+bench.py — Offline performance benchmarks for Screener FCF Yield.
+
+Runs entirely without Yahoo Finance, against either a recorded fixture
+corpus (see data_source.RecordingSource: a StatementCache directory with
+info / cashflow / income_stmt / balance_sheet per ticker, plus quarterly_*
+when recorded via update_data.py --source record --ttm) or a synthetic
+universe of any size:
+
+  python benchmarks/bench.py --record                 # record ALL_TICKERS once (network)
+  python benchmarks/bench.py                          # benchmark the recorded corpus
+  python benchmarks/bench.py --synthetic 10000 --latency 0.01
+
+Benchmarks:
+  calculate_fcf   per-ticker engine, statements replayed from the corpus on disk
+  batch_engine    screen_batch() over the whole universe (both modes)
+  run_screener    run_screener_modes() against a ReplaySource at --latency per request
+  update_full     update_data.main(--source replay) from a cold cache
+  update_incr     update_data.main(--incremental) right after, warm cache
+  app_rerun       app.py via Streamlit's AppTest: cold run, warm reruns, filter clicks
+  memory          snapshot frames as stored vs compact (snapshot.compact_frame), and
+                  Python heap per app session (tracemalloc over --sessions AppTests)
+
+Results go to a JSON file (default benchmarks/results/<UTC timestamp>.json)
+so runs can be compared across versions.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import engine
+import update_data
+from quotes import download_prices
+from engine import FIELD_ALIASES, REVENUE_KEYS, fetch_statements, calculate_fcf
+from data_source import (YahooSource, RecordingSource, ReplaySource, set_source,
+                         DEFAULT_FIXTURES_DIR)
+from batch_engine import screen_batch
+from fetcher import configure_rate_limit
+from statement_cache import StatementCache
+from ttm import QUARTERLY_KINDS
+from snapshot import (write_snapshot, write_metadata, snapshot_path, load_snapshot,
+                      compact_frame, memory_bytes, MODES)
+from filter_index import FilterIndex
+
+
+DEFAULT_RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+SECTORS = ('Energy', 'Basic Materials', 'Utilities', 'Technology', 'Financial Services',
+           'Healthcare', 'Consumer Cyclical', 'Consumer Defensive', 'Industrials',
+           'Real Estate', 'Communication Services')
+FILLER_ROWS = 30  # extra line items per statement, like real Yahoo payloads
+
+
+# ─────────────────────────────────────────────
+# Corpus
+# ─────────────────────────────────────────────
+
+def record_corpus(tickers: list[str], corpus_dir: Path) -> int:
+    """Download every ticker's payloads from Yahoo into a fixture directory."""
+    previous = set_source(RecordingSource(YahooSource(), corpus_dir))
+    try:
+        data = engine.fetch_universe(tickers)
+        download_prices(tickers)
+    finally:
+        set_source(previous)
+    return len(data)
+
+
+def write_fixtures(corpus: dict[str, dict], corpus_dir: Path) -> Path:
+    """Store an in-memory corpus in the fixture (StatementCache) layout."""
+    cache = StatementCache(corpus_dir)
+    for ticker, data in corpus.items():
+        for kind, value in data.items():
+            cache.put(ticker, kind, value)
+    return corpus_dir
+
+
+def load_corpus(corpus_dir: Path) -> dict[str, dict]:
+    """{ticker: statements} for every complete ticker in a recorded corpus."""
+    cache = StatementCache(corpus_dir, offline=True)
+    corpus = {}
+    for ticker in cache.tickers():
+        try:
+            corpus[ticker] = fetch_statements(ticker, cache)
+        except LookupError:
+            continue
+    return corpus
+
+
+def _statement(rng, labels: list[str], dates) -> pd.DataFrame:
+    values = rng.normal(2e9, 1.5e9, size=(len(labels), len(dates)))
+    values[rng.random(values.shape) < 0.15] = np.nan
+    return pd.DataFrame(values, index=labels, columns=dates)
+
+
+def synthetic_corpus(n: int, seed: int = 0) -> dict[str, dict]:
+    """Deterministic yfinance-shaped payloads for n synthetic tickers."""
+    labels = {s: [] for s in ('cashflow', 'income_stmt', 'balance_sheet')}
+    for pairs in FIELD_ALIASES.values():
+        for statement, label in pairs:
+            if label not in labels[statement]:
+                labels[statement].append(label)
+    labels['income_stmt'] += list(REVENUE_KEYS)
+    for statement in labels:
+        labels[statement] += [f"{statement} Item {i}" for i in range(FILLER_ROWS)]
+
+    corpus = {}
+    for i in range(n):
+        ticker = f"SYN{i:05d}" + (".SA" if i % 2 else "")
+        rng = np.random.default_rng([seed, zlib.crc32(ticker.encode())])
+        n_periods = int(rng.integers(2, 6))
+        dates = pd.to_datetime([f"{2025 - k}-12-31" for k in range(n_periods)])
+        data = {
+            'info': {
+                'marketCap': float(rng.integers(5e8, 5e11)),
+                'currentPrice': float(rng.uniform(2, 400)),
+                'sharesOutstanding': float(rng.integers(1e7, 1e10)),
+                'sector': SECTORS[int(rng.integers(len(SECTORS)))],
+            },
+            'cashflow': _statement(rng, labels['cashflow'], dates),
+            'income_stmt': _statement(rng, labels['income_stmt'], dates),
+            'balance_sheet': _statement(rng, labels['balance_sheet'], dates),
+        }
+        if rng.random() < 0.03:
+            data['cashflow'] = pd.DataFrame()
+        # Quarterly statements (for --ttm): five quarters up to mid-2026, most
+        # tickers; a quarter's flows are about a quarter of the annual ones
+        if rng.random() < 0.8:
+            quarters = pd.to_datetime(['2026-06-30', '2026-03-31', '2025-12-31',
+                                       '2025-09-30', '2025-06-30'])
+            for statement in ('cashflow', 'income_stmt', 'balance_sheet'):
+                q = _statement(rng, labels[statement], quarters)
+                data[QUARTERLY_KINDS[statement]] = q if statement == 'balance_sheet' else q / 4
+        corpus[ticker] = data
+    return corpus
+
+
+# ─────────────────────────────────────────────
+# Benchmarks
+# ─────────────────────────────────────────────
+
+def _rate(n: int, seconds: float) -> dict:
+    return {'tickers': n, 'seconds': round(seconds, 4),
+            'tickers_per_s': round(n / seconds, 1) if seconds else None}
+
+
+def bench_calculate_fcf(fixtures: Path, tickers: list[str]) -> dict:
+    """Per-ticker engine, both modes, replaying statements from disk."""
+    cache = StatementCache(fixtures, offline=True)
+    start = time.perf_counter()
+    for ticker in tickers:
+        calculate_fcf(ticker, False, cache)
+        calculate_fcf(ticker, True, cache)
+    return _rate(len(tickers), time.perf_counter() - start)
+
+
+def bench_batch_engine(corpus: dict[str, dict], repeat: int = 3) -> dict:
+    """screen_batch() over the whole universe; best of `repeat`."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        screen_batch(corpus)
+        times.append(time.perf_counter() - start)
+    return _rate(len(corpus), min(times))
+
+
+def bench_run_screener(corpus: dict[str, dict], latency: float, concurrency: int,
+                       adaptive: bool) -> dict:
+    """run_screener_modes() against the replayed network, no statement cache."""
+    source = ReplaySource(corpus, latency=latency)
+    previous = set_source(source)
+    try:
+        start = time.perf_counter()
+        df_normal, _ = engine.run_screener_modes(list(corpus), max_workers=concurrency,
+                                                 adaptive=adaptive)
+        seconds = time.perf_counter() - start
+    finally:
+        set_source(previous)
+    return {**_rate(len(corpus), seconds), 'rows': len(df_normal), **source.stats()}
+
+
+def bench_update(fixtures: Path, tickers: list[str], args, workdir: Path) -> dict:
+    """update_data.main(): cold full run, then an incremental run on the warm cache."""
+    results = {}
+    cwd = os.getcwd()
+    saved_tickers = update_data.ALL_TICKERS
+    update_data.ALL_TICKERS = tickers
+    flags = ['--cache-dir', str(workdir / ".cache" / "statements"),
+             '--rps', str(args.rps), '--burst', str(args.rps),
+             '--concurrency', str(args.concurrency),
+             '--source', 'replay', '--fixtures', str(fixtures),
+             '--replay-latency', str(args.latency), '--replay-jitter', '0']
+    previous = set_source(YahooSource())
+    try:
+        os.chdir(workdir)
+        for name, extra in (('update_full', []), ('update_incr', ['--incremental'])):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                update_data.main(flags + extra)
+            results[name] = _rate(len(tickers), time.perf_counter() - start)
+    finally:
+        os.chdir(cwd)
+        update_data.ALL_TICKERS = saved_tickers
+        set_source(previous)
+    return results
+
+
+def _app_data(corpus: dict[str, dict], workdir: Path) -> Path:
+    """Snapshots of the corpus, as update_data.py would write them for the app."""
+    data_dir = workdir / "app_data"
+    for mode, df in zip(MODES, screen_batch(corpus)):
+        write_snapshot(df, snapshot_path(mode, data_dir))
+    write_metadata({"last_updated": datetime.now(timezone.utc).isoformat()}, data_dir)
+    return data_dir
+
+
+def bench_app(corpus: dict[str, dict], workdir: Path, reruns: int) -> dict:
+    """Render time of app.py per rerun (AppTest, no browser)."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {'skipped': 'streamlit not installed'}
+
+    data_dir = _app_data(corpus, workdir)
+    os.environ["SCREENER_DATA_DIR"] = str(data_dir)
+    try:
+        at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=600)
+
+        def timed_run() -> float:
+            start = time.perf_counter()
+            at.run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            return (time.perf_counter() - start) * 1000
+
+        cold = timed_run()
+        warm = [timed_run() for _ in range(reruns)]
+        clicks = []
+        for radio in at.radio:
+            for option in radio.options:
+                radio.set_value(option)
+                clicks.append(timed_run())
+        at.toggle[0].set_value(True)
+        toggle = timed_run()
+    finally:
+        os.environ.pop("SCREENER_DATA_DIR", None)
+    return {
+        'tickers': len(corpus),
+        'cold_ms': round(cold, 1),
+        'warm_rerun_ms': round(statistics.median(warm), 1),
+        'filter_click_ms': round(statistics.median(clicks), 1),
+        'mode_toggle_ms': round(toggle, 1),
+    }
+
+
+def bench_memory(corpus: dict[str, dict], workdir: Path, sessions: int) -> dict:
+    """
+    Bytes held per snapshot, as stored vs compact, and the Python heap each
+    app session adds once the shared caches (snapshots, indexes) are warm.
+    """
+    data_dir = _app_data(corpus, workdir)
+    results = {'tickers': len(corpus)}
+    for mode in MODES:
+        df = load_snapshot(mode, data_dir)
+        compact = compact_frame(df)
+        results[f'{mode}_frame_kb'] = round(memory_bytes(df) / 1024, 1)
+        results[f'{mode}_compact_kb'] = round(memory_bytes(compact) / 1024, 1)
+        results[f'{mode}_index_kb'] = round(FilterIndex.build(compact).memory_bytes() / 1024, 1)
+
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        results['sessions'] = 'skipped: streamlit not installed'
+        return results
+
+    def heap() -> int:
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+
+    os.environ["SCREENER_DATA_DIR"] = str(data_dir)
+    tracemalloc.start()
+    try:
+        apps, held = [], [heap()]
+        for _ in range(max(sessions, 2)):
+            at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=600).run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            apps.append(at)
+            held.append(heap())
+        tracemalloc.reset_peak()
+        base = heap()
+        apps[-1].run()
+        rerun_peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+        os.environ.pop("SCREENER_DATA_DIR", None)
+    added = np.diff(held)
+    results.update({
+        'sessions': len(apps),
+        'first_session_kb': round(added[0] / 1024, 1),        # includes the shared caches
+        'per_session_kb': round(float(np.median(added[1:])) / 1024, 1),
+        'warm_rerun_peak_kb': round(rerun_peak / 1024, 1),
+    })
+    return results
+
+
+# ─────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────
+
+BENCHMARKS = ('calculate_fcf', 'batch_engine', 'run_screener', 'update', 'app_rerun', 'memory')
+
+
+def _git_version() -> str | None:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for Screener FCF Yield")
+    parser.add_argument("--corpus", default=str(DEFAULT_FIXTURES_DIR),
+                        help="Recorded fixture corpus (StatementCache directory)")
+    parser.add_argument("--record", action="store_true",
+                        help="Record ALL_TICKERS from Yahoo into --corpus and exit")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Benchmark N synthetic tickers instead of the corpus")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic universe seed")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Stubbed Yahoo latency per request, in seconds")
+    parser.add_argument("--rps", type=float, default=1000,
+                        help="Token-bucket rate for the stubbed runs")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Requests in flight for the stubbed runs")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Use adaptive concurrency in run_screener")
+    parser.add_argument("--reruns", type=int, default=5, help="Warm app reruns to time")
+    parser.add_argument("--sessions", type=int, default=4,
+                        help="App sessions to open for the memory benchmark")
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--output", help="Results JSON (default benchmarks/results/<time>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> dict:
+    args = parse_args(argv)
+    corpus_dir = Path(args.corpus)
+
+    if args.record:
+        n = record_corpus(update_data.ALL_TICKERS, corpus_dir)
+        print(f"✓ Recorded {n}/{len(update_data.ALL_TICKERS)} tickers into {corpus_dir}")
+        return {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.synthetic:
+            corpus = synthetic_corpus(args.synthetic, args.seed)
+            source = f"synthetic:{args.synthetic}:seed{args.seed}"
+            fixtures = write_fixtures(corpus, tmp / "fixtures")
+        else:
+            corpus = load_corpus(corpus_dir)
+            source = str(corpus_dir)
+            fixtures = corpus_dir
+            if not corpus:
+                sys.exit(f"No fixtures in {corpus_dir} — run with --record first, "
+                         f"or use --synthetic N")
+        tickers = list(corpus)
+
+        only = {b.strip() for b in args.only.split(",")}
+        configure_rate_limit(args.rps, args.rps)
+        results = {}
+        if 'calculate_fcf' in only:
+            results['calculate_fcf'] = bench_calculate_fcf(fixtures, tickers)
+        if 'batch_engine' in only:
+            results['batch_engine'] = bench_batch_engine(corpus)
+        if 'run_screener' in only:
+            results['run_screener'] = bench_run_screener(corpus, args.latency,
+                                                         args.concurrency, args.adaptive)
+        if 'update' in only:
+            results.update(bench_update(fixtures, tickers, args, tmp))
+        if 'app_rerun' in only:
+            results['app_rerun'] = bench_app(corpus, tmp, args.reruns)
+        if 'memory' in only:
+            results['memory'] = bench_memory(corpus, tmp, args.sessions)
+
+    report = {
+        'version': _git_version(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {'source': source, 'tickers': len(corpus), 'latency': args.latency,
+                   'rps': args.rps, 'concurrency': args.concurrency,
+                   'adaptive': args.adaptive},
+        'results': results,
+    }
+
+    output = Path(args.output) if args.output else \
+        DEFAULT_RESULTS_DIR / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    for name, r in results.items():
+        print(f"{name:<14} " + " · ".join(f"{k}={v}" for k, v in r.items()))
+    print(f"\n✓ Results written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
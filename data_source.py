@@ -0,0 +1,193 @@
+"""
+data_source.py — Pluggable market data provider for the screener.
+
+engine.py and quotes.py never call yfinance directly; they ask the active
+DataSource for one statement of one ticker, or for a bulk price download.
+Three implementations:
+
+  YahooSource      live yfinance (the default)
+  RecordingSource  wraps another source and saves every response to a
+                   fixture directory (StatementCache layout)
+  ReplaySource     serves a fixture directory — or an in-memory corpus —
+                   with injected latency, server-side 429 throttling,
+                   limited server capacity and random network failures
+
+so concurrency, retries and rate limits can be tuned reproducibly with no
+network access (see update_data.py --source and benchmarks/bench.py).
+"""
+
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+
+import pandas as pd
+import yfinance as yf
+
+from statement_cache import StatementCache
+
+
+DEFAULT_FIXTURES_DIR = Path(__file__).parent / "benchmarks" / "fixtures"
+QUOTE_KIND = 'quote'          # recorded daily closes, next to the statements
+
+
+class DataSource(ABC):
+    """What the screener needs from a market data provider."""
+
+    @abstractmethod
+    def statement(self, ticker: str, kind: str):
+        """One payload for a ticker: 'info' (dict) or a statement (DataFrame)."""
+
+    @abstractmethod
+    def download(self, tickers: list[str]) -> pd.DataFrame:
+        """Last days of daily prices, shaped like yf.download(group_by='column')."""
+
+
+class YahooSource(DataSource):
+    """Live Yahoo Finance via yfinance."""
+
+    def statement(self, ticker: str, kind: str):
+        return getattr(yf.Ticker(ticker), kind)
+
+    def download(self, tickers: list[str]) -> pd.DataFrame:
+        return yf.download(tickers, period='5d', interval='1d', group_by='column',
+                           auto_adjust=False, progress=False, threads=False)
+
+
+class RecordingSource(DataSource):
+    """Pass-through that saves every response as a replayable fixture."""
+
+    def __init__(self, inner: DataSource, root: str | Path = DEFAULT_FIXTURES_DIR):
+        self.inner = inner
+        self.store = StatementCache(root)
+
+    def statement(self, ticker: str, kind: str):
+        value = self.inner.statement(ticker, kind)
+        self.store.put(ticker, kind, value)
+        return value
+
+    def download(self, tickers: list[str]) -> pd.DataFrame:
+        df = self.inner.download(tickers)
+        if df is not None and not df.empty and 'Close' in df.columns.get_level_values(0):
+            close = df['Close']
+            if isinstance(close, pd.Series):
+                close = close.to_frame(tickers[0])
+            for ticker in close.columns:
+                self.store.put(ticker, QUOTE_KIND, close[ticker].dropna())
+        return df
+
+
+class ReplaySource(DataSource):
+    """
+    Recorded responses served back with synthetic server behaviour.
+
+    Args:
+        corpus: Fixture directory, or {ticker: {kind: payload}} in memory
+        latency: Mean seconds per request
+        jitter: Lognormal spread of the latency (0 = constant)
+        rps: Server-side budget; requests over it within a 1 s window get 429
+        slots: Requests the server handles at once; the rest queue (adds latency)
+        failure_rate: Probability of a random network error per request
+        seed: RNG seed for reproducible jitter / failures
+
+    Tickers missing from the corpus come back empty, like delisted ones.
+    """
+
+    def __init__(self, corpus: str | Path | dict = DEFAULT_FIXTURES_DIR, *,
+                 latency: float = 0.0, jitter: float = 0.0, rps: float | None = None,
+                 slots: int | None = None, failure_rate: float = 0.0,
+                 seed: int | None = None):
+        self.corpus = corpus if isinstance(corpus, dict) else \
+            StatementCache(corpus, offline=True)
+        self.latency = latency
+        self.jitter = jitter
+        self.rps = rps
+        self.failure_rate = failure_rate
+        self._slots = threading.BoundedSemaphore(slots) if slots else None
+        self._rng = random.Random(seed)
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def _lookup(self, ticker: str, kind: str):
+        if isinstance(self.corpus, dict):
+            return self.corpus.get(ticker, {}).get(kind)
+        return self.corpus.get(ticker, kind)
+
+    def _request(self, label: str) -> None:
+        """Simulate one round trip: throttle, queue, wait, maybe fail."""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.rps is not None:
+                while self._recent and now - self._recent[0] > 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rps:
+                    self.throttled += 1
+                    raise yf.exceptions.YFRateLimitError()
+                self._recent.append(now)
+            fail = self._rng.random() < self.failure_rate
+            delay = self.latency * (self._rng.lognormvariate(0, self.jitter)
+                                    if self.jitter else 1.0)
+        if self._slots is not None:
+            with self._slots:
+                time.sleep(delay)
+        else:
+            time.sleep(delay)
+        if fail:
+            with self._lock:
+                self.failed += 1
+            raise ConnectionError(f"replay: injected failure ({label})")
+
+    def statement(self, ticker: str, kind: str):
+        self._request(f"{ticker} {kind}")
+        value = self._lookup(ticker, kind)
+        if value is None:
+            return {} if kind == 'info' else pd.DataFrame()
+        return value
+
+    def download(self, tickers: list[str]) -> pd.DataFrame:
+        self._request(f"download {len(tickers)}")
+        close = {}
+        for ticker in tickers:
+            series = self._lookup(ticker, QUOTE_KIND)
+            if series is None:
+                # Corpus recorded without quotes: fall back to the info price
+                info = self._lookup(ticker, 'info') or {}
+                price = info.get('currentPrice') or info.get('regularMarketPrice')
+                if price is None:
+                    continue
+                series = pd.Series([price],
+                                   index=[pd.Timestamp.today().normalize()])
+            close[ticker] = series
+        if not close:
+            return pd.DataFrame()
+        return pd.concat({'Close': pd.DataFrame(close)}, axis=1)
+
+    def stats(self) -> dict:
+        """Requests served, throttled (429) and failed so far."""
+        return {'requests': self.requests, 'throttled': self.throttled,
+                'failed': self.failed}
+
+
+# ─────────────────────────────────────────────
+# Active source (shared by engine / quotes)
+# ─────────────────────────────────────────────
+
+_SOURCE: DataSource = YahooSource()
+
+
+def get_source() -> DataSource:
+    """The process-wide data source."""
+    return _SOURCE
+
+
+def set_source(source: DataSource) -> DataSource:
+    """Replace the process-wide data source; returns the previous one."""
+    global _SOURCE
+    previous, _SOURCE = _SOURCE, source
+    return previous
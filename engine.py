@@ -13,8 +13,11 @@ Ajustes opcionais (Modo Conservador):
 import yfinance as yf
 import pandas as pd
 import numpy as np
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from statement_cache import StatementCache
+from data_source import get_source
+from instrumentation import get_tracer
+from negative_cache import NegativeCache
+from fetcher import fetch_many, CircuitOpenError, AdaptiveConcurrency, DEFAULT_CONCURRENCY
 
 
 # ─────────────────────────────────────────────
@@ -31,13 +34,6 @@ def _safe(df: pd.DataFrame, key: str) -> float:
     return 0.0
 
 
-def _safe_series(df: pd.DataFrame, key: str) -> pd.Series:
-    """Return full row Series from a yfinance statement DataFrame (NaN kept)."""
-    if key in df.index:
-        return df.loc[key].astype(float)
-    return pd.Series(dtype=float)
-
-
 def _first_found(df: pd.DataFrame, *keys) -> float:
     """Try multiple keys in order, return the first non-zero value."""
     for k in keys:
@@ -47,151 +43,243 @@ def _first_found(df: pd.DataFrame, *keys) -> float:
     return 0.0
 
 
-# ─────────────────────────────────────────────
-# Revenue Growth (5 Years)
-# ─────────────────────────────────────────────
+# Canonical line items → ordered (statement, row label) fallbacks.
+# Shared by compute_fcf() and the batch engine so aliases resolve identically.
+FIELD_ALIASES = {
+    'fco': (('cashflow', 'Operating Cash Flow'),
+            ('cashflow', 'Total Cash From Operating Activities'),
+            ('cashflow', 'Cash Flow From Continuing Operating Activities')),
+    'wc_change': (('cashflow', 'Change In Working Capital'),),
+    'capex': (('cashflow', 'Capital Expenditure'),
+              ('cashflow', 'Capital Expenditures'),
+              ('cashflow', 'Purchase Of PPE')),
+    'depreciation': (('cashflow', 'Depreciation Amortization Depletion'),
+                     ('cashflow', 'Depreciation And Amortization'),
+                     ('income_stmt', 'Depreciation And Amortization'),
+                     ('income_stmt', 'Depreciation')),
+    'interest': (('income_stmt', 'Interest Expense'),
+                 ('income_stmt', 'Interest Expense Non Operating'),
+                 ('cashflow', 'Interest Paid Supplemental Data'),
+                 ('cashflow', 'Interest Paid Cff')),
+    'taxes': (('income_stmt', 'Tax Provision'),
+              ('income_stmt', 'Income Tax Expense'),
+              ('cashflow', 'Income Tax Paid Supplemental Data'),
+              ('cashflow', 'Taxes Refund Paid')),
+    'leases': (('balance_sheet', 'Capital Lease Obligations'),
+               ('balance_sheet', 'Lease Liabilities')),
+    'leases_long_term': (('balance_sheet', 'Long Term Capital Lease Obligation'),),
+    'leases_current': (('balance_sheet', 'Current Capital Lease Obligation'),),
+}
+
+# Revenue falls back to the second label only when the first row is absent.
+REVENUE_KEYS = ('Total Revenue', 'Revenue')
+
+
+def _field(data: dict, field: str) -> float:
+    """Resolve a canonical field through FIELD_ALIASES (first non-zero wins)."""
+    for statement, key in FIELD_ALIASES[field]:
+        v = _safe(data[statement], key)
+        if v != 0:
+            return v
+    return 0.0
 
-def _revenue_growth_5y(ticker: yf.Ticker) -> float:
-    """
-    Calculate annualized revenue growth over the last ~4-5 available periods.
-    Returns a decimal (e.g. 0.12 = 12%).
-    """
-    try:
-        inc = ticker.income_stmt
-        rev = _safe_series(inc, 'Total Revenue')
-        if rev.empty:
-            rev = _safe_series(inc, 'Revenue')
 
-        # Drop NaN values — keeps only real data points
-        rev = rev.dropna()
-        rev = rev[rev > 0]
+def _price(info: dict):
+    """Current price from a yfinance info dict (previous close as fallback)."""
+    return info.get('currentPrice', info.get('previousClose', 0))
 
-        if len(rev) < 2:
-            return 0.0
 
-        # yfinance columns are dates, most recent first
-        latest = rev.iloc[0]
-        oldest = rev.iloc[-1]  # last available (typically 4 periods back)
-        n_years = len(rev) - 1
+def _market_cap(info: dict):
+    """Market cap from info, or shares × price when Yahoo omits it."""
+    market_cap = info.get('marketCap', 0)
+    if not market_cap:
+        shares = info.get('sharesOutstanding', 0)
+        price = _price(info)
+        market_cap = shares * price if shares and price else 0
+    return market_cap
 
-        if oldest <= 0 or latest <= 0 or n_years == 0:
-            return 0.0
 
-        cagr = (latest / oldest) ** (1 / n_years) - 1
-        return cagr
-    except Exception:
-        return 0.0
+# ─────────────────────────────────────────────
+# Failure Classification
+# ─────────────────────────────────────────────
+
+# rate_limit / network are transient and retried; not_found / empty are
+# permanent and negative-cached; parse means a bug or a Yahoo format change.
+FAILURE_KINDS = ('rate_limit', 'network', 'not_found', 'empty', 'parse')
+TRANSIENT_FAILURES = frozenset({'rate_limit', 'network'})
+
+
+class FetchError(Exception):
+    """A ticker could not be fetched or calculated, with the reason why."""
+
+    def __init__(self, ticker: str, kind: str, detail: str = ''):
+        super().__init__(f"{ticker}: {kind}" + (f" ({detail})" if detail else ''))
+        self.ticker = ticker
+        self.kind = kind
+        self.detail = detail
+
+
+def classify_failure(exc: BaseException) -> str:
+    """Map an exception raised while fetching a ticker to a FAILURE_KINDS entry."""
+    if isinstance(exc, FetchError):
+        return exc.kind
+    if isinstance(exc, (yf.exceptions.YFRateLimitError, CircuitOpenError)):
+        return 'rate_limit'
+    if isinstance(exc, yf.exceptions.YFTickerMissingError):
+        return 'not_found'
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status == 429:
+        return 'rate_limit'
+    if status == 404:
+        return 'not_found'
+    if status is not None and status >= 500:
+        return 'network'
+    if isinstance(exc, (OSError, TimeoutError)):  # incl. requests / curl_cffi errors
+        return 'network'
+    if isinstance(exc, (KeyError, ValueError, TypeError, AttributeError, IndexError)):
+        return 'parse'
+    return 'network'
 
 
 # ─────────────────────────────────────────────
 # Core Calculation
 # ─────────────────────────────────────────────
 
-def calculate_fcf(ticker_symbol: str, conservative: bool = False) -> dict | None:
+STATEMENT_KINDS = ('info', 'cashflow', 'income_stmt', 'balance_sheet')
+EXPANSION_TRIGGER = 1.5   # conservative: Capex > trigger × Depreciation → expansion
+
+
+def fetch_statements(ticker_symbol: str,
+                     cache: StatementCache | None = None) -> dict:
     """
-    Calculate FCF Yield for a single ticker.
+    Download everything the methodology needs for one ticker in a single pass.
 
     Args:
         ticker_symbol: e.g. 'AAPL' or 'PETR4.SA'
+        cache: Optional StatementCache — fresh entries are served from disk
+               and only expired/missing ones are downloaded.
+
+    Returns:
+        dict with 'info', 'cashflow', 'income_stmt' and 'balance_sheet'.
+    """
+    data = {}
+    for kind in STATEMENT_KINDS:
+        value = cache.get(ticker_symbol, kind) if cache is not None else None
+        if value is None:
+            if cache is not None and cache.offline:
+                raise LookupError(f"{ticker_symbol}: '{kind}' not in cache")
+            with get_tracer().span(ticker_symbol, f'fetch:{kind}'):
+                value = get_source().statement(ticker_symbol, kind)
+            if cache is not None:
+                cache.put(ticker_symbol, kind, value)
+                if kind == 'info' and value:
+                    cache.put(ticker_symbol, 'profile', profile_from_info(value))
+        data[kind] = value
+    return data
+
+
+def profile_from_info(info: dict) -> dict:
+    """
+    Slow-moving fields of a ticker (sector, share count) for the profile cache.
+
+    Shares are implied from Yahoo's own market cap / price so that
+    shares × new price reproduces its market cap definition.
+    """
+    price = _price(info)
+    market_cap = _market_cap(info)
+    shares = market_cap / price if market_cap and price else info.get('sharesOutstanding')
+    return {'sector': info.get('sector', 'Desconhecido'), 'shares': shares}
+
+
+def latest_period(data: dict) -> str | None:
+    """Most recent fiscal period end (YYYY-MM-DD) in the cash flow statement."""
+    cf = data.get('cashflow')
+    if cf is None or cf.empty:
+        return None
+    return pd.Timestamp(cf.columns[0]).strftime('%Y-%m-%d')
+
+
+def compute_fcf(ticker_symbol: str, data: dict,
+                conservative: bool = False) -> dict | None:
+    """
+    Calculate FCF Yield for a single ticker from already downloaded data.
+
+    Args:
+        ticker_symbol: e.g. 'AAPL' or 'PETR4.SA'
+        data: Output of fetch_statements()
         conservative: If True, applies Working Capital adjustment
                       and Capex = Depreciation when Capex > 1.5× Depreciation.
 
     Returns:
-        dict with all calculated metrics, or None on failure.
+        dict with all calculated metrics (incl. the normalized multi-year
+        yields, see batch_engine.history_stats), or None on failure.
     """
     try:
-        tk = yf.Ticker(ticker_symbol)
-        info = tk.info
+        info = data['info']
 
         # ── Statements ──────────────────────────
-        cf = tk.cashflow
-        inc = tk.income_stmt
-        bs = tk.balance_sheet
+        cf = data['cashflow']
+        inc = data['income_stmt']
+        bs = data['balance_sheet']
 
         if cf.empty or inc.empty:
             return None
 
         # ── Step 1: FCO ─────────────────────────
-        fco = _first_found(cf,
-                           'Operating Cash Flow',
-                           'Total Cash From Operating Activities',
-                           'Cash Flow From Continuing Operating Activities')
+        fco = _field(data, 'fco')
 
         # ── Step 2: Adjusted FCO (Dica 2) ───────
-        wc_change = _first_found(cf, 'Change In Working Capital')
+        wc_change = _field(data, 'wc_change')
         adjusted_fco = fco - wc_change if conservative else fco
 
         # ── Capex ───────────────────────────────
-        capex_raw = _first_found(cf,
-                                 'Capital Expenditure',
-                                 'Capital Expenditures',
-                                 'Purchase Of PPE')
+        capex_raw = _field(data, 'capex')
         capex_raw = -abs(capex_raw) if capex_raw > 0 else capex_raw  # ensure negative
 
-        # ── Depreciation ────────────────────────
-        depreciation = _first_found(cf,
-                                    'Depreciation Amortization Depletion',
-                                    'Depreciation And Amortization')
-        if depreciation == 0:
-            depreciation = _first_found(inc,
-                                        'Depreciation And Amortization',
-                                        'Depreciation')
+        # ── Depreciation (cash flow, then income statement) ──
+        depreciation = _field(data, 'depreciation')
 
         # ── Step 4: Expansion Adjustment (Dica 1) ──
         capex_expansion_triggered = False
         capex = capex_raw
         if conservative and depreciation != 0:
-            if abs(capex_raw) > abs(depreciation) * 1.5:
+            if abs(capex_raw) > abs(depreciation) * EXPANSION_TRIGGER:
                 capex = -abs(depreciation)        # Maintenance Capex only
                 capex_expansion_triggered = True
 
-        # ── Interest (Juros) ────────────────────
-        interest = abs(_first_found(inc,
-                                    'Interest Expense',
-                                    'Interest Expense Non Operating'))
-        if interest == 0:
-            interest = abs(_first_found(cf,
-                                        'Interest Paid Supplemental Data',
-                                        'Interest Paid Cff'))
-
-        # ── Taxes (Impostos) ────────────────────
-        taxes = abs(_first_found(inc,
-                                 'Tax Provision',
-                                 'Income Tax Expense'))
-        if taxes == 0:
-            taxes = abs(_first_found(cf,
-                                     'Income Tax Paid Supplemental Data',
-                                     'Taxes Refund Paid'))
+        # ── Interest (Juros) — DRE, then cash flow ──
+        interest = abs(_field(data, 'interest'))
+
+        # ── Taxes (Impostos) — DRE, then cash flow ──
+        taxes = abs(_field(data, 'taxes'))
 
         # ── Leases (Arrendamentos) ──────────────
         leases = 0.0
         if not bs.empty:
-            leases = abs(_first_found(bs,
-                                      'Capital Lease Obligations',
-                                      'Lease Liabilities'))
+            leases = abs(_field(data, 'leases'))
             if leases == 0:
-                leases = abs(_safe(bs, 'Long Term Capital Lease Obligation')) \
-                       + abs(_safe(bs, 'Current Capital Lease Obligation'))
+                leases = abs(_field(data, 'leases_long_term')) \
+                       + abs(_field(data, 'leases_current'))
 
         # ── Step 3: FCF ─────────────────────────
         fcf = adjusted_fco + capex - interest - taxes - leases
 
         # ── Market Cap ──────────────────────────
-        market_cap = info.get('marketCap', 0)
-        if not market_cap:
-            shares = info.get('sharesOutstanding', 0)
-            price = info.get('currentPrice', info.get('previousClose', 0))
-            market_cap = shares * price if shares and price else 0
+        market_cap = _market_cap(info)
 
         # ── Step 5: Yield ───────────────────────
         fcf_yield = (fcf / market_cap) if market_cap else 0.0
 
-        # ── Revenue Growth 5Y (Dica 3) ──────────
-        rev_growth_5y = _revenue_growth_5y(tk)
+        # ── History: FCF of every period + revenue CAGR (Dica 3), one pass ──
+        from batch_engine import build_tensor, period_fcf, history_stats, revenue_cagr
+        tensor = build_tensor({ticker_symbol: data})
+        history = {name: float(v[0]) for name, v in
+                   history_stats(period_fcf(tensor, conservative), tensor.market_cap).items()}
+        rev_growth_5y = float(revenue_cagr(tensor.revenue)[0])
 
         # ── Sector ──────────────────────────────
         sector = info.get('sector', 'Desconhecido')
-        price = info.get('currentPrice', info.get('previousClose', 0))
+        price = _price(info)
 
         return {
             'Ticker': ticker_symbol,
@@ -199,6 +287,7 @@ def calculate_fcf(ticker_symbol: str, conservative: bool = False) -> dict | None
             'Market Cap': market_cap,
             'FCO': fco,
             'Adjusted FCO': adjusted_fco,
+            'Δ Capital de Giro': wc_change,
             'Capex': capex,
             'Capex (Raw)': capex_raw,
             'Depreciação': depreciation,
@@ -209,6 +298,7 @@ def calculate_fcf(ticker_symbol: str, conservative: bool = False) -> dict | None
             'FCF': fcf,
             'FCF Yield': fcf_yield,
             'Rev Growth 5Y': rev_growth_5y,
+            **history,
             'Setor': sector,
         }
 
@@ -216,17 +306,41 @@ def calculate_fcf(ticker_symbol: str, conservative: bool = False) -> dict | None
         return None
 
 
-def _calculate_with_retry(ticker_symbol: str, conservative: bool,
-                          max_retries: int = 3) -> dict | None:
-    """Wrap calculate_fcf with exponential backoff retry."""
-    for attempt in range(max_retries):
-        result = calculate_fcf(ticker_symbol, conservative)
-        if result is not None:
-            return result
-        # Exponential backoff: 1s, 2s, 4s
-        wait = 2 ** attempt
-        time.sleep(wait)
-    return None
+def calculate_fcf(ticker_symbol: str, conservative: bool = False,
+                  cache: StatementCache | None = None) -> dict | None:
+    """
+    Fetch and calculate FCF Yield for a single ticker.
+
+    Returns:
+        dict with all calculated metrics, or None on failure.
+    """
+    try:
+        data = fetch_statements(ticker_symbol, cache)
+    except Exception:
+        return None
+    return compute_fcf(ticker_symbol, data, conservative)
+
+
+def has_statements(data: dict | None) -> bool:
+    """True if the ticker has the cash flow and income statement FCF needs."""
+    return data is not None and not data['cashflow'].empty and not data['income_stmt'].empty
+
+
+def fetch_valid_statements(ticker_symbol: str,
+                           cache: StatementCache | None = None) -> dict:
+    """
+    fetch_statements(), raising FetchError when the ticker is unusable:
+    'not_found' for symbols Yahoo doesn't know (no quote, no statements),
+    'empty' when the statements FCF needs are missing.
+    """
+    data = fetch_statements(ticker_symbol, cache)
+    if has_statements(data):
+        return data
+    info = data['info'] or {}
+    if not _price(info) and not _market_cap(info) \
+            and data['cashflow'].empty and data['income_stmt'].empty:
+        raise FetchError(ticker_symbol, 'not_found', 'no quote and no statements')
+    raise FetchError(ticker_symbol, 'empty', 'missing cash flow or income statement')
 
 
 # ─────────────────────────────────────────────
@@ -234,6 +348,10 @@ def _calculate_with_retry(ticker_symbol: str, conservative: bool,
 # ─────────────────────────────────────────────
 
 COMMODITY_SECTORS = {'Energy', 'Basic Materials', 'Utilities'}
+YIELD_TARGET = 0.10             # "Barato" at or above, general sectors
+COMMODITY_YIELD_TARGET = 0.15   # "Barato" at or above, COMMODITY_SECTORS
+FAIR_BAND = 0.7                 # "Justo" from FAIR_BAND × target
+
 
 def classify_status(row: pd.Series) -> str:
     """
@@ -242,24 +360,134 @@ def classify_status(row: pd.Series) -> str:
     - General:                                ≥10 % → Barato
     """
     y = row['FCF Yield']
-    threshold = 0.15 if row['Setor'] in COMMODITY_SECTORS else 0.10
+    threshold = COMMODITY_YIELD_TARGET if row['Setor'] in COMMODITY_SECTORS else YIELD_TARGET
 
     if y >= threshold:
         return '🟢 Barato'
-    elif y >= threshold * 0.7:
+    elif y >= threshold * FAIR_BAND:
         return '🟡 Justo'
     else:
         return '🔴 Caro'
 
 
+def classify_status_array(fcf_yield: np.ndarray, sectors: np.ndarray,
+                          yield_target: float = YIELD_TARGET,
+                          commodity_yield_target: float = COMMODITY_YIELD_TARGET,
+                          fair_band: float = FAIR_BAND,
+                          commodity_sectors=COMMODITY_SECTORS) -> np.ndarray:
+    """Vectorized classify_status() over whole columns, with overridable benchmarks."""
+    fcf_yield = np.asarray(fcf_yield, dtype=float)
+    is_commodity = np.isin(np.asarray(sectors, dtype=object), list(commodity_sectors))
+    threshold = np.where(is_commodity, commodity_yield_target, yield_target)
+    return np.where(fcf_yield >= threshold, '🟢 Barato',
+                    np.where(fcf_yield >= threshold * fair_band, '🟡 Justo', '🔴 Caro')).astype(object)
+
+
 # ─────────────────────────────────────────────
 # Batch Runner
 # ─────────────────────────────────────────────
 
+def results_to_frame(results: list[dict]) -> pd.DataFrame:
+    """Build the ranked screener DataFrame (Status + sort by FCF Yield)."""
+    if not results:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(results)
+    df['Status'] = classify_status_array(df['FCF Yield'].to_numpy(), df['Setor'].to_numpy())
+    df.sort_values('FCF Yield', ascending=False, inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def fetch_universe(tickers: list[str],
+                   progress_callback=None,
+                   max_workers: int = DEFAULT_CONCURRENCY,
+                   cache: StatementCache | None = None,
+                   on_done=None,
+                   negative_cache: NegativeCache | None = None,
+                   failures: dict | None = None,
+                   adaptive: bool | AdaptiveConcurrency = False) -> dict[str, dict]:
+    """
+    Download raw statements for every ticker through the async fetch
+    pipeline (shared token-bucket rate limit, circuit breaker, retries with
+    backoff for transient failures only). Failures are left out.
+
+    Args:
+        progress_callback: Optional callable(current, total) for progress updates
+        max_workers: Maximum fetches in flight (the starting point if adaptive)
+        cache: Optional StatementCache — cached kinds cost no rate-limit tokens
+        on_done: Optional callable(ticker, data_or_None, failure_kind_or_None)
+                 per finished ticker
+        negative_cache: Optional NegativeCache — blocked tickers are skipped
+                        (failure kind 'negative_cached'), permanent failures
+                        are added and successes removed
+        failures: Optional dict filled with {ticker: failure kind}
+        adaptive: Adjust the in-flight limit at runtime (AIMD on latency and
+                  rate-limit / network errors) instead of fixing it; pass an
+                  AdaptiveConcurrency to read its current `limit` while running
+
+    Returns:
+        {ticker: fetch_statements() output}, in the input ticker order.
+    """
+    tickers = [t.strip() for t in tickers]
+    total = len(tickers)
+    completed = 0
+    offline = cache is not None and cache.offline
+    failures = failures if failures is not None else {}
+    if isinstance(adaptive, AdaptiveConcurrency):
+        limiter = adaptive
+    else:
+        limiter = AdaptiveConcurrency(max_workers) if adaptive else max_workers
+
+    def cost(ticker: str) -> int:
+        if cache is None:
+            return len(STATEMENT_KINDS)
+        return 0 if offline else len(cache.missing(ticker, STATEMENT_KINDS))
+
+    def done(ticker: str, data: dict | None, kind: str | None = None) -> None:
+        nonlocal completed
+        completed += 1
+        if negative_cache is not None and not offline:
+            if kind is None:
+                negative_cache.discard(ticker)
+            elif kind != 'negative_cached':
+                negative_cache.add(ticker, kind)
+        if on_done:
+            on_done(ticker, data, kind)
+        if progress_callback:
+            progress_callback(completed, total)
+
+    to_fetch = []
+    for t in tickers:
+        blocked = negative_cache.get(t) if negative_cache is not None else None
+        if blocked:
+            failures[t] = 'negative_cached'
+            done(t, None, 'negative_cached')
+        else:
+            to_fetch.append(t)
+
+    fetched, failed = fetch_many(
+        to_fetch,
+        lambda t: fetch_valid_statements(t, cache),
+        classify=classify_failure,
+        transient=TRANSIENT_FAILURES,
+        cost=cost,
+        concurrency=limiter,
+        max_retries=1 if offline else 3,  # a cache miss won't fix itself
+        on_done=done,
+    )
+    failures.update(failed)
+    return {t: fetched[t] for t in tickers if t in fetched}
+
+
 def run_screener(tickers: list[str],
                  conservative: bool = False,
                  progress_callback=None,
-                 max_workers: int = 5) -> pd.DataFrame:
+                 max_workers: int = DEFAULT_CONCURRENCY,
+                 cache: StatementCache | None = None,
+                 negative_cache: NegativeCache | None = None,
+                 adaptive: bool | AdaptiveConcurrency = False,
+                 on_done=None) -> pd.DataFrame:
     """
     Run the screener for a list of tickers with rate limiting.
 
@@ -267,40 +495,39 @@ def run_screener(tickers: list[str],
         tickers: List of ticker symbols
         conservative: Conservative mode toggle
         progress_callback: Optional callable(current, total) for progress updates
-        max_workers: Number of parallel workers (keep low to avoid rate limits)
+        max_workers: Maximum fetches in flight (the request rate itself is
+                     capped by the shared token bucket in fetcher.py)
+        cache: Optional StatementCache for raw statements
+        negative_cache: Optional NegativeCache of permanently failing tickers
+        adaptive: Let the in-flight limit grow while Yahoo is healthy and
+                  back off when it slows down or throttles (starts at max_workers;
+                  an AdaptiveConcurrency instance exposes the current limit)
+        on_done: Optional callable(ticker, data_or_None, failure_kind_or_None)
+                 as each ticker finishes, e.g. to render partial results
     """
-    results = []
-    total = len(tickers)
-    completed = 0
+    from batch_engine import build_tensor, compute_batch
 
-    # Process in batches with controlled concurrency
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_ticker = {}
-        for i, t in enumerate(tickers):
-            # Stagger submissions to avoid burst requests
-            if i > 0 and i % max_workers == 0:
-                time.sleep(1.0)  # pause between each batch
-            future = executor.submit(_calculate_with_retry, t.strip(), conservative)
-            future_to_ticker[future] = t.strip()
-
-        for future in as_completed(future_to_ticker):
-            ticker = future_to_ticker[future]
-            completed += 1
-            try:
-                row = future.result()
-                if row is not None:
-                    results.append(row)
-            except Exception:
-                pass  # already handled in retry wrapper
-
-            if progress_callback:
-                progress_callback(completed, total)
+    data = fetch_universe(tickers, progress_callback, max_workers, cache, on_done=on_done,
+                          negative_cache=negative_cache, adaptive=adaptive)
+    return compute_batch(build_tensor(data), conservative)
 
-    if not results:
-        return pd.DataFrame()
 
-    df = pd.DataFrame(results)
-    df['Status'] = df.apply(classify_status, axis=1)
-    df.sort_values('FCF Yield', ascending=False, inplace=True)
-    df.reset_index(drop=True, inplace=True)
-    return df
+def run_screener_modes(tickers: list[str],
+                       progress_callback=None,
+                       max_workers: int = DEFAULT_CONCURRENCY,
+                       cache: StatementCache | None = None,
+                       negative_cache: NegativeCache | None = None,
+                       adaptive: bool | AdaptiveConcurrency = False,
+                       on_done=None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Run the screener for both modes, downloading each ticker only once.
+    Arguments are the same as run_screener().
+
+    Returns:
+        (df_normal, df_conservative)
+    """
+    from batch_engine import screen_batch
+
+    data = fetch_universe(tickers, progress_callback, max_workers, cache, on_done=on_done,
+                          negative_cache=negative_cache, adaptive=adaptive)
+    return screen_batch(data)
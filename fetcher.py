@@ -0,0 +1,340 @@
+"""
+fetcher.py — Asyncio fetch pipeline with a shared token-bucket rate limiter.
+
+Every network caller (nightly job, Streamlit refresh, bulk quotes) draws
+from the same process-wide TokenBucket, so the allowed request budget is
+used without idle gaps and never exceeded, however many callers run.
+Blocking yfinance calls run in a worker thread pool; only transient failures are
+retried, with `asyncio.sleep` backoff that releases the concurrency slot.
+A shared CircuitBreaker pauses every caller when Yahoo starts throttling.
+With AdaptiveConcurrency, the number of requests in flight follows Yahoo's
+health (AIMD on latency and errors) instead of a hand-picked constant.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import get_tracer
+
+
+DEFAULT_RPS = 4.0          # sustained Yahoo requests per second
+DEFAULT_BURST = 8          # tokens available after an idle period
+DEFAULT_CONCURRENCY = 8    # requests in flight
+ADAPTIVE_MAX_CONCURRENCY = 32
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve tokens up front and wait for
+    their turn, so waiting is FIFO and the rate holds across threads and
+    event loops.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RPS, capacity: float = DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, rate: float | None = None, capacity: float | None = None) -> None:
+        with self._lock:
+            if rate is not None:
+                self.rate = rate
+            if capacity is not None:
+                self.capacity = capacity
+                self._tokens = min(self._tokens, capacity)
+
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens (possibly going into debt); return seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        if tokens <= 0:
+            return
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: float = 1.0) -> None:
+        if tokens <= 0:
+            return
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class CircuitOpenError(Exception):
+    """Raised when the breaker has tripped too often and stops the run."""
+
+
+class CircuitBreaker:
+    """
+    Pauses all fetches after `threshold` consecutive rate-limit responses.
+
+    While open, every caller waits out the cooldown; the first response after
+    it decides (half-open): throttled again → reopen with a doubled cooldown,
+    anything else → closed. After `max_trips` trips in a row the breaker
+    gives up for `max_cooldown` and fetches fail fast instead of hanging.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0,
+                 max_cooldown: float = 600.0, max_trips: int = 5):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_trips = max_trips
+        self.trips = 0
+        self._cooldown = cooldown
+        self._consecutive = 0
+        self._half_open = False
+        self._open_until = 0.0
+        self._exhausted_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, rate_limited: bool) -> None:
+        """Feed the outcome of one request."""
+        with self._lock:
+            now = time.monotonic()
+            if not rate_limited:
+                self._consecutive = 0
+                if now >= self._open_until:
+                    self._half_open = False
+                    self._cooldown = self.base_cooldown
+                    self.trips = 0
+                return
+            self._consecutive += 1
+            if now < self._open_until:
+                return  # already open — stragglers from before the trip
+            if self._half_open or self._consecutive >= self.threshold:
+                self.trips += 1
+                self._open_until = now + self._cooldown
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                self._consecutive = 0
+                self._half_open = True
+                if self.trips >= self.max_trips:
+                    self._exhausted_until = self._open_until + self.max_cooldown
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    async def wait(self) -> None:
+        """Block while the breaker is open; raise if it has given up."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._exhausted_until:
+                    raise CircuitOpenError("Yahoo keeps rate limiting — giving up for now")
+                if self._exhausted_until and now >= self._exhausted_until:
+                    self.trips, self._exhausted_until = 0, 0.0
+                delay = self._open_until - now
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on requests in flight, adjusted from what each request saw.
+
+    A success at normal latency grows the limit additively (+1 per full
+    window of `limit` successes); a rate-limit / network error or a latency
+    spike halves it. The baseline is a smoothed mean and mean deviation of
+    per-request latency over successes (as TCP estimates round-trip time):
+    a spike is a latency above both `latency_factor` × the mean and the
+    mean + 4 deviations, so Yahoo's ordinary variance — and lasting shifts,
+    which the averages follow — don't read as congestion. No spike is
+    flagged before `warmup` successes. Only
+    requests started after the last decrease can trigger another one, so a
+    single congestion event shrinks the limit once, not once per request.
+    With min_limit == max_limit it is a plain fixed limit.
+    """
+
+    CONGESTION = frozenset({'rate_limit', 'network'})
+
+    def __init__(self, initial: int = DEFAULT_CONCURRENCY, min_limit: int = 1,
+                 max_limit: int = ADAPTIVE_MAX_CONCURRENCY,
+                 latency_factor: float = 2.0, decrease: float = 0.5,
+                 smoothing: float = 0.1, warmup: int = 5):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.latency_factor = latency_factor
+        self.decrease = decrease
+        self.smoothing = smoothing
+        self.warmup = warmup
+        self.in_flight = 0
+        self._limit = float(min(max(initial, min_limit), self.max_limit))
+        self._baseline = None       # smoothed seconds per request (successes)
+        self._deviation = 0.0       # smoothed |latency − baseline|
+        self._samples = 0
+        self._last_decrease = float('-inf')
+        self._cond = None
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    async def acquire(self) -> float:
+        """Wait for a free slot; return the time it was granted."""
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started: float, kind: str | None, requests: float = 1) -> None:
+        """Free a slot and adapt the limit to the request's outcome."""
+        latency = time.monotonic() - started
+        async with self._cond:
+            self.in_flight -= 1
+            self._adapt(started, latency, kind, requests)
+            self._cond.notify_all()
+
+    def _adapt(self, started: float, latency: float, kind: str | None,
+               requests: float) -> None:
+        if self.min_limit == self.max_limit:
+            return
+        congested = kind in self.CONGESTION
+        if kind is None and requests > 0:
+            per_request = latency / requests
+            congested = self._samples >= self.warmup and per_request > max(
+                self.latency_factor * self._baseline, self._baseline + 4 * self._deviation)
+            if self._baseline is None:
+                self._baseline, self._deviation = per_request, per_request / 2
+            else:
+                error = per_request - self._baseline
+                self._deviation += self.smoothing * (abs(error) - self._deviation)
+                self._baseline += self.smoothing * error
+            self._samples += 1
+        if congested:
+            if started >= self._last_decrease:
+                self._limit = max(self.min_limit, self._limit * self.decrease)
+                self._last_decrease = time.monotonic()
+        elif kind is None:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+
+_BUCKET = TokenBucket()
+_BREAKER = CircuitBreaker()
+
+
+def get_bucket() -> TokenBucket:
+    """The process-wide bucket shared by all callers."""
+    return _BUCKET
+
+
+def get_breaker() -> CircuitBreaker:
+    """The process-wide circuit breaker shared by all callers."""
+    return _BREAKER
+
+
+def configure_rate_limit(rps: float, burst: float | None = None) -> None:
+    """Change the shared request budget (e.g. from CLI flags)."""
+    _BUCKET.configure(rate=rps, capacity=burst)
+
+
+async def fetch_many_async(tickers: list[str], fetch, *,
+                           classify=None,
+                           transient=frozenset({'rate_limit', 'network'}),
+                           cost=None,
+                           bucket: TokenBucket | None = None,
+                           breaker: CircuitBreaker | None = None,
+                           concurrency: int | AdaptiveConcurrency = DEFAULT_CONCURRENCY,
+                           max_retries: int = 3,
+                           on_done=None) -> tuple[dict, dict]:
+    """
+    Run the blocking fetch(ticker) for every ticker under the rate limit.
+
+    Args:
+        fetch: Blocking callable(ticker) → result (run in a worker thread);
+               raises on failure
+        classify: Optional callable(exception) → failure kind (default 'error')
+        transient: Failure kinds worth retrying; 'rate_limit' also feeds the
+                   circuit breaker
+        cost: Optional callable(ticker) → tokens (requests) the fetch will use
+        bucket: Rate limiter (default: the shared bucket)
+        breaker: Circuit breaker (default: the shared breaker)
+        concurrency: Maximum fetches in flight, or an AdaptiveConcurrency
+                     that adjusts it from latency and errors while running
+        max_retries: Attempts per ticker (exponential backoff 1s, 2s, 4s…)
+        on_done: Optional callable(ticker, result_or_None, failure_kind_or_None),
+                 called in the caller's thread as each ticker finishes
+
+    Returns:
+        ({ticker: result}, {ticker: failure kind})
+    """
+    bucket = bucket or _BUCKET
+    breaker = breaker or _BREAKER
+    if isinstance(concurrency, AdaptiveConcurrency):
+        limiter = concurrency
+    else:
+        limiter = AdaptiveConcurrency(concurrency, min_limit=concurrency, max_limit=concurrency)
+    results, failures = {}, {}
+    # Own pool: the default executor (cpu_count + 4 threads) would silently
+    # cap requests in flight below the limiter's ceiling on small runners
+    pool = ThreadPoolExecutor(max_workers=limiter.max_limit)
+    loop = asyncio.get_running_loop()
+    tracer = get_tracer()
+
+    async def one(ticker: str) -> None:
+        value, kind = None, None
+        for attempt in range(max_retries):
+            queued = time.perf_counter()
+            try:
+                await breaker.wait()
+            except CircuitOpenError:
+                kind = 'rate_limit'
+                break
+            requests = cost(ticker) if cost else 1
+            # Slot first, then tokens: only requests about to be sent draw
+            # from the shared bucket, and the latency excludes the token wait
+            await limiter.acquire()
+            await bucket.acquire(requests)
+            started = time.monotonic()
+            tracer.add(ticker, 'queue', queued, time.perf_counter() - queued)
+            try:
+                with tracer.span(ticker, 'attempt'):
+                    value, kind = await loop.run_in_executor(pool, fetch, ticker), None
+            except Exception as exc:
+                value, kind = None, classify(exc) if classify else 'error'
+            await limiter.release(started, kind, requests)
+            breaker.record(kind == 'rate_limit')
+            if kind is None or kind not in transient:
+                break
+            if attempt < max_retries - 1:
+                with tracer.span(ticker, 'backoff'):
+                    await asyncio.sleep(2 ** attempt)
+        if kind is None:
+            results[ticker] = value
+        else:
+            failures[ticker] = kind
+        if on_done:
+            on_done(ticker, value, kind)
+
+    try:
+        await asyncio.gather(*(one(t) for t in tickers))
+    finally:
+        pool.shutdown(wait=False)
+    return results, failures
+
+
+def fetch_many(tickers: list[str], fetch, **kwargs) -> tuple[dict, dict]:
+    """Synchronous entry point for fetch_many_async()."""
+    coro = fetch_many_async(tickers, fetch, **kwargs)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Already inside an event loop (e.g. a notebook): run on a helper thread
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
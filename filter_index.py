@@ -0,0 +1,147 @@
+"""
+filter_index.py — Precomputed filter index over a screener snapshot.
+
+Built once per loaded snapshot: market, status and sector become small
+integer codes and the FCF Yield order is sorted once, so every view the
+app offers (market × status × sectors) and every KPI count is a boolean
+mask intersection plus a bincount — no string scans or re-sorts per rerun.
+Snapshots loaded compact (snapshot.compact_frame) already carry these codes
+as categoricals, so building the index reads them without any string work.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+MARKETS = ('B3', 'US')                          # B3 = tickers ending in .SA
+STATUSES = ('🟢 Barato', '🟡 Justo', '🔴 Caro')
+STATUS_KEYWORDS = ('barato', 'justo', 'caro')   # tolerant of emoji / spacing drift
+
+
+def _fixed_codes(values: pd.Series, categories: tuple) -> np.ndarray | None:
+    """Codes of a categorical whose categories are exactly `categories`, else None."""
+    if isinstance(values.dtype, pd.CategoricalDtype) \
+            and tuple(values.cat.categories) == categories:
+        return values.cat.codes.to_numpy()
+    return None
+
+
+def market_codes(tickers: pd.Series) -> np.ndarray:
+    """(N,) int8 index into MARKETS."""
+    return np.where(tickers.astype(str).str.endswith('.SA').to_numpy(), 0, 1).astype(np.int8)
+
+
+def status_codes(labels: pd.Series) -> np.ndarray:
+    """(N,) int8 index into STATUSES (-1 if unknown), matched by keyword."""
+    codes = _fixed_codes(labels, STATUSES)
+    if codes is not None:
+        return codes.astype(np.int8)
+    # Match each distinct status label once, then broadcast via the codes
+    status_cat = pd.Categorical(labels)
+    status_map = np.full(len(status_cat.categories) + 1, -1, dtype=np.int8)
+    for i, label in enumerate(status_cat.categories):
+        lowered = str(label).lower()
+        for code, keyword in enumerate(STATUS_KEYWORDS):
+            if keyword in lowered:
+                status_map[i] = code
+                break
+    return status_map[status_cat.codes]   # code -1 → last slot (-1)
+
+
+@dataclass(frozen=True)
+class FilterIndex:
+    """Read-only codes + yield order for one snapshot DataFrame."""
+
+    df: pd.DataFrame
+    market: np.ndarray        # (N,) int8 index into MARKETS
+    status: np.ndarray        # (N,) int8 index into STATUSES, -1 if unknown
+    sector: np.ndarray        # (N,) int32 index into sectors, -1 if missing
+    sectors: tuple            # sorted sector names
+    order_desc: np.ndarray    # positions by FCF Yield, highest first (NaN last)
+    order_asc: np.ndarray     # positions by FCF Yield, lowest first (NaN last)
+    version: str = ''         # identifies the snapshot the index was built from
+
+    def __post_init__(self):
+        # Shared by every session (see shared_snapshot.py): codes and orders are read-only
+        for a in (self.market, self.status, self.sector, self.order_desc, self.order_asc):
+            a.flags.writeable = False
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, version: str = '') -> 'FilterIndex':
+        df = df.reset_index(drop=True)
+        n = len(df)
+        if n == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(df, empty.astype(np.int8), empty.astype(np.int8),
+                       empty.astype(np.int32), (), empty, empty, version)
+
+        market = _fixed_codes(df['Mercado'], MARKETS) if 'Mercado' in df.columns else None
+        market = (market_codes(df['Ticker']) if market is None else market).astype(np.int8)
+        status = status_codes(df['Status'])
+
+        sector_cat = pd.Categorical(df['Setor'])      # categories come out sorted
+        sectors = tuple(sector_cat.categories)
+        sector = sector_cat.codes.astype(np.int32)
+
+        y = df['FCF Yield'].to_numpy(dtype=float)
+        order_desc = np.argsort(-y, kind='stable')
+        order_asc = np.argsort(y, kind='stable')
+        return cls(df, market, status, sector, sectors, order_desc, order_asc, version)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the frame (deep) plus the code and order arrays."""
+        arrays = (self.market, self.status, self.sector, self.order_desc, self.order_asc)
+        return int(self.df.memory_usage(deep=True).sum()) + sum(a.nbytes for a in arrays)
+
+    # ── Masks ───────────────────────────────
+    def mask(self, market: str | None = None, status: str | None = None,
+             sectors: list[str] | None = None) -> np.ndarray:
+        """Boolean mask for a market (MARKETS), a status (STATUSES) and sectors."""
+        m = np.ones(len(self), dtype=bool)
+        if market is not None:
+            m &= self.market == MARKETS.index(market)
+        if status is not None:
+            m &= self.status == STATUSES.index(status)
+        if sectors is not None:
+            m &= self.sector_mask(sectors)
+        return m
+
+    def sector_mask(self, sectors: list[str]) -> np.ndarray:
+        """True where the row's sector is one of `sectors`."""
+        wanted = np.zeros(len(self.sectors) + 1, dtype=bool)   # last slot = missing
+        lookup = {s: i for i, s in enumerate(self.sectors)}
+        for s in sectors:
+            if s in lookup:
+                wanted[lookup[s]] = True
+        return wanted[self.sector]
+
+    # ── Aggregates ──────────────────────────
+    def status_counts(self, mask: np.ndarray) -> dict[str, int]:
+        """Rows per status within the mask."""
+        codes = self.status[mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(STATUSES))
+        return dict(zip(STATUSES, counts.tolist()))
+
+    def sectors_in(self, mask: np.ndarray) -> list[str]:
+        """Sorted sectors present within the mask."""
+        codes = self.sector[mask]
+        present = np.bincount(codes[codes >= 0], minlength=len(self.sectors)) > 0
+        return [s for s, p in zip(self.sectors, present) if p]
+
+    def best(self, mask: np.ndarray) -> pd.Series | None:
+        """Row with the highest FCF Yield within the mask."""
+        hits = self.order_desc[mask[self.order_desc]]
+        return self.df.iloc[hits[0]] if len(hits) else None
+
+    # ── Views ───────────────────────────────
+    def select(self, mask: np.ndarray, ascending: bool = False,
+               columns: list[str] | None = None) -> pd.DataFrame:
+        """Masked rows in FCF Yield order, with a fresh RangeIndex (only `columns` if given)."""
+        order = self.order_asc if ascending else self.order_desc
+        df = self.df if columns is None else self.df[columns]
+        return df.take(order[mask[order]]).reset_index(drop=True)
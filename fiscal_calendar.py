@@ -0,0 +1,75 @@
+"""
+fiscal_calendar.py — Last known fiscal period per ticker.
+
+Drives the incremental update: statements are only re-downloaded when a new
+annual filing can plausibly exist (the next fiscal year has closed and the
+usual filing lag has passed) or when the stored statements are too old.
+Everyone else only gets a price / market cap refresh.
+
+Stored as data/fiscal_calendar.json:
+  {"PETR4.SA": {"period_end": "2025-12-31", "checked": "2026-05-05T06:03:11+00:00"}}
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+DEFAULT_CALENDAR_FILE = Path(__file__).parent / "data" / "fiscal_calendar.json"
+
+FISCAL_YEAR = timedelta(days=365)
+MIN_FILING_LAG = timedelta(days=20)      # earliest annual filings after year end
+RECHECK_INTERVAL = timedelta(days=3)     # while a new filing is pending
+MAX_STATEMENT_AGE = timedelta(days=90)   # catch restatements / odd calendars
+
+
+class FiscalCalendar:
+    """Per-ticker fiscal period end + last statement check."""
+
+    def __init__(self, path: str | Path = DEFAULT_CALENDAR_FILE):
+        self.path = Path(path)
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except Exception:
+                self.entries = {}
+
+    def needs_statements(self, ticker: str, now: datetime | None = None) -> bool:
+        """True if the ticker's statements should be re-downloaded."""
+        now = now or datetime.now(timezone.utc)
+        entry = self.entries.get(ticker)
+        if not entry or not entry.get('period_end') or not entry.get('checked'):
+            return True
+
+        period_end = datetime.fromisoformat(entry['period_end']).replace(tzinfo=timezone.utc)
+        checked = datetime.fromisoformat(entry['checked'])
+        since_check = now - checked
+
+        if since_check >= MAX_STATEMENT_AGE:
+            return True
+
+        # Next fiscal year closed + filing lag passed → new period plausible
+        next_filing = period_end + FISCAL_YEAR + MIN_FILING_LAG
+        return now >= next_filing and since_check >= RECHECK_INTERVAL
+
+    def record(self, ticker: str, period_end: str | None,
+               now: datetime | None = None) -> None:
+        """Store the latest fiscal period seen for a ticker."""
+        now = now or datetime.now(timezone.utc)
+        self.entries[ticker] = {
+            'period_end': period_end,
+            'checked': now.isoformat(),
+        }
+
+    def save(self) -> None:
+        """Write the calendar atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, self.path)
@@ -0,0 +1,171 @@
+"""
+history.py — Append-only daily history of the screener results.
+
+update_data.py appends each run's rows (both modes) to monthly Parquet
+partitions:
+
+  data/history/normal/2026-05.parquet
+  data/history/conservative/2026-05.parquet
+
+Each partition is sorted by Ticker, then Date, and written in small row
+groups, so a per-ticker query only opens the months in the requested range
+and only reads the row groups whose Ticker statistics match. Re-running a
+day replaces that day's rows instead of duplicating them.
+"""
+
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from snapshot import DATA_DIR, _atomic_write
+
+
+HISTORY_DIR = DATA_DIR / "history"
+
+ROW_GROUP_SIZE = 2048  # rows; small enough for row-group pruning by Ticker
+
+HISTORY_SCHEMA = pa.schema([
+    pa.field('Date', pa.date32()),
+    pa.field('Ticker', pa.string()),
+    pa.field('Setor', pa.string()),
+    pa.field('Preço', pa.float64()),
+    pa.field('Market Cap', pa.float64()),
+    pa.field('FCF', pa.float64()),
+    pa.field('FCF Yield', pa.float64()),
+    pa.field('Status', pa.string()),
+])
+
+HISTORY_COLUMNS = tuple(HISTORY_SCHEMA.names)
+
+
+def partition_path(mode: str, month: str, history_dir: str | Path = HISTORY_DIR) -> Path:
+    """Parquet partition for a mode and a 'YYYY-MM' month."""
+    return Path(history_dir) / mode / f"{month}.parquet"
+
+
+def _months(start: date, end: date) -> list[str]:
+    """'YYYY-MM' labels from start to end, inclusive."""
+    return [p.strftime('%Y-%m') for p in pd.period_range(start, end, freq='M')]
+
+
+def append_history(df: pd.DataFrame, mode: str, day: date,
+                   history_dir: str | Path = HISTORY_DIR) -> Path:
+    """
+    Add one day's screener rows to the mode's monthly partition.
+
+    Rows already stored for `day` are replaced, so re-running an update on
+    the same day is idempotent.
+
+    Returns:
+        Path of the partition written.
+    """
+    rows = df[[c for c in HISTORY_COLUMNS if c != 'Date' and c in df.columns]].copy()
+    rows.insert(0, 'Date', day)
+    for col in HISTORY_COLUMNS:
+        if col not in rows.columns:
+            rows[col] = None
+    new = pa.Table.from_pandas(rows[list(HISTORY_COLUMNS)], schema=HISTORY_SCHEMA,
+                               preserve_index=False)
+
+    path = partition_path(mode, day.strftime('%Y-%m'), history_dir)
+    if path.exists():
+        old = pq.read_table(path, schema=HISTORY_SCHEMA)
+        old = old.filter(pc.not_equal(old['Date'], pa.scalar(day, pa.date32())))
+        new = pa.concat_tables([old, new])
+    new = new.sort_by([('Ticker', 'ascending'), ('Date', 'ascending')])
+
+    _atomic_write(path, lambda tmp: pq.write_table(
+        new, tmp, compression='zstd', row_group_size=ROW_GROUP_SIZE))
+    return path
+
+
+def load_history(mode: str = 'normal',
+                 tickers: list[str] | None = None,
+                 sectors: list[str] | None = None,
+                 start: date | str | None = None,
+                 end: date | str | None = None,
+                 columns: list[str] | None = None,
+                 history_dir: str | Path = HISTORY_DIR) -> pd.DataFrame:
+    """
+    Daily rows for the given tickers / sectors between start and end.
+
+    Only the monthly partitions overlapping the date range are opened, and
+    the ticker / sector / date filters are pushed down to the Parquet
+    reader.
+
+    Returns:
+        DataFrame sorted by Ticker and Date (empty if nothing matches).
+    """
+    root = Path(history_dir) / mode
+    files = sorted(root.glob('*.parquet')) if root.exists() else []
+    start = pd.Timestamp(start).date() if start is not None else None
+    end = pd.Timestamp(end).date() if end is not None else None
+    if files and (start or end):
+        first = start or date.fromisoformat(files[0].stem + '-01')
+        last = end or date.fromisoformat(files[-1].stem + '-01')
+        wanted = set(_months(first, last))
+        files = [f for f in files if f.stem in wanted]
+    columns = list(columns) if columns else list(HISTORY_COLUMNS)
+    if not files:
+        return pd.DataFrame(columns=columns)
+
+    expr = None
+    conditions = []
+    if tickers is not None:
+        conditions.append(ds.field('Ticker').isin(list(tickers)))
+    if sectors is not None:
+        conditions.append(ds.field('Setor').isin(list(sectors)))
+    if start is not None:
+        conditions.append(ds.field('Date') >= pa.scalar(start, pa.date32()))
+    if end is not None:
+        conditions.append(ds.field('Date') <= pa.scalar(end, pa.date32()))
+    for c in conditions:
+        expr = c if expr is None else expr & c
+
+    dataset = ds.dataset([str(f) for f in files], schema=HISTORY_SCHEMA, format='parquet')
+    table = dataset.to_table(columns=columns, filter=expr)
+    df = table.to_pandas()
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date'])
+    sort_cols = [c for c in ('Ticker', 'Date') if c in df.columns]
+    if sort_cols:
+        df.sort_values(sort_cols, inplace=True, kind='stable')
+        df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def ticker_history(ticker: str, mode: str = 'normal',
+                   start: date | str | None = None,
+                   end: date | str | None = None,
+                   history_dir: str | Path = HISTORY_DIR) -> pd.DataFrame:
+    """FCF Yield / Status series of one ticker, indexed by Date."""
+    df = load_history(mode, tickers=[ticker], start=start, end=end,
+                      columns=['Date', 'FCF Yield', 'Status'], history_dir=history_dir)
+    return df.set_index('Date')
+
+
+def sector_history(sector: str, mode: str = 'normal',
+                   start: date | str | None = None,
+                   end: date | str | None = None,
+                   history_dir: str | Path = HISTORY_DIR) -> pd.DataFrame:
+    """
+    Daily summary of a sector: median FCF Yield, number of tickers and the
+    count of each Status, indexed by Date.
+    """
+    df = load_history(mode, sectors=[sector], start=start, end=end,
+                      columns=['Date', 'Ticker', 'FCF Yield', 'Status'],
+                      history_dir=history_dir)
+    if df.empty:
+        return pd.DataFrame(columns=['FCF Yield', 'Tickers'])
+    grouped = df.groupby('Date')
+    summary = pd.DataFrame({
+        'FCF Yield': grouped['FCF Yield'].median(),
+        'Tickers': grouped['Ticker'].nunique(),
+    })
+    status = pd.crosstab(df['Date'], df['Status'])
+    return summary.join(status)
@@ -0,0 +1,168 @@
+"""
+instrumentation.py — Per-ticker timing spans for fetch runs.
+
+The fetch pipeline and the engine record what each ticker spent its time
+on into the active RunTrace:
+
+  queue         waiting for the circuit breaker, token bucket and a slot
+  attempt       one fetch attempt (all network calls + cache reads)
+  fetch:<kind>  one Yahoo request (info, cashflow, income_stmt, balance_sheet)
+  backoff       sleeping before a retry (one span per retry)
+  compute       a ticker's share of the batch engine: normalizing its
+                statements into the tensor (the vectorized FCF math for the
+                whole universe is one run-level compute:batch span)
+
+summary() aggregates them into percentiles for metadata.json, and
+export_trace() writes the slowest tickers as a Chrome trace-event file
+(open in chrome://tracing or https://ui.perfetto.dev). Tracing is off
+until a RunTrace is installed with set_tracer().
+"""
+
+import contextlib
+import json
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+
+class RunTrace:
+    """Thread-safe collector of (ticker, name, start, duration) spans."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: list[tuple[str | None, str, float, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, ticker: str | None, name: str, start: float, duration: float) -> None:
+        with self._lock:
+            self.spans.append((ticker, name, start - self.origin, duration))
+
+    def merge(self, origin: float, spans: list) -> None:
+        """Add spans recorded by another RunTrace (e.g. a worker process)."""
+        offset = origin - self.origin   # perf_counter is system-wide monotonic on Linux
+        with self._lock:
+            self.spans.extend((t, n, start + offset, d) for t, n, start, d in spans)
+
+    @contextlib.contextmanager
+    def span(self, ticker: str | None, name: str):
+        """Time the enclosed block as one span (recorded even if it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(ticker, name, start, time.perf_counter() - start)
+
+    # ── Aggregates ──────────────────────────
+    def ticker_times(self) -> dict[str, float]:
+        """
+        Fetch wall time per ticker, from its first span start to its last span
+        end (compute spans run after every fetch, so they are left out).
+        """
+        bounds = {}
+        for ticker, name, start, duration in self.spans:
+            if ticker is None or name == 'compute':
+                continue
+            lo, hi = bounds.get(ticker, (start, start + duration))
+            bounds[ticker] = (min(lo, start), max(hi, start + duration))
+        return {t: hi - lo for t, (lo, hi) in bounds.items()}
+
+    def summary(self, slowest: int = 5) -> dict:
+        """Span percentiles (ms), retry counts and the slowest tickers."""
+        durations = defaultdict(list)
+        retried = set()
+        for ticker, name, _, duration in self.spans:
+            durations[name].append(duration)
+            if name == 'backoff':
+                retried.add(ticker)
+        per_ticker = self.ticker_times()
+        durations['ticker'] = list(per_ticker.values())
+
+        spans = {}
+        for name, values in sorted(durations.items()):
+            if not values:
+                continue
+            ms = np.asarray(values) * 1000
+            p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+            spans[name] = {
+                'count': len(ms),
+                'total_s': round(float(ms.sum()) / 1000, 3),
+                'p50_ms': round(float(p50), 1),
+                'p90_ms': round(float(p90), 1),
+                'p99_ms': round(float(p99), 1),
+                'max_ms': round(float(ms.max()), 1),
+            }
+        worst = sorted(per_ticker.items(), key=lambda kv: kv[1], reverse=True)[:slowest]
+        return {
+            'wall_s': round(time.perf_counter() - self.origin, 3),
+            'tickers': len(per_ticker),
+            'retries': len(durations.get('backoff', [])),
+            'tickers_retried': len(retried),
+            'spans': spans,
+            'slowest': {t: round(s, 3) for t, s in worst},
+        }
+
+    # ── Export ──────────────────────────────
+    def export_trace(self, path: str | Path, slowest: int = 20) -> Path:
+        """
+        Write the spans of the `slowest` tickers (plus run-level spans) as a
+        Chrome trace-event JSON file, one row per ticker.
+        """
+        per_ticker = self.ticker_times()
+        keep = sorted(per_ticker, key=per_ticker.get, reverse=True)[:slowest]
+        rows = {None: 0, **{t: i + 1 for i, t in enumerate(keep)}}
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': tid,
+                   'args': {'name': ticker or 'run'}} for ticker, tid in rows.items()]
+        for ticker, name, start, duration in self.spans:
+            if ticker not in rows:
+                continue
+            events.append({
+                'name': name,
+                'cat': name.split(':')[0],
+                'ph': 'X',
+                'ts': round(start * 1e6),
+                'dur': round(duration * 1e6),
+                'pid': 0,
+                'tid': rows[ticker],
+                'args': {'ticker': ticker},
+            })
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}))
+        return path
+
+
+class _NullTrace:
+    """Stand-in when tracing is off: spans cost one function call."""
+
+    def add(self, ticker, name, start, duration) -> None:
+        pass
+
+    def span(self, ticker, name):
+        return contextlib.nullcontext()
+
+
+_TRACER = _NullTrace()
+
+
+def get_tracer() -> RunTrace | _NullTrace:
+    """The process-wide trace (a no-op unless one was installed)."""
+    return _TRACER
+
+
+def set_tracer(trace: RunTrace | None) -> None:
+    """Install a RunTrace for the next run(s), or None to stop tracing."""
+    global _TRACER
+    _TRACER = trace if trace is not None else _NullTrace()
+
+
+@contextlib.contextmanager
+def tracing(trace: RunTrace):
+    """Install `trace` for the enclosed block; it is removed even if the block raises."""
+    set_tracer(trace)
+    try:
+        yield trace
+    finally:
+        set_tracer(None)
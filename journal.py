@@ -0,0 +1,123 @@
+"""
+journal.py — Crash-safe per-ticker journal for the nightly update.
+
+Every ticker that finishes (fetched, or failed permanently) is appended to
+an on-disk journal and fsynced before the run moves on. If the job is
+killed, times out or gets banned midway, the next run of the same kind on
+the same UTC date reloads the journal, skips every ticker already in it and
+rebuilds the snapshots from journaled + newly fetched statements, so a
+retry only pays for the remaining tickers.
+
+Layout (under .cache/journal/, saved by the workflow even on failure):
+  2026-05-12-incremental/
+      main.pkl       records appended by the parent process
+      s0.pkl, s1.pkl records appended by shard workers (see --shards)
+
+Each file is a stream of pickled (ticker, data_or_None, failure_kind)
+records; a torn record at the end of a file (crash mid-write) is ignored.
+Transient failures are not journaled, so they are retried on resume.
+"""
+
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+
+DEFAULT_JOURNAL_DIR = Path(__file__).parent / ".cache" / "journal"
+
+# Failures that would fail the same way on resume (see engine.FAILURE_KINDS)
+FINAL_FAILURES = frozenset({'not_found', 'empty', 'parse'})
+
+
+def _read_records(path: Path) -> tuple[list, int]:
+    """Intact records of a journal file and the byte length they span."""
+    records, good = [], 0
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                records.append(pickle.load(f))
+            except Exception:   # EOF, or a torn final record from a crash
+                break
+            good = f.tell()
+    return records, good
+
+
+class RunJournal:
+    """
+    Append-only record of the tickers one run has finished.
+
+    Args:
+        root: Directory holding one sub-directory per run
+        run_id: Identifies the run to resume, e.g. '2026-05-12-incremental'
+        writer: File name for this process's records (one writer per file)
+    """
+
+    def __init__(self, root: str | Path, run_id: str, writer: str = "main"):
+        self.root = Path(root)
+        self.run_id = run_id
+        self.writer = writer
+        self.dir = self.root / run_id
+        self._file = None
+        self._done = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_file'] = None   # handles stay in the process that opened them
+        state['_done'] = None
+        return state
+
+    def for_writer(self, writer: str) -> 'RunJournal':
+        """Same run, separate file (e.g. for a shard worker process)."""
+        return RunJournal(self.root, self.run_id, writer)
+
+    # ── Reading ─────────────────────────────
+    def load(self) -> dict[str, tuple[dict | None, str | None]]:
+        """{ticker: (data, failure kind)} for every finished ticker of this run."""
+        if self._done is not None:
+            return self._done
+        done = self._done = {}
+        if not self.dir.exists():
+            return done
+        for path in sorted(self.dir.glob("*.pkl")):
+            for ticker, data, kind in _read_records(path)[0]:
+                done[ticker] = (data, kind)
+        return done
+
+    # ── Writing ─────────────────────────────
+    def record(self, ticker: str, data: dict | None, kind: str | None) -> None:
+        """Durably append one finished ticker (transient failures are skipped)."""
+        if kind is not None and kind not in FINAL_FAILURES:
+            return
+        if self._file is None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            path = self.dir / f"{self.writer}.pkl"
+            if path.exists():
+                # Cut a torn tail so new records don't land behind it
+                os.truncate(path, _read_records(path)[1])
+            self._file = open(path, 'ab')
+        pickle.dump((ticker, data, kind), self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if self._done is not None:
+            self._done[ticker] = (data, kind)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # ── Lifecycle ───────────────────────────
+    def prune(self) -> None:
+        """Drop journals of other runs (older dates, other run kinds)."""
+        if not self.root.exists():
+            return
+        for path in self.root.iterdir():
+            if path.is_dir() and path.name != self.run_id:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def discard(self) -> None:
+        """Delete this run's journal (after its snapshots are written)."""
+        self.close()
+        self._done = None
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -0,0 +1,74 @@
+"""
+negative_cache.py — Tickers that fail permanently, with an expiry.
+
+Delisted symbols and tickers without statements fail the same way every
+day; recording them here lets a run skip them instead of spending rate-limit
+budget and backoff time on each one. Entries expire so that a relisting or a
+late filing is picked up again.
+
+Stored as .cache/negative_cache.json:
+  {"XYZ3.SA": {"kind": "not_found", "until": "2026-05-12T06:01:00+00:00"}}
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+DEFAULT_NEGATIVE_CACHE_FILE = Path(__file__).parent / ".cache" / "negative_cache.json"
+
+# Only permanent failure kinds are cached (see engine.FAILURE_KINDS)
+NEGATIVE_TTL = {
+    'not_found': timedelta(days=7),
+    'empty': timedelta(days=3),
+}
+
+
+class NegativeCache:
+    """Ticker → permanent failure kind, until an expiry time."""
+
+    def __init__(self, path: str | Path = DEFAULT_NEGATIVE_CACHE_FILE,
+                 ttl: dict | None = None):
+        self.path = Path(path)
+        self.ttl = {**NEGATIVE_TTL, **(ttl or {})}
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except Exception:
+                self.entries = {}
+
+    def get(self, ticker: str, now: datetime | None = None) -> str | None:
+        """Failure kind if the ticker is still blocked, else None."""
+        entry = self.entries.get(ticker)
+        if entry is None:
+            return None
+        now = now or datetime.now(timezone.utc)
+        if now >= datetime.fromisoformat(entry['until']):
+            return None
+        return entry['kind']
+
+    def add(self, ticker: str, kind: str, now: datetime | None = None) -> None:
+        """Block a ticker if the failure kind is permanent."""
+        if kind not in self.ttl:
+            return
+        now = now or datetime.now(timezone.utc)
+        self.entries[ticker] = {'kind': kind, 'until': (now + self.ttl[kind]).isoformat()}
+
+    def discard(self, ticker: str) -> None:
+        """Unblock a ticker (e.g. after a successful fetch)."""
+        self.entries.pop(ticker, None)
+
+    def save(self) -> None:
+        """Write the cache atomically, dropping expired entries."""
+        now = datetime.now(timezone.utc)
+        self.entries = {t: e for t, e in self.entries.items()
+                        if datetime.fromisoformat(e['until']) > now}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -0,0 +1,57 @@
+"""
+quotes.py — Batched price / market cap refresh for the whole universe.
+
+Instead of one heavy `tk.info` request per ticker, prices come from a
+handful of multi-symbol downloads (`yf.download` behind data_source.py).
+Market cap is rebuilt as shares × price, with shares taken from the cached profile (see
+engine.profile_from_info) or, failing that, implied by the last snapshot.
+"""
+
+import pandas as pd
+from data_source import get_source
+from fetcher import get_bucket
+
+
+CHUNK_SIZE = 100  # symbols per download request
+
+
+def download_prices(tickers: list[str], chunk_size: int = CHUNK_SIZE) -> dict[str, float]:
+    """
+    Last traded price for every ticker, in ceil(len / chunk_size) requests.
+
+    Returns:
+        {ticker: price} — tickers without a recent price are left out.
+    """
+    prices = {}
+    for start in range(0, len(tickers), chunk_size):
+        chunk = tickers[start:start + chunk_size]
+        get_bucket().acquire_sync()
+        try:
+            df = get_source().download(chunk)
+        except Exception:
+            continue
+        if df is None or df.empty or 'Close' not in df.columns.get_level_values(0):
+            continue
+        close = df['Close']
+        if isinstance(close, pd.Series):
+            close = close.to_frame(chunk[0])
+        last = close.ffill().iloc[-1]
+        for ticker, price in last.items():
+            if pd.notna(price) and price > 0:
+                prices[ticker] = float(price)
+    return prices
+
+
+def build_quotes(prices: dict[str, float], shares: dict[str, float]) -> dict[str, dict]:
+    """
+    Combine bulk prices with cached share counts.
+
+    Returns:
+        {ticker: {'price': ..., 'market_cap': ...}} for tickers with both.
+    """
+    quotes = {}
+    for ticker, price in prices.items():
+        n = shares.get(ticker)
+        if n and pd.notna(n):
+            quotes[ticker] = {'price': price, 'market_cap': n * price}
+    return quotes
@@ -0,0 +1,190 @@
+"""
+refresh_worker.py — Single-flight background refresh for the Streamlit app.
+
+The "Atualizar Dados" button no longer scrapes inside the clicking
+session's script run. It submits a job to the process-wide RefreshWorker:
+if a refresh is already running, the session joins it instead of starting
+a duplicate scrape. The job runs in a daemon thread, publishes progress
+and partial results for sessions to poll, and is the only writer of the
+snapshots and metadata.json (whose new data_version is what makes the
+app's caches switch over). A lock file extends the single-flight
+guarantee to other processes sharing the same data directory.
+
+The refresh keeps the basis of the published snapshots: after a nightly
+`update_data.py --ttm` run, it screens on the TTM windows already in the
+ledger (read offline — quarterly statements are only fetched nightly) and
+writes the same 'Base' column and basis / tickers_ttm metadata.
+
+Like `update_data.py --incremental`, it only refetches statements the fiscal
+calendar (or the TTM ledger) says are due and reprices everyone else from
+bulk quotes, so a click costs a few requests, not one per ticker. Each
+checkpoint writes metadata.json with its snapshots, so the data_version on
+disk always describes the files next to it.
+"""
+
+import fcntl
+import itertools
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from fetcher import AdaptiveConcurrency, DEFAULT_CONCURRENCY
+from update_data import screen, update_incremental
+from fiscal_calendar import FiscalCalendar
+from ttm import TTMLedger, DEFAULT_TTM_DIR
+from statement_cache import StatementCache
+from negative_cache import NegativeCache
+from instrumentation import RunTrace, tracing
+from snapshot import (DATA_DIR, load_snapshot, write_snapshot, write_metadata,
+                      read_metadata, snapshot_path, upsert_rows)
+
+
+PARTIAL_INTERVAL = 1.0      # seconds between partial-result updates
+CHECKPOINT_INTERVAL = 10.0  # seconds between partial snapshot writes
+
+_job_ids = itertools.count(1)
+
+
+@dataclass
+class RefreshJob:
+    """State of one refresh, read by every polling session."""
+
+    id: int
+    total: int
+    state: str = 'running'            # running | done | failed
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: datetime | None = None
+    completed: int = 0
+    concurrency: int = 0
+    partial: tuple | None = None      # latest (df_normal, df_conservative) so far
+    rows: int = 0
+    error: str | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.state == 'running'
+
+
+class RefreshWorker:
+    """Runs at most one refresh at a time; concurrent submits join it."""
+
+    def __init__(self, data_dir: str | Path = DATA_DIR, on_finish=None):
+        """
+        Args:
+            data_dir: Directory holding the snapshots and metadata.json
+            on_finish: Optional callable(job) run in the worker thread after
+                       a job ends
+        """
+        self.data_dir = Path(data_dir)
+        self.on_finish = on_finish
+        self.current: RefreshJob | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, tickers: list[str]) -> RefreshJob:
+        """Start a refresh, or return the one already in flight."""
+        with self._lock:
+            if self.current is not None and self.current.running:
+                return self.current
+            job = RefreshJob(id=next(_job_ids), total=len(tickers))
+            self.current = job
+        threading.Thread(target=self._run, args=(job, list(tickers)),
+                         name=f"refresh-{job.id}", daemon=True).start()
+        return job
+
+    def _run(self, job: RefreshJob, tickers: list[str]) -> None:
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(self.data_dir / ".refresh.lock", 'w') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise RuntimeError("refresh already running in another process")
+                self._refresh(job, tickers)
+            job.state = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.state = 'failed'
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            if self.on_finish:
+                self.on_finish(job)
+
+    def _refresh(self, job: RefreshJob, tickers: list[str]) -> None:
+        previous = {m: load_snapshot(m, self.data_dir) for m in ('normal', 'conservative')}
+        published = read_metadata(self.data_dir)
+        # Same plan as `update_data.py --incremental`: statements only where the
+        # fiscal calendar (or the TTM ledger) says a new filing is due, bulk
+        # quotes for everyone else
+        cache = StatementCache()
+        calendar = FiscalCalendar(self.data_dir / "fiscal_calendar.json")
+        ledger = None
+        if published.get("basis") == "ttm":
+            ledger = TTMLedger(cache.root.parent / DEFAULT_TTM_DIR.name, offline=True)
+        limiter = AdaptiveConcurrency(DEFAULT_CONCURRENCY)
+        pending = {}                    # finished since the last partial
+        clock = {'partial': time.monotonic(), 'checkpoint': time.monotonic()}
+
+        def progress(current, total):
+            job.completed, job.total, job.concurrency = current, total, limiter.limit
+
+        def on_done(ticker, data, kind):
+            if data is not None:
+                pending[ticker] = data
+            now = time.monotonic()
+            if not pending or now - clock['partial'] < PARTIAL_INTERVAL:
+                return
+            # Only the new tickers are screened; earlier partial rows are kept
+            new = screen(pending, ledger)
+            pending.clear()
+            job.partial = new if job.partial is None else \
+                tuple(upsert_rows(old, rows) for old, rows in zip(job.partial, new))
+            clock['partial'] = now
+            if now - clock['checkpoint'] >= CHECKPOINT_INTERVAL:
+                # Completed tickers replace their previous rows, so a refresh that
+                # dies midway still leaves a full, partly refreshed snapshot behind
+                self._write(upsert_rows(previous['normal'], job.partial[0]),
+                            upsert_rows(previous['conservative'], job.partial[1]))
+                write_metadata({**published, "checkpoint": {"completed": job.completed,
+                                                            "total": job.total}},
+                               self.data_dir)
+                clock['checkpoint'] = now
+
+        now = datetime.now(timezone.utc)
+        negative_cache = NegativeCache()
+        failures = {}
+        trace = RunTrace()
+        with tracing(trace):
+            df_normal, df_conservative, stats = update_incremental(
+                tickers, cache, calendar, now, negative_cache=negative_cache,
+                failures=failures, adaptive=limiter, ledger=ledger, data_dir=self.data_dir,
+                on_done=on_done, progress_callback=progress)
+        calendar.save()
+        negative_cache.save()
+
+        if df_normal.empty and df_conservative.empty:
+            raise RuntimeError("no data fetched")
+        self._write(df_normal, df_conservative)
+        # Same run diagnostics as update_data.py
+        write_metadata({
+            "last_updated": now.isoformat(),
+            "basis": "ttm" if ledger is not None else "annual",
+            "tickers_ttm": int((df_normal['Base'] == 'TTM').sum()) if 'Base' in df_normal else 0,
+            "tickers_total": len(tickers),
+            "tickers_normal_ok": len(df_normal),
+            "tickers_conservative_ok": len(df_conservative),
+            **stats,
+            "failures": dict(Counter(failures.values())),
+            "timings": trace.summary(),
+        }, self.data_dir)
+        job.partial = (df_normal, df_conservative)
+        job.rows = len(df_normal)
+
+    def _write(self, df_normal: pd.DataFrame, df_conservative: pd.DataFrame) -> None:
+        for mode, df in (('normal', df_normal), ('conservative', df_conservative)):
+            if not df.empty:
+                write_snapshot(df, snapshot_path(mode, self.data_dir))
@@ -0,0 +1,254 @@
+"""
+scenario.py — What-if engine for the methodology parameters.
+
+The snapshots keep every raw FCF component (FCO, Δ Capital de Giro,
+Capex (Raw), Depreciação, Juros, Impostos, Arrendamentos, Market Cap), so
+the expansion trigger, the yield targets, the "Justo" band and the
+commodity sector list can all be changed without refetching anything:
+
+  apply(df, scenario)              one scenario → a re-ranked snapshot
+  sensitivity(components, base,    a whole parameter grid in one
+              expansion_trigger=…)  vectorized (scenarios × tickers) pass
+
+With the default parameters, apply() reproduces the snapshot exactly.
+The normalized yields (batch_engine.HISTORY_COLUMNS) need every period's
+components, which the snapshots don't keep: a scenario that changes the FCF
+itself (Δ Capital de Giro or expansion trigger) clears them instead of
+showing values computed with the snapshot's methodology.
+"""
+
+import itertools
+import warnings
+from dataclasses import dataclass, fields, replace
+
+import numpy as np
+import pandas as pd
+
+from batch_engine import HISTORY_COLUMNS
+from engine import (COMMODITY_SECTORS, YIELD_TARGET, COMMODITY_YIELD_TARGET, FAIR_BAND,
+                    EXPANSION_TRIGGER, classify_status_array)
+
+
+GRID_BLOCK = 2_000_000  # scenario × ticker cells evaluated per block
+STATUS_LABELS = ('🟢 Barato', '🟡 Justo', '🔴 Caro')
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    One set of methodology parameters.
+
+    Args:
+        adjust_wc: Subtract Δ Capital de Giro from FCO (conservative mode)
+        expansion_trigger: Capex > trigger × Depreciação → Capex = Depreciação;
+                           None disables the adjustment (normal mode)
+        yield_target: "Barato" threshold for general sectors
+        commodity_yield_target: "Barato" threshold for commodity sectors
+        fair_band: "Justo" from fair_band × target
+        commodity_sectors: Sectors judged against commodity_yield_target
+    """
+
+    adjust_wc: bool = False
+    expansion_trigger: float | None = None
+    yield_target: float = YIELD_TARGET
+    commodity_yield_target: float = COMMODITY_YIELD_TARGET
+    fair_band: float = FAIR_BAND
+    commodity_sectors: frozenset = frozenset(COMMODITY_SECTORS)
+
+    @classmethod
+    def for_mode(cls, conservative: bool, **overrides) -> 'Scenario':
+        """The methodology of a snapshot mode, with optional overrides."""
+        base = cls(adjust_wc=True, expansion_trigger=EXPANSION_TRIGGER) if conservative \
+            else cls()
+        return replace(base, **overrides)
+
+    @property
+    def key(self) -> str:
+        """Compact, stable identifier (for cache keys and file names)."""
+        trigger = 'off' if self.expansion_trigger is None else f"{self.expansion_trigger:g}"
+        return (f"wc{int(self.adjust_wc)}-x{trigger}-t{self.yield_target:g}"
+                f"-c{self.commodity_yield_target:g}-b{self.fair_band:g}"
+                f"-{'+'.join(sorted(self.commodity_sectors))}")
+
+
+@dataclass(frozen=True)
+class Components:
+    """Raw FCF components of a snapshot as aligned arrays."""
+
+    tickers: np.ndarray
+    fco: np.ndarray
+    wc_change: np.ndarray
+    capex_raw: np.ndarray
+    depreciation: np.ndarray
+    deductions: np.ndarray    # Juros + Impostos + Arrendamentos (never adjusted)
+    market_cap: np.ndarray
+    sectors: np.ndarray
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'Components':
+        """
+        Extract components from a snapshot. Snapshots written before the
+        Δ Capital de Giro column existed fall back to FCO − Adjusted FCO
+        (exact for conservative snapshots, zero for normal ones).
+        """
+        def col(name: str) -> np.ndarray:
+            if name not in df.columns:
+                return np.zeros(len(df))
+            return np.nan_to_num(df[name].to_numpy(dtype=float))
+
+        market_cap = df['Market Cap'].to_numpy(dtype=float)  # NaN stays NaN, as in the engine
+
+        if 'Δ Capital de Giro' in df.columns:
+            wc_change = col('Δ Capital de Giro')
+        else:
+            wc_change = col('FCO') - col('Adjusted FCO')
+        return cls(
+            tickers=df['Ticker'].to_numpy(dtype=object),
+            fco=col('FCO'),
+            wc_change=wc_change,
+            capex_raw=col('Capex (Raw)'),
+            depreciation=col('Depreciação'),
+            deductions=col('Juros') + col('Impostos') + col('Arrendamentos'),
+            market_cap=market_cap,
+            sectors=df['Setor'].to_numpy(dtype=object),
+        )
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the component arrays (object arrays: pointers only)."""
+        return sum(getattr(self, f.name).nbytes for f in fields(self))
+
+    def take(self, mask: np.ndarray) -> 'Components':
+        """Subset of the rows (e.g. one market)."""
+        return Components(**{f.name: getattr(self, f.name)[mask] for f in fields(self)})
+
+
+# ─────────────────────────────────────────────
+# Single scenario
+# ─────────────────────────────────────────────
+
+def evaluate(c: Components, scenario: Scenario) -> dict[str, np.ndarray]:
+    """Adjusted FCO, Capex, expansion flag, FCF and FCF Yield per ticker."""
+    adjusted_fco = c.fco - c.wc_change if scenario.adjust_wc else c.fco
+    expansion = np.zeros(len(c), dtype=bool)
+    if scenario.expansion_trigger is not None:
+        expansion = (c.depreciation != 0) & \
+                    (np.abs(c.capex_raw) > np.abs(c.depreciation) * scenario.expansion_trigger)
+    capex = np.where(expansion, -np.abs(c.depreciation), c.capex_raw)
+    fcf = adjusted_fco + capex - c.deductions
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fcf_yield = np.where(c.market_cap != 0,
+                             fcf / np.where(c.market_cap != 0, c.market_cap, 1), 0.0)
+    return {'Adjusted FCO': adjusted_fco, 'Capex': capex, 'Ajuste Expansão': expansion,
+            'FCF': fcf, 'FCF Yield': fcf_yield}
+
+
+def apply(df: pd.DataFrame, scenario: Scenario, base: Scenario | None = None) -> pd.DataFrame:
+    """
+    Snapshot with FCF, FCF Yield and Status recomputed under a scenario, re-ranked.
+
+    Args:
+        df: Ranked snapshot (one mode)
+        scenario: Parameters to apply
+        base: Methodology the snapshot was computed with (default: the mode
+              default for scenario.adjust_wc). If the scenario's FCF differs,
+              the normalized yields are set to NaN.
+    """
+    if df.empty:
+        return df
+    if base is None:
+        base = Scenario.for_mode(scenario.adjust_wc)
+    out = df.copy()
+    for name, values in evaluate(Components.from_frame(df), scenario).items():
+        out[name] = values
+    if (scenario.adjust_wc, scenario.expansion_trigger) != \
+            (base.adjust_wc, base.expansion_trigger):
+        for col in HISTORY_COLUMNS:
+            if col in out.columns:
+                out[col] = np.nan
+    out['Status'] = classify_status_array(
+        out['FCF Yield'].to_numpy(), out['Setor'].to_numpy(),
+        scenario.yield_target, scenario.commodity_yield_target, scenario.fair_band,
+        scenario.commodity_sectors)
+    out.sort_values('FCF Yield', ascending=False, inplace=True, kind='stable')
+    out.reset_index(drop=True, inplace=True)
+    return out
+
+
+# ─────────────────────────────────────────────
+# Parameter grid
+# ─────────────────────────────────────────────
+
+GRID_AXES = ('adjust_wc', 'expansion_trigger', 'yield_target',
+             'commodity_yield_target', 'fair_band')
+
+
+def sensitivity(c: Components, base: Scenario, **axes) -> pd.DataFrame:
+    """
+    Evaluate every combination of the given parameter values at once.
+
+    Args:
+        c: Components of the universe (or a subset, see Components.take)
+        base: Values for the parameters not varied
+        **axes: Parameter name (GRID_AXES) → sequence of values,
+                e.g. expansion_trigger=np.arange(1.0, 3.01, 0.1)
+
+    Returns:
+        One row per combination: the parameters, then the number of Barato /
+        Justo / Caro tickers, expansion adjustments and the median FCF Yield.
+    """
+    unknown = set(axes) - set(GRID_AXES)
+    if unknown:
+        raise ValueError(f"not a grid parameter: {', '.join(sorted(unknown))}")
+    names = list(axes)
+    combos = list(itertools.product(*(axes[n] for n in names)))
+    if not combos:
+        return pd.DataFrame(columns=names)
+
+    def param(name: str) -> np.ndarray:
+        if name in axes:
+            values = [combo[names.index(name)] for combo in combos]
+        else:
+            values = [getattr(base, name)] * len(combos)
+        if name == 'expansion_trigger':
+            values = [np.inf if v is None else v for v in values]
+        return np.asarray(values, dtype=float)[:, None]
+
+    adjust_wc, trigger = param('adjust_wc'), param('expansion_trigger')
+    target, commodity_target = param('yield_target'), param('commodity_yield_target')
+    band = param('fair_band')
+
+    is_commodity = np.isin(c.sectors, list(base.commodity_sectors))
+    abs_dep, abs_capex = np.abs(c.depreciation), np.abs(c.capex_raw)
+    has_dep = c.depreciation != 0
+    safe_cap = np.where(c.market_cap != 0, c.market_cap, 1)
+
+    counts = np.zeros((len(combos), 4), dtype=np.int64)
+    medians = np.zeros(len(combos))
+    block = max(1, GRID_BLOCK // max(len(c), 1))
+    for lo in range(0, len(combos), block):
+        sl = slice(lo, lo + block)
+        with np.errstate(invalid='ignore'):                 # 0 × inf when disabled
+            expansion = has_dep & (abs_capex > abs_dep * trigger[sl])     # (G, N)
+        capex = np.where(expansion, -abs_dep, c.capex_raw)
+        fcf = c.fco - c.wc_change * adjust_wc[sl] + capex - c.deductions
+        fcf_yield = np.where(c.market_cap != 0, fcf / safe_cap, 0.0)
+        threshold = np.where(is_commodity, commodity_target[sl], target[sl])
+        cheap = fcf_yield >= threshold
+        fair = ~cheap & (fcf_yield >= threshold * band[sl])
+        counts[sl, 0] = cheap.sum(axis=1)
+        counts[sl, 1] = fair.sum(axis=1)
+        counts[sl, 2] = len(c) - counts[sl, 0] - counts[sl, 1]
+        counts[sl, 3] = expansion.sum(axis=1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)   # all-NaN rows
+            medians[sl] = np.nanmedian(fcf_yield, axis=1) if len(c) else np.nan
+
+    out = pd.DataFrame(combos, columns=names)
+    for i, label in enumerate(STATUS_LABELS):
+        out[label] = counts[:, i]
+    out['Ajustes Expansão'] = counts[:, 3]
+    out['Yield Mediano'] = medians
+    return out
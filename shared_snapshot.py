@@ -0,0 +1,81 @@
+"""
+shared_snapshot.py — One read-only copy of the current snapshots per process.
+
+Every Streamlit session reads the same SharedSnapshot (held by the app via
+st.cache_resource). It keeps exactly one Publication: both modes' snapshots
+in compact form (snapshot.compact_frame), each wrapped in its FilterIndex,
+plus the data_version of the bytes they were parsed from. Sessions take a
+reference to the current Publication at the top of a rerun and work on it
+for the whole run — the views they render are FilterIndex masks and takes
+of the shared frames, never private copies of the snapshot.
+
+Publishing is the writers' job (update_data.py, RefreshWorker):
+snapshots first, then metadata.json with the new data_version. current()
+compares metadata's data_version with the one loaded (one small file read
+per rerun); on a change it loads both modes in one pass and swaps the new
+Publication in with a single reference assignment, so a session sees the
+old pair or the new pair, never a mix, and the old one is freed once the
+last rerun holding it ends. Memory stays one snapshot pair per process,
+however many sessions are open.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from filter_index import FilterIndex
+from snapshot import DATA_DIR, MODES, compact_frame, current_version, read_snapshots
+
+
+@dataclass(frozen=True)
+class Publication:
+    """Both modes' indexed snapshots, as of one data version."""
+
+    version: str
+    indexes: dict[str, FilterIndex] = field(default_factory=dict)
+
+    def __getitem__(self, mode: str) -> FilterIndex:
+        return self.indexes[mode]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by both modes' frames and indexes (shared by every session)."""
+        return sum(index.memory_bytes() for index in self.indexes.values())
+
+
+class SharedSnapshot:
+    """
+    Process-wide holder of the current Publication.
+
+    Args:
+        data_dir: Directory with the snapshots and metadata.json
+    """
+
+    def __init__(self, data_dir: str | Path = DATA_DIR):
+        self.data_dir = Path(data_dir)
+        self._lock = threading.Lock()
+        # (Publication, metadata version it was loaded for), swapped as one reference
+        self._state: tuple[Publication, str] | None = None
+        self.loads = 0
+
+    def _fresh(self, announced: str) -> Publication | None:
+        state = self._state
+        if state is not None and announced in (state[1], state[0].version):
+            return state[0]
+        return None
+
+    def current(self) -> Publication:
+        """The current Publication, reloaded first if a new one was announced."""
+        announced = current_version(self.data_dir)
+        publication = self._fresh(announced)
+        if publication is not None:
+            return publication
+        with self._lock:
+            publication = self._fresh(announced)   # another session may have just loaded it
+            if publication is None:
+                version, frames = read_snapshots(self.data_dir)
+                publication = Publication(version, {
+                    mode: FilterIndex.build(compact_frame(frames[mode]), version=version)
+                    for mode in MODES})
+                self._state = (publication, announced)
+                self.loads += 1
+            return publication
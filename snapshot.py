@@ -0,0 +1,256 @@
+"""
+snapshot.py — Typed, compressed columnar snapshots of the screener results.
+
+update_data.py writes one Parquet file per mode (zstd, explicit Arrow
+schema); the app reads them memory-mapped, so booleans come back as
+booleans and numbers as float64 without any text parsing. CSV remains
+available as an export format.
+
+The app keeps snapshots in memory in a compact form (compact_frame()):
+Status, Setor, Base and the derived Mercado are categoricals — Status and
+Mercado with fixed categories, so their int8 codes are what FilterIndex
+filters on and the labels only appear when a table or chart is rendered —
+and display-only ratios are float32. Monetary columns stay float64, since
+scenario.py recomputes FCF and yields from them.
+
+Every writer finishes with write_metadata(), which stamps metadata.json
+with a content hash of the snapshots (data_version) and a generation
+counter. Readers key their caches on data_version, so they reload exactly
+when a new snapshot lands.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from filter_index import MARKETS, STATUSES, market_codes, status_codes
+
+
+# SCREENER_DATA_DIR points the app at another data directory (e.g. benchmarks)
+DATA_DIR = Path(os.environ.get("SCREENER_DATA_DIR", Path(__file__).parent / "data"))
+METADATA_NAME = "metadata.json"
+
+MODES = ('normal', 'conservative')
+
+# Known columns → Arrow types (unknown columns are inferred)
+COLUMN_TYPES = {
+    'Ticker': pa.string(),
+    'Preço': pa.float64(),
+    'Market Cap': pa.float64(),
+    'FCO': pa.float64(),
+    'Adjusted FCO': pa.float64(),
+    'Δ Capital de Giro': pa.float64(),
+    'Capex': pa.float64(),
+    'Capex (Raw)': pa.float64(),
+    'Depreciação': pa.float64(),
+    'Ajuste Expansão': pa.bool_(),
+    'Juros': pa.float64(),
+    'Impostos': pa.float64(),
+    'Arrendamentos': pa.float64(),
+    'FCF': pa.float64(),
+    'FCF Yield': pa.float64(),
+    'Rev Growth 5Y': pa.float64(),
+    'FCF Yield Média 3A': pa.float64(),
+    'FCF Yield Mediana 3A': pa.float64(),
+    'FCF Yield Média 5A': pa.float64(),
+    'FCF Yield Mediana 5A': pa.float64(),
+    'Volatilidade FCF': pa.float64(),
+    'Setor': pa.string(),
+    'Base': pa.string(),          # 'TTM' / 'Anual' (update_data.py --ttm)
+    'Status': pa.string(),
+}
+
+# Ratios only shown in tables (never re-derived), ~7 significant digits is plenty
+FLOAT32_COLUMNS = ('Rev Growth 5Y', 'FCF Yield Média 3A', 'FCF Yield Mediana 3A',
+                   'FCF Yield Média 5A', 'FCF Yield Mediana 5A', 'Volatilidade FCF')
+CATEGORY_COLUMNS = ('Setor', 'Base')
+
+
+def snapshot_path(mode: str, data_dir: str | Path = DATA_DIR) -> Path:
+    """Parquet snapshot for 'normal' or 'conservative'."""
+    return Path(data_dir) / f"screener_{mode}.parquet"
+
+
+def csv_path(mode: str, data_dir: str | Path = DATA_DIR) -> Path:
+    """CSV export (and legacy snapshot) for 'normal' or 'conservative'."""
+    return Path(data_dir) / f"screener_{mode}.csv"
+
+
+def to_table(df: pd.DataFrame) -> pa.Table:
+    """Convert a screener DataFrame to an Arrow table with the fixed schema."""
+    fields = []
+    for col in df.columns:
+        if col in COLUMN_TYPES:
+            fields.append(pa.field(col, COLUMN_TYPES[col]))
+        else:
+            fields.append(pa.field(col, pa.Array.from_pandas(df[col]).type))
+    schema = pa.schema(fields)
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def _atomic_write(path: Path, write) -> None:
+    """Write via a temp file in the same directory, then rename over path."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp)
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600; snapshots are shared
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_snapshot(df: pd.DataFrame, path: str | Path) -> None:
+    """Write a zstd-compressed Parquet snapshot atomically."""
+    table = to_table(df)
+    _atomic_write(Path(path), lambda tmp: pq.write_table(table, tmp, compression='zstd'))
+
+
+def export_csv(df: pd.DataFrame, path: str | Path) -> None:
+    """Write a CSV export of a snapshot atomically."""
+    _atomic_write(Path(path), lambda tmp: df.to_csv(tmp, index=False))
+
+
+def upsert_rows(previous: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Replace previous rows by Ticker with the new ones (adding new tickers)
+    and re-rank by FCF Yield.
+    """
+    if previous.empty:
+        return rows.reset_index(drop=True)
+    if rows.empty:
+        return previous
+    kept = previous[~previous['Ticker'].isin(rows['Ticker'])]
+    df = pd.concat([rows, kept], ignore_index=True)
+    df.sort_values('FCF Yield', ascending=False, inplace=True, kind='stable')
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def read_table(path: str | Path) -> pa.Table:
+    """Memory-map a Parquet snapshot as an Arrow table."""
+    return pq.read_table(path, memory_map=True)
+
+
+def _snapshot_bytes(data_dir: str | Path) -> dict[str, bytes]:
+    """Raw Parquet bytes of every mode snapshot that exists."""
+    out = {}
+    for mode in MODES:
+        try:
+            out[mode] = snapshot_path(mode, data_dir).read_bytes()
+        except FileNotFoundError:
+            pass
+    return out
+
+
+def _content_hash(raw: dict[str, bytes]) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    for mode, blob in raw.items():
+        digest.update(mode.encode())
+        digest.update(blob)
+    return digest.hexdigest() if raw else ''
+
+
+def data_version(data_dir: str | Path = DATA_DIR) -> str:
+    """Content hash of all mode snapshots (empty string if there are none)."""
+    return _content_hash(_snapshot_bytes(data_dir))
+
+
+def read_snapshots(data_dir: str | Path = DATA_DIR) -> tuple[str, dict[str, pd.DataFrame]]:
+    """
+    Every mode's snapshot plus the data_version of exactly the bytes parsed,
+    read in one pass — so the version always describes the frames, even if
+    a writer replaces files meanwhile. Modes without a Parquet snapshot fall
+    back to load_snapshot() (legacy CSV or empty).
+    """
+    raw = _snapshot_bytes(data_dir)
+    frames = {mode: pq.read_table(pa.BufferReader(raw[mode])).to_pandas() if mode in raw
+              else load_snapshot(mode, data_dir) for mode in MODES}
+    return _content_hash(raw), frames
+
+
+def read_metadata(data_dir: str | Path = DATA_DIR) -> dict:
+    """metadata.json as a dict ({} if missing or unreadable)."""
+    try:
+        with open(Path(data_dir) / METADATA_NAME) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_metadata(meta: dict, data_dir: str | Path = DATA_DIR) -> dict:
+    """
+    Write metadata.json atomically, adding data_version (content hash of the
+    snapshots just written) and generation (previous + 1).
+
+    Returns:
+        The metadata as written.
+    """
+    meta = {
+        **meta,
+        "data_version": data_version(data_dir),
+        "generation": int(read_metadata(data_dir).get("generation", 0)) + 1,
+    }
+    _atomic_write(Path(data_dir) / METADATA_NAME, lambda tmp: pd.Series(meta).to_json(tmp))
+    return meta
+
+
+def current_version(data_dir: str | Path = DATA_DIR) -> str:
+    """
+    Version to key snapshot caches on: metadata's data_version, or the
+    content hash itself for snapshots written before versioning existed.
+    """
+    return read_metadata(data_dir).get("data_version") or data_version(data_dir)
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    In-memory form of a snapshot for the app: fixed-category Status and
+    Mercado (B3 / US), categorical Setor / Base, float32 display ratios.
+    Values are unchanged apart from the float32 rounding; unknown statuses
+    become missing.
+    """
+    if df.empty or 'Ticker' not in df.columns:
+        return df
+    out = df.copy()
+    out['Mercado'] = pd.Categorical.from_codes(market_codes(out['Ticker']), categories=MARKETS)
+    if 'Status' in out.columns:
+        out['Status'] = pd.Categorical.from_codes(status_codes(out['Status']),
+                                                  categories=STATUSES)
+    for col in CATEGORY_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].astype('category')
+    for col in FLOAT32_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].astype('float32')
+    if 'Ajuste Expansão' in out.columns and out['Ajuste Expansão'].dtype == object:
+        out['Ajuste Expansão'] = out['Ajuste Expansão'].fillna(False).astype(bool)   # legacy CSV
+    return out
+
+
+def memory_bytes(df: pd.DataFrame) -> int:
+    """Deep in-memory size of a frame (strings and category labels included)."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def load_snapshot(mode: str, data_dir: str | Path = DATA_DIR) -> pd.DataFrame:
+    """
+    Load a mode's snapshot. Falls back to the legacy CSV if no Parquet file
+    exists yet; returns an empty DataFrame if neither does.
+    """
+    path = snapshot_path(mode, data_dir)
+    if path.exists():
+        return read_table(path).to_pandas()
+    legacy = csv_path(mode, data_dir)
+    if legacy.exists():
+        return pd.read_csv(legacy)
+    return pd.DataFrame()
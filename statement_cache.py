@@ -0,0 +1,150 @@
+"""
+statement_cache.py — Persistent on-disk store of raw Yahoo Finance data.
+
+Sits between engine.py and yfinance so that recomputes, methodology changes
+and the conservative toggle run entirely from disk. Only expired entries
+(or brand-new filings) go to the network.
+
+Layout:
+  .cache/statements/<TICKER>/<kind>.pkl
+
+Each entry holds the payload plus the time it was fetched and the fiscal
+periods (statement columns) it covers, so every ticker × fiscal period
+downloaded is kept locally until its kind's TTL expires. That metadata is
+pickled as a small header ahead of the payload, so freshness checks
+(missing(), fetched_at(), periods()) never unpickle the statements.
+"""
+
+import os
+import pickle
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".cache" / "statements"
+
+# Annual statements only change a few times a year; info carries prices;
+# profile (sector + share count, see engine.profile_from_info) rarely moves.
+DEFAULT_TTL = {
+    'info': timedelta(hours=12),
+    'profile': timedelta(days=90),
+    'cashflow': timedelta(days=30),
+    'income_stmt': timedelta(days=30),
+    'balance_sheet': timedelta(days=30),
+}
+
+# Empty payloads are often transient Yahoo errors — recheck them sooner.
+EMPTY_TTL = timedelta(days=1)
+
+
+def _periods(value) -> list[str]:
+    """Fiscal period end dates covered by a statement DataFrame."""
+    if isinstance(value, pd.DataFrame):
+        return [pd.Timestamp(c).strftime('%Y-%m-%d') for c in value.columns]
+    return []
+
+
+class StatementCache:
+    """
+    Ticker × statement store with per-kind expiry.
+
+    Args:
+        root: Cache directory
+        ttl: Overrides for DEFAULT_TTL, e.g. {'info': timedelta(0)}
+        offline: If True, expired entries are still served (no network).
+    """
+
+    def __init__(self, root: str | Path = DEFAULT_CACHE_DIR,
+                 ttl: dict | None = None, offline: bool = False):
+        self.root = Path(root)
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.offline = offline
+
+    def _path(self, ticker: str, kind: str) -> Path:
+        return self.root / ticker.upper() / f"{kind}.pkl"
+
+    def _load(self, ticker: str, kind: str, payload: bool = True) -> dict | None:
+        """The entry's header, plus its 'data' when payload is True."""
+        path = self._path(ticker, kind)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+                if payload and 'data' not in entry:
+                    entry['data'] = pickle.load(f)
+        except Exception:
+            return None  # corrupt entry — treat as a miss
+        if 'empty' not in entry:  # single-pickle entry from before the header
+            entry['empty'] = len(entry['data']) == 0
+        return entry
+
+    def _fresh(self, kind: str, entry: dict) -> bool:
+        if self.offline:
+            return True
+        ttl = self.ttl.get(kind, timedelta(0))
+        if entry['empty']:
+            ttl = min(ttl, EMPTY_TTL)
+        return datetime.now(timezone.utc) - entry['fetched_at'] <= ttl
+
+    def get(self, ticker: str, kind: str):
+        """Return the cached payload, or None if missing or expired."""
+        entry = self._load(ticker, kind)
+        if entry is None or not self._fresh(kind, entry):
+            return None
+        return entry['data']
+
+    def missing(self, ticker: str, kinds) -> list[str]:
+        """Kinds that would have to be downloaded for a ticker (headers only)."""
+        missing = []
+        for kind in kinds:
+            entry = self._load(ticker, kind, payload=False)
+            if entry is None or not self._fresh(kind, entry):
+                missing.append(kind)
+        return missing
+
+    def invalidate(self, ticker: str, kinds) -> None:
+        """Drop entries so the next get() goes to the network."""
+        for kind in kinds:
+            path = self._path(ticker, kind)
+            if path.exists():
+                path.unlink()
+
+    def put(self, ticker: str, kind: str, value) -> None:
+        """Store a payload atomically (write to temp file, then rename)."""
+        path = self._path(ticker, kind)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = {
+            'fetched_at': datetime.now(timezone.utc),
+            'periods': _periods(value),
+            'empty': len(value) == 0,
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def periods(self, ticker: str, kind: str) -> list[str]:
+        """Fiscal periods held for a ticker's statement (most recent first)."""
+        entry = self._load(ticker, kind, payload=False)
+        return entry['periods'] if entry else []
+
+    def fetched_at(self, ticker: str, kind: str) -> datetime | None:
+        """When a ticker's entry was last downloaded, or None if never."""
+        entry = self._load(ticker, kind, payload=False)
+        return entry['fetched_at'] if entry else None
+
+    def tickers(self) -> list[str]:
+        """All tickers with at least one cached entry."""
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir())
@@ -0,0 +1,69 @@
+"""
+Batch engine: one malformed ticker is dropped, as compute_fcf() drops it,
+instead of failing the whole screen; periods are aligned by date across
+statements; a TTM column feeds the headline FCF but not the normalized
+(annual) yields.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_engine import HISTORY_COLUMNS, build_tensor, period_fcf, screen_batch
+from engine import compute_fcf
+
+
+def _statements(info) -> dict:
+    periods = pd.to_datetime(['2025-12-31', '2024-12-31', '2023-12-31'])
+    cashflow = pd.DataFrame({p: [100.0, -40.0, 20.0] for p in periods},
+                            index=['Operating Cash Flow', 'Capital Expenditure',
+                                   'Depreciation And Amortization'])
+    income = pd.DataFrame({p: [1000.0 - 50 * k, 5.0, 10.0] for k, p in enumerate(periods)},
+                          index=['Total Revenue', 'Interest Expense', 'Tax Provision'])
+    return {'info': info, 'cashflow': cashflow, 'income_stmt': income,
+            'balance_sheet': pd.DataFrame()}
+
+
+GOOD_INFO = {'marketCap': 1000.0, 'currentPrice': 10.0, 'sector': 'Technology'}
+
+
+@pytest.mark.parametrize('bad_info', [{'marketCap': 'N/A'}, None])
+def test_malformed_ticker_is_dropped(bad_info):
+    data = {'GOOD': _statements(GOOD_INFO), 'BAD': _statements(bad_info)}
+    assert compute_fcf('BAD', data['BAD']) is None
+
+    for mode, df in zip(('normal', 'conservative'), screen_batch(data)):
+        assert df['Ticker'].tolist() == ['GOOD']
+        expected = compute_fcf('GOOD', data['GOOD'], conservative=mode == 'conservative')
+        assert np.isclose(df['FCF Yield'].iloc[0], expected['FCF Yield'])
+
+
+def test_ttm_column_stays_out_of_history():
+    annual = _statements(GOOD_INFO)
+    ttm = dict(annual, ttm_columns={'cashflow', 'income_stmt'})
+    end = pd.Timestamp('2026-06-30')
+    ttm['cashflow'] = annual['cashflow'].copy()
+    ttm['cashflow'].insert(0, end, [300.0, -40.0, 20.0])
+    ttm['income_stmt'] = annual['income_stmt'].copy()
+    ttm['income_stmt'].insert(0, end, [np.nan, 5.0, 10.0])
+
+    for df_annual, df_ttm in zip(screen_batch({'GOOD': annual}), screen_batch({'GOOD': ttm})):
+        assert df_ttm['FCF Yield'].iloc[0] > df_annual['FCF Yield'].iloc[0]
+        for col in HISTORY_COLUMNS:
+            assert np.allclose(df_ttm[col], df_annual[col], equal_nan=True)
+
+
+def test_periods_are_aligned_by_date_across_statements():
+    data = _statements(GOOD_INFO)
+    periods = data['cashflow'].columns
+    data['cashflow'].loc['Operating Cash Flow'] = [100.0, 200.0, 300.0]
+    # No 2024 income statement: its interest / taxes must not shift onto 2024
+    data['income_stmt'] = data['income_stmt'][[periods[0], periods[2]]]
+
+    fcf = period_fcf(build_tensor({'GOOD': data}))[0]
+    assert fcf.tolist() == [100 - 40 - 5 - 10, 200 - 40, 300 - 40 - 5 - 10]
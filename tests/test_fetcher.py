@@ -0,0 +1,199 @@
+"""
+Fetch pipeline: token bucket rate and FIFO order, circuit breaker
+transitions, AIMD decreases and retries — on a fake clock, no network.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fetcher
+from engine import fetch_universe
+from fetcher import (AdaptiveConcurrency, CircuitBreaker, CircuitOpenError, TokenBucket,
+                     fetch_many)
+from statement_cache import StatementCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(fetcher.time, 'monotonic', fake)
+    return fake
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """asyncio.sleep returns at once; the delays asked for are recorded."""
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(fetcher.asyncio, 'sleep', sleep)
+    return delays
+
+
+# ─────────────────────────────────────────────
+# TokenBucket
+# ─────────────────────────────────────────────
+
+def test_bucket_spends_the_burst_then_queues_fifo_at_the_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=2)
+    waits = [bucket._reserve(1) for _ in range(5)]
+    assert waits == [0.0, 0.0, 0.5, 1.0, 1.5]
+
+
+def test_bucket_refills_at_the_rate_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2.0, capacity=2)
+    assert bucket._reserve(2) == 0.0
+    clock.now += 0.5                       # one token back
+    assert bucket._reserve(1) == 0.0
+    assert bucket._reserve(1) == 0.5
+    clock.now += 60                        # idle: capped at the burst
+    assert bucket._reserve(2) == 0.0
+    assert bucket._reserve(1) == 0.5
+
+
+# ─────────────────────────────────────────────
+# CircuitBreaker
+# ─────────────────────────────────────────────
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=10, max_cooldown=100)
+    breaker.record(True)
+    assert not breaker.is_open
+    breaker.record(True)
+    assert breaker.is_open and breaker.trips == 1
+
+    clock.now += 10                        # half-open: one throttle reopens it
+    assert not breaker.is_open
+    breaker.record(True)
+    assert breaker.is_open and breaker.trips == 2
+    clock.now += 19
+    assert breaker.is_open                 # cooldown doubled to 20s
+
+    clock.now += 1
+    breaker.record(False)                  # success after the cooldown closes it
+    assert not breaker.is_open and breaker.trips == 0
+    breaker.record(True)
+    assert not breaker.is_open             # threshold counts from zero again
+
+
+def test_breaker_gives_up_after_max_trips(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=10, max_cooldown=40, max_trips=2)
+    breaker.record(True)
+    clock.now += 10
+    breaker.record(True)
+    assert breaker.trips == 2
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.wait())
+
+    clock.now += 20 + 40                   # cooldown, then the give-up period
+    asyncio.run(breaker.wait())
+    assert breaker.trips == 0
+
+
+# ─────────────────────────────────────────────
+# AdaptiveConcurrency
+# ─────────────────────────────────────────────
+
+def test_aimd_decreases_once_per_congestion_event(clock):
+    limiter = AdaptiveConcurrency(initial=16, min_limit=1, max_limit=32)
+    started = clock.now
+    clock.now += 1
+    for _ in range(5):                     # every request in flight was throttled
+        limiter._adapt(started, 1.0, 'rate_limit', 1)
+    assert limiter.limit == 8
+
+    clock.now += 1
+    limiter._adapt(clock.now, 1.0, 'network', 1)   # started after the decrease
+    assert limiter.limit == 4
+
+
+def test_aimd_grows_by_about_one_per_window_of_successes(clock):
+    limiter = AdaptiveConcurrency(initial=4, min_limit=1, max_limit=32)
+    for _ in range(4):                     # + 1/limit each
+        limiter._adapt(clock.now, 0.1, None, 1)
+    assert 4.9 < limiter._limit < 5
+    for _ in range(2):
+        limiter._adapt(clock.now, 0.1, None, 1)
+    assert limiter.limit == 5
+
+
+def test_fixed_limit_never_adapts(clock):
+    limiter = AdaptiveConcurrency(initial=4, min_limit=4, max_limit=4)
+    limiter._adapt(clock.now, 1.0, 'rate_limit', 1)
+    assert limiter.limit == 4
+
+
+# ─────────────────────────────────────────────
+# fetch_many
+# ─────────────────────────────────────────────
+
+class Failure(Exception):
+    def __init__(self, kind: str):
+        self.kind = kind
+
+
+def test_only_transient_failures_are_retried(no_sleep):
+    calls = {}
+    outcome = {'OK': None, 'FLAKY': 'network', 'GONE': 'not_found', 'LATE': 'network'}
+
+    def fetch(ticker):
+        calls[ticker] = calls.get(ticker, 0) + 1
+        if ticker == 'LATE' and calls[ticker] == 2:
+            return ticker
+        if outcome[ticker]:
+            raise Failure(outcome[ticker])
+        return ticker
+
+    results, failures = fetch_many(
+        list(outcome), fetch, classify=lambda exc: exc.kind,
+        bucket=TokenBucket(rate=1000, capacity=1000),
+        breaker=CircuitBreaker(threshold=100), max_retries=3)
+
+    assert results == {'OK': 'OK', 'LATE': 'LATE'}
+    assert failures == {'FLAKY': 'network', 'GONE': 'not_found'}
+    assert calls == {'OK': 1, 'FLAKY': 3, 'GONE': 1, 'LATE': 2}
+    assert sorted(no_sleep) == [1, 1, 2]   # backoff 1s, 2s for FLAKY; 1s for LATE
+
+
+def test_tokens_are_drawn_only_with_a_slot_held():
+    limiter = AdaptiveConcurrency(2, min_limit=2, max_limit=2)
+    in_flight = []
+
+    class RecordingBucket(TokenBucket):
+        async def acquire(self, tokens: float = 1.0) -> None:
+            in_flight.append(limiter.in_flight)
+            await super().acquire(tokens)
+
+    results, failures = fetch_many(
+        [f'T{i}' for i in range(10)], lambda t: t,
+        bucket=RecordingBucket(rate=1000, capacity=1000),
+        breaker=CircuitBreaker(), concurrency=limiter)
+
+    assert len(results) == 10 and not failures
+    assert len(in_flight) == 10 and all(1 <= n <= 2 for n in in_flight)
+
+
+@pytest.mark.parametrize('adaptive', [False, True, AdaptiveConcurrency(4)])
+def test_progress_callback_takes_two_arguments(tmp_path, adaptive):
+    calls = []
+    cache = StatementCache(tmp_path, offline=True)         # every fetch misses
+    failures = {}
+    fetch_universe(['A', 'B', 'C'], lambda current, total: calls.append((current, total)),
+                   max_workers=2, cache=cache, failures=failures, adaptive=adaptive)
+    assert calls == [(1, 3), (2, 3), (3, 3)]
+    assert set(failures) == {'A', 'B', 'C'}
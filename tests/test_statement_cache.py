@@ -0,0 +1,68 @@
+"""
+StatementCache: per-kind expiry, and freshness checks that read only the
+entry header, never the pickled statements.
+"""
+
+import pickle
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import statement_cache
+from statement_cache import StatementCache
+
+
+def _age(cache: StatementCache, ticker: str, kind: str, days: float) -> None:
+    """Backdate an entry's fetch time, keeping its payload."""
+    entry = cache._load(ticker, kind)
+    path = cache._path(ticker, kind)
+    with open(path, 'wb') as f:
+        pickle.dump({'fetched_at': entry['fetched_at'] - timedelta(days=days),
+                     'periods': entry['periods'], 'empty': entry['empty']}, f)
+        pickle.dump(entry['data'], f)
+
+
+def test_missing_follows_ttl_and_empty_ttl(tmp_path):
+    cache = StatementCache(tmp_path)
+    cf = pd.DataFrame({pd.Timestamp('2024-12-31'): [1.0]})
+    cache.put('AAA', 'cashflow', cf)
+    cache.put('AAA', 'income_stmt', pd.DataFrame())
+    kinds = ['cashflow', 'income_stmt', 'balance_sheet']
+    assert cache.missing('AAA', kinds) == ['balance_sheet']
+
+    _age(cache, 'AAA', 'cashflow', 2)
+    _age(cache, 'AAA', 'income_stmt', 2)     # empty payloads expire after a day
+    assert cache.missing('AAA', kinds) == ['income_stmt', 'balance_sheet']
+    assert cache.get('AAA', 'cashflow').equals(cf)
+    assert cache.periods('AAA', 'cashflow') == ['2024-12-31']
+
+    assert StatementCache(tmp_path, offline=True).missing('AAA', kinds) == ['balance_sheet']
+
+
+def test_header_checks_do_not_unpickle_statements(tmp_path, monkeypatch):
+    cache = StatementCache(tmp_path)
+    cache.put('AAA', 'cashflow', pd.DataFrame({pd.Timestamp('2024-12-31'): [1.0]}))
+    loads = []
+    real_load = pickle.load
+    monkeypatch.setattr(statement_cache.pickle, 'load',
+                        lambda f: loads.append(1) or real_load(f))
+    assert cache.missing('AAA', ['cashflow']) == []
+    assert cache.fetched_at('AAA', 'cashflow') is not None
+    assert len(loads) == 2                   # one header each
+    assert not cache.get('AAA', 'cashflow').empty
+    assert len(loads) == 4
+
+
+def test_single_pickle_entries_still_load(tmp_path):
+    cache = StatementCache(tmp_path)
+    path = cache._path('AAA', 'info')
+    path.parent.mkdir(parents=True)
+    with open(path, 'wb') as f:
+        pickle.dump({'fetched_at': datetime.now(timezone.utc), 'periods': [],
+                     'data': {'currentPrice': 10.0}}, f)
+    assert cache.missing('AAA', ['info']) == []
+    assert cache.get('AAA', 'info') == {'currentPrice': 10.0}
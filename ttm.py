@@ -0,0 +1,303 @@
+"""
+ttm.py — Trailing-twelve-month line items from quarterly statements.
+
+By late in the fiscal year the latest annual statement is 9–11 months old.
+With --ttm, update_data.py keeps a rolling window of each ticker's last four
+quarters (the cash flow / income statement rows in engine.FIELD_ALIASES)
+plus its latest quarterly balance sheet, and screens on the TTM sums:
+
+  TTMLedger.due()      a new quarter is plausible (quarter closed + filing lag)
+  TTMLedger.refresh()  fetch the quarterly statements of due tickers and
+                       roll their windows forward
+  roll_forward()       take only the quarters newer than the window, drop the
+                       oldest ones and update the stored TTM sums — quarters
+                       already held are never re-read or refetched
+  with_ttm()           statements with the TTM column prepended as period 0
+
+Because the TTM values become the most recent column of the statements,
+engine.compute_fcf() and the batch engine read them without changes: line
+items missing from any of the four quarters, a window with a gap, or one
+older than the annual statement fall back to the annual values. Revenue
+growth and the normalized (multi-year) yields stay on annual data: with_ttm()
+records which statements got the extra column under 'ttm_columns'.
+
+Layout: .cache/ttm/<TICKER>/window.pkl. The ledger is state, not a cache
+(kept with --no-cache); losing it costs one quarterly fetch per ticker.
+"""
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from engine import FIELD_ALIASES, TRANSIENT_FAILURES, classify_failure
+from data_source import get_source
+from fetcher import fetch_many, AdaptiveConcurrency, DEFAULT_CONCURRENCY
+from instrumentation import get_tracer
+from statement_cache import StatementCache
+
+
+DEFAULT_TTM_DIR = Path(__file__).parent / ".cache" / "ttm"
+WINDOW_KIND = 'window'
+
+# yfinance attributes, one request each (Yahoo returns the last 4–5 quarters)
+QUARTERLY_KINDS = {
+    'cashflow': 'quarterly_cashflow',
+    'income_stmt': 'quarterly_income_stmt',
+    'balance_sheet': 'quarterly_balance_sheet',
+}
+FLOW_STATEMENTS = ('cashflow', 'income_stmt')   # summed over the window
+WINDOW = 4
+
+QUARTER = timedelta(days=91)
+QUARTER_GAP_DAYS = (80, 100)                 # consecutive quarter ends
+QUARTERLY_FILING_LAG = timedelta(days=30)    # earliest quarterly filings after quarter end
+RECHECK_INTERVAL = timedelta(days=3)         # while a new quarter is pending
+
+# No TTM unless the window resolves these (FCF from mixed periods is misleading)
+REQUIRED_FIELDS = ('fco', 'capex')
+
+# Statement → row labels kept in the window, in FIELD_ALIASES order
+ROWS = {statement: list(dict.fromkeys(label for pairs in FIELD_ALIASES.values()
+                                      for s, label in pairs if s == statement))
+        for statement in QUARTERLY_KINDS}
+
+
+def _end(column) -> str:
+    return pd.Timestamp(column).strftime('%Y-%m-%d')
+
+
+def _alias_rows(df: pd.DataFrame, statement: str, ends: list[str]) -> pd.DataFrame:
+    """Window rows of a quarterly statement for the given quarter ends (NaN if absent)."""
+    if df is None or df.empty:
+        return pd.DataFrame(np.nan, index=ROWS[statement], columns=ends)
+    df = df[~df.index.duplicated()]                    # duplicate labels: keep the first
+    df = df.loc[:, ~pd.Index([_end(c) for c in df.columns]).duplicated()]
+    out = df.reindex(index=ROWS[statement])
+    out.columns = [_end(c) for c in out.columns]
+    return out.reindex(columns=ends).apply(pd.to_numeric, errors='coerce')
+
+
+def contiguous(ends: list[str]) -> bool:
+    """True if the quarter ends (most recent first) are consecutive quarters."""
+    dates = pd.to_datetime(ends)
+    gaps = (dates[:-1] - dates[1:]).days
+    lo, hi = QUARTER_GAP_DAYS
+    return bool(((gaps >= lo) & (gaps <= hi)).all())
+
+
+# ─────────────────────────────────────────────
+# Window
+# ─────────────────────────────────────────────
+
+def roll_forward(window: dict | None, quarterly: dict, now: datetime) -> dict:
+    """
+    Merge a quarterly fetch into a ticker's window.
+
+    Args:
+        window: Stored window (None for a new ticker)
+        quarterly: {'cashflow' | 'income_stmt' | 'balance_sheet': quarterly DataFrame}
+        now: Check time
+
+    Returns:
+        The new window: 'ends' (most recent first, at most WINDOW), 'flows'
+        and 'sums' per flow statement, 'balance' + 'balance_end', and the
+        'checked' / 'rolled' timestamps.
+    """
+    window = dict(window) if window else {
+        'ends': [], 'flows': {}, 'sums': {}, 'balance': None, 'balance_end': None,
+        'checked': None, 'rolled': None}
+    window['checked'] = now.isoformat()
+
+    # The cash flow statement is the quarter clock, as in engine.latest_period()
+    cf = quarterly.get('cashflow')
+    latest = window['ends'][0] if window['ends'] else None
+    available = sorted({_end(c) for c in cf.columns}, reverse=True) \
+        if cf is not None and not cf.empty else []
+    new_ends = [e for e in available if latest is None or e > latest]
+
+    if new_ends:
+        ends = (new_ends + window['ends'])[:WINDOW]
+        flows, sums = {}, {}
+        for statement in FLOW_STATEMENTS:
+            fresh = _alias_rows(quarterly.get(statement), statement, new_ends)
+            held = window['flows'].get(statement)
+            frame = fresh if held is None else pd.concat([fresh, held], axis=1)
+            flows[statement] = frame[ends]
+            sums[statement] = flows[statement].sum(axis=1, min_count=WINDOW)
+        window.update(ends=ends, flows=flows, sums=sums, rolled=now.isoformat())
+
+    bs = quarterly.get('balance_sheet')
+    if bs is not None and not bs.empty:
+        end = max(_end(c) for c in bs.columns)
+        if window['balance_end'] is None or end > window['balance_end']:
+            window['balance'] = _alias_rows(bs, 'balance_sheet', [end])[end]
+            window['balance_end'] = end
+            window['rolled'] = now.isoformat()
+    return window
+
+
+def _resolve(values: dict[str, pd.Series]) -> dict[str, pd.Series]:
+    """
+    Resolve each field's aliases within the window and write the value under
+    every alias of that field, so the engines — which pick one alias per
+    field across all periods — find it in period 0 whichever alias they pick.
+    Unresolved fields stay absent (→ annual values).
+    """
+    out = {statement: {} for statement in values}
+    for pairs in FIELD_ALIASES.values():
+        pairs = [(s, label) for s, label in pairs if s in values]
+        found = (values[s].get(label, np.nan) for s, label in pairs)
+        value = next((v for v in found if pd.notna(v) and v != 0), None)
+        if value is not None:
+            for s, label in pairs:
+                out[s][label] = value
+    return {statement: pd.Series(v, dtype=float) for statement, v in out.items()}
+
+
+def _prepend(annual: pd.DataFrame, values: pd.Series, end: pd.Timestamp) -> pd.DataFrame:
+    """Annual statement with `values` inserted as the most recent column."""
+    values = values.dropna()
+    out = annual.copy()
+    out.insert(0, end, [values.get(k, np.nan) for k in out.index])
+    extra = values.index.difference(out.index)
+    if len(extra):
+        out = pd.concat([out, pd.DataFrame({end: values[extra]})])
+    return out
+
+
+def with_ttm(data: dict, window: dict | None) -> tuple[dict, bool]:
+    """
+    Statements with the window's TTM sums (and latest quarterly balance
+    sheet) as period 0, where they are newer than the annual ones. The
+    statements that got one are listed under data['ttm_columns'].
+
+    Returns:
+        (data, True if the flow items are TTM)
+    """
+    if not window:
+        return data, False
+    out = dict(data)
+
+    def newer(statement: str, end: str) -> bool:
+        annual = data[statement]
+        return annual.empty or end > max(_end(c) for c in annual.columns)
+
+    ends = window['ends']
+    if len(ends) < WINDOW or not contiguous(ends) \
+            or not all(newer(s, ends[0]) for s in FLOW_STATEMENTS):
+        return data, False
+    sums = _resolve(window['sums'])
+    if not all(label in sums[s] for f in REQUIRED_FIELDS for s, label in FIELD_ALIASES[f][:1]):
+        return data, False
+
+    for statement in FLOW_STATEMENTS:
+        out[statement] = _prepend(data[statement], sums[statement], pd.Timestamp(ends[0]))
+    out['ttm_columns'] = set(FLOW_STATEMENTS)
+    if window['balance'] is not None and newer('balance_sheet', window['balance_end']):
+        balance = _resolve({'balance_sheet': window['balance']})['balance_sheet']
+        out['balance_sheet'] = _prepend(data['balance_sheet'], balance,
+                                        pd.Timestamp(window['balance_end']))
+        out['ttm_columns'].add('balance_sheet')
+    return out, True
+
+
+# ─────────────────────────────────────────────
+# Ledger
+# ─────────────────────────────────────────────
+
+def fetch_quarterly(ticker: str) -> dict:
+    """The three quarterly statements of a ticker (one request each)."""
+    out = {}
+    for statement, kind in QUARTERLY_KINDS.items():
+        with get_tracer().span(ticker, f'fetch:{kind}'):
+            out[statement] = get_source().statement(ticker, kind)
+    return out
+
+
+class TTMLedger:
+    """
+    Per-ticker TTM windows on disk.
+
+    Args:
+        root: Ledger directory
+        offline: If True, windows are only read (refresh() fetches nothing)
+    """
+
+    def __init__(self, root: str | Path = DEFAULT_TTM_DIR, offline: bool = False):
+        self.store = StatementCache(root, offline=True)   # windows never expire
+        self.offline = offline
+
+    def get(self, ticker: str) -> dict | None:
+        return self.store.get(ticker, WINDOW_KIND)
+
+    def due(self, ticker: str, now: datetime | None = None) -> bool:
+        """True if a new quarter may have been filed since the last check."""
+        now = now or datetime.now(timezone.utc)
+        window = self.get(ticker)
+        if not window or not window['checked']:
+            return True
+        since_check = now - datetime.fromisoformat(window['checked'])
+        if not window['ends']:
+            return since_check >= QUARTER   # no quarterly filings on Yahoo
+        quarter_end = datetime.fromisoformat(window['ends'][0]).replace(tzinfo=timezone.utc)
+        next_filing = quarter_end + QUARTER + QUARTERLY_FILING_LAG
+        return now >= next_filing and since_check >= RECHECK_INTERVAL
+
+    def rolled_since(self, ticker: str, since: str | None) -> bool:
+        """True if the ticker's window changed after `since` (ISO time; None = ever)."""
+        window = self.get(ticker)
+        if not window or not window['rolled']:
+            return False
+        return since is None or \
+            datetime.fromisoformat(window['rolled']) > datetime.fromisoformat(since)
+
+    def refresh(self, tickers: list[str], now: datetime | None = None,
+                concurrency: int = DEFAULT_CONCURRENCY, adaptive: bool = False,
+                progress_callback=None) -> tuple[list[str], dict]:
+        """
+        Fetch the quarterly statements of tickers (shared rate limit; pass
+        the due() ones) and roll their windows forward. Failed tickers stay due.
+
+        Returns:
+            (tickers whose window gained a quarter, {ticker: failure kind})
+        """
+        if self.offline:
+            return [], {}
+        now = now or datetime.now(timezone.utc)
+        rolled = []
+        completed = 0
+        limiter = AdaptiveConcurrency(concurrency) if adaptive else concurrency
+
+        def done(ticker: str, quarterly: dict | None, kind: str | None) -> None:
+            nonlocal completed
+            completed += 1
+            if quarterly is not None:
+                before = self.get(ticker)
+                window = roll_forward(before, quarterly, now)
+                self.store.put(ticker, WINDOW_KIND, window)
+                if window['ends'] != (before['ends'] if before else []):
+                    rolled.append(ticker)
+            if progress_callback:
+                progress_callback(completed, len(tickers))
+
+        _, failed = fetch_many(tickers, fetch_quarterly, classify=classify_failure,
+                               transient=TRANSIENT_FAILURES,
+                               cost=lambda t: len(QUARTERLY_KINDS),
+                               concurrency=limiter, on_done=done)
+        return rolled, failed
+
+    def apply(self, data_by_ticker: dict[str, dict]) -> tuple[dict[str, dict], set[str]]:
+        """
+        with_ttm() for every ticker.
+
+        Returns:
+            ({ticker: statements}, tickers whose flow items are TTM)
+        """
+        out, ttm_tickers = {}, set()
+        for ticker, data in data_by_ticker.items():
+            out[ticker], ttm = with_ttm(data, self.get(ticker))
+            if ttm:
+                ttm_tickers.add(ticker)
+        return out, ttm_tickers
@@ -2,22 +2,83 @@
 update_data.py — Daily data fetcher for Screener FCF Yield "Antigravity"
 
 Runs via GitHub Actions every day at 06:00 UTC.
-Fetches all tickers, calculates FCF Yield (normal + conservative),
-and saves the results to data/screener_normal.csv and data/screener_conservative.csv.
+Fetches all tickers once, calculates FCF Yield (normal + conservative),
+and saves the results to data/screener_normal.parquet and
+data/screener_conservative.parquet (use --export-csv to also write CSVs).
 
-The Streamlit app reads from these CSVs — zero API calls at runtime.
+The Streamlit app reads from these snapshots — zero API calls at runtime.
+
+Raw statements are kept in a local StatementCache (.cache/statements), so
+only expired entries are downloaded. Use --offline to recompute everything
+from disk (e.g. after a methodology change) without touching the network.
+
+With --incremental, statements are only re-downloaded for tickers where a
+new fiscal period can plausibly exist (see fiscal_calendar.py); every other
+ticker only gets a price / market cap refresh on top of the last snapshot.
+
+Each run's rows are also appended to the history store (data/history/,
+monthly Parquet partitions — see history.py).
+
+Tickers that fail permanently (delisted, no statements) are kept in a
+NegativeCache (.cache/negative_cache.json) and skipped until it expires;
+failure counts by kind are written to the metadata.
+
+--source record saves every Yahoo response as a fixture; --source replay
+serves those fixtures back with simulated latency, 429s and failures (see
+data_source.py), so rate limits and concurrency can be tuned offline.
+
+With --ttm, flow line items come from the sum of each ticker's last four
+quarters where Yahoo has them (annual statements otherwise). Quarterly
+statements are only fetched once a new quarter can plausibly have been
+filed, and each fetch just rolls the ticker's window forward (see ttm.py).
+
+Each finished ticker is journaled durably (.cache/journal/, see journal.py).
+If a run dies midway, rerunning the same command on the same UTC date skips
+the journaled tickers and rebuilds the snapshots from journal + new fetches;
+--no-resume starts over.
+
+With --shards N, statement fetches are split across N worker processes
+(stable crc32 shard per ticker), each with its own rate budget, circuit
+breaker and Yahoo session; results are merged in ALL_TICKERS order, so the
+snapshots are identical to a single-process run.
+
+Every run records per-ticker timing spans (see instrumentation.py): their
+percentiles go into the metadata under "timings", and --trace exports the
+slowest tickers as a Chrome trace file.
 """
 
 import os
 import sys
-import time
+import math
+import zlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import Counter
+import numpy as np
 import pandas as pd
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from engine import calculate_fcf, classify_status, _calculate_with_retry
+from engine import fetch_universe, latest_period, STATEMENT_KINDS
+from batch_engine import screen_batch, reprice
+from fiscal_calendar import FiscalCalendar
+from quotes import download_prices, build_quotes, CHUNK_SIZE
+from fetcher import (configure_rate_limit, AdaptiveConcurrency, DEFAULT_RPS, DEFAULT_BURST,
+                     DEFAULT_CONCURRENCY)
+from statement_cache import StatementCache, DEFAULT_CACHE_DIR
+from journal import RunJournal, DEFAULT_JOURNAL_DIR
+from ttm import TTMLedger, DEFAULT_TTM_DIR
+from instrumentation import RunTrace, get_tracer, tracing
+from data_source import (DataSource, YahooSource, RecordingSource, ReplaySource,
+                         set_source, DEFAULT_FIXTURES_DIR)
+from negative_cache import NegativeCache, DEFAULT_NEGATIVE_CACHE_FILE
+from snapshot import (write_snapshot, write_metadata, read_metadata, export_csv,
+                      snapshot_path, csv_path, load_snapshot)
+from history import append_history
 
 # ─────────────────────────────────────────────
 # All 200 Tickers
@@ -90,73 +151,638 @@ TICKERS_US = [
 ALL_TICKERS = TICKERS_BR + TICKERS_US
 
 
-def fetch_all(tickers: list[str], conservative: bool) -> pd.DataFrame:
-    """Fetch data for all tickers with delays to avoid rate limiting."""
-    results = []
+def fetch_raw(tickers: list[str],
+              cache: StatementCache | None = None,
+              concurrency: int = DEFAULT_CONCURRENCY,
+              negative_cache: NegativeCache | None = None,
+              failures: dict | None = None,
+              adaptive: bool | AdaptiveConcurrency = False,
+              shards: int = 1,
+              shard_args: argparse.Namespace | None = None,
+              journal: RunJournal | None = None,
+              on_done=None,
+              progress_callback=None) -> dict[str, dict]:
+    """
+    Fetch raw statements for all tickers through the async pipeline. The
+    request rate is set by the shared token bucket (--rps), not by sleeps;
+    with adaptive, the in-flight limit follows Yahoo's latency and errors.
+    With shards > 1 the universe is split across worker processes (see
+    fetch_sharded; shard_args carries the CLI flags they rebuild state from).
+    With a journal, tickers it already holds are taken from it instead of
+    refetched, and every newly finished ticker is appended to it.
+    on_done / progress_callback are passed to fetch_universe() (single
+    process only: sharded fetches report per shard).
+
+    Returns:
+        {ticker: fetch_statements() output} for the tickers that succeeded;
+        failure kinds are added to `failures`.
+    """
+    done = journal.load() if journal is not None else {}
+    resumed = {t: done[t] for t in tickers if t in done}
+    if resumed:
+        print(f"  ↺ Resuming: {len(resumed)}/{len(tickers)} tickers already in journal "
+              f"{journal.run_id}", flush=True)
+        if failures is not None:
+            failures.update({t: kind for t, (_, kind) in resumed.items() if kind})
+    remaining = [t for t in tickers if t not in resumed]
+
+    if shards > 1 and len(remaining) > 1:
+        fetched = fetch_sharded(remaining, shards, shard_args, cache, concurrency,
+                                negative_cache, failures, adaptive, journal)
+    else:
+        fetched = _fetch_local(remaining, cache, concurrency, negative_cache, failures,
+                               adaptive, journal, on_done=on_done,
+                               progress_callback=progress_callback)
+    merged = {}
+    for t in tickers:   # input order, wherever each ticker's data came from
+        data = resumed[t][0] if t in resumed else fetched.get(t)
+        if data is not None:
+            merged[t] = data
+    return merged
+
+
+def _fetch_local(tickers: list[str],
+                 cache: StatementCache | None,
+                 concurrency: int,
+                 negative_cache: NegativeCache | None,
+                 failures: dict | None,
+                 adaptive: bool | AdaptiveConcurrency,
+                 journal: RunJournal | None = None,
+                 label: str = "",
+                 on_done=None,
+                 progress_callback=None) -> dict[str, dict]:
+    """fetch_raw() body for one process: progress lines + journaling."""
     total = len(tickers)
+    completed = 0
+    if isinstance(adaptive, AdaptiveConcurrency):
+        limiter = adaptive
+    else:
+        limiter = AdaptiveConcurrency(concurrency) if adaptive else None
+    in_flight = concurrency
+    prefix = f"{label} " if label else ""
 
-    for i, ticker in enumerate(tickers, 1):
-        print(f"  [{i}/{total}] {ticker}...", end=" ", flush=True)
-        row = _calculate_with_retry(ticker, conservative, max_retries=3)
-        if row is not None:
-            results.append(row)
-            print("✓")
-        else:
-            print("✗ (skipped)")
+    def report(ticker: str, data: dict | None, kind: str | None) -> None:
+        nonlocal completed
+        completed += 1
+        status = '✓' if kind is None else f'✗ ({kind})'
+        print(f"  {prefix}[{completed}/{total}] {ticker}... {status}", flush=True)
+        if journal is not None:
+            journal.record(ticker, data, kind)
+        if on_done:
+            on_done(ticker, data, kind)
 
-        # Rate limiting — 1.5s between each ticker
-        if i < total:
-            time.sleep(1.5)
+    def progress(current: int, total: int) -> None:
+        nonlocal in_flight
+        if limiter is not None and limiter.limit != in_flight:
+            print(f"  {prefix}↕ concurrency {in_flight} → {limiter.limit}", flush=True)
+            in_flight = limiter.limit
+        if progress_callback:
+            progress_callback(current, total)
 
-    if not results:
-        return pd.DataFrame()
+    # Only the adaptive pipeline changes its in-flight limit
+    return fetch_universe(tickers, progress if limiter or progress_callback else None,
+                          concurrency, cache,
+                          on_done=report, negative_cache=negative_cache,
+                          failures=failures, adaptive=limiter or False)
+
+
+# ─────────────────────────────────────────────
+# Sharded fetch (worker processes)
+# ─────────────────────────────────────────────
+
+SHARD_FAILURE = 'shard'   # the ticker's shard worker crashed (not journaled: retried)
+
+
+def shard_of(ticker: str, shards: int) -> int:
+    """Stable shard for a ticker (same shard every run while the count is fixed)."""
+    return zlib.crc32(ticker.encode()) % shards
+
+
+def shard_budget(args: argparse.Namespace, shards: int) -> tuple[float, float]:
+    """(rps, burst) of each shard: --shard-rps, or --rps split evenly."""
+    if args.shard_rps is not None:
+        return args.shard_rps, max(1.0, args.burst * args.shard_rps / args.rps)
+    return args.rps / shards, max(1.0, args.burst / shards)
+
+
+def _run_shard(shard: int, shards: int, tickers: list[str], args: argparse.Namespace,
+               cache: StatementCache | None, negative_cache: NegativeCache | None,
+               concurrency: int, adaptive: bool, journal: RunJournal | None) -> dict:
+    """Worker process body: one shard with its own rate budget, session and trace."""
+    configure_rate_limit(*shard_budget(args, shards))
+    set_source(build_source(args))
+    trace = RunTrace()
+    failures = {}
+    with tracing(trace):
+        data = _fetch_local(tickers, cache, concurrency, negative_cache, failures, adaptive,
+                            journal.for_writer(f"s{shard}") if journal is not None else None,
+                            label=f"[s{shard}]")
+    blocked = {}
+    if negative_cache is not None:
+        blocked = {t: negative_cache.entries[t] for t in tickers if t in negative_cache.entries}
+    return {"shard": shard, "data": data, "failures": failures, "blocked": blocked,
+            "trace": (trace.origin, trace.spans)}
+
+
+def fetch_sharded(tickers: list[str],
+                  shards: int,
+                  args: argparse.Namespace | None = None,
+                  cache: StatementCache | None = None,
+                  concurrency: int = DEFAULT_CONCURRENCY,
+                  negative_cache: NegativeCache | None = None,
+                  failures: dict | None = None,
+                  adaptive: bool = False,
+                  journal: RunJournal | None = None) -> dict[str, dict]:
+    """
+    Split the universe into `shards` worker processes, each with its own
+    token bucket (see shard_budget), circuit breaker and Yahoo session, all
+    sharing the on-disk statement cache. Results are merged back in input
+    ticker order, so the snapshots do not depend on which shard finishes first.
+    A shard whose worker crashes fails its own tickers (kind SHARD_FAILURE,
+    retried by the next run) and the other shards' results are kept.
+    `args` are the CLI flags workers rebuild their state from (None = the
+    defaults).
+    """
+    args = args if args is not None else parse_args([])
+    parts = [[] for _ in range(shards)]
+    for t in tickers:
+        parts[shard_of(t, shards)].append(t)
+    rps, _ = shard_budget(args, shards)
+    print(f"  {shards} shards × {rps:g} req/s: " + " · ".join(
+        f"s{i} {len(p)}" for i, p in enumerate(parts)), flush=True)
+
+    merged = {}
+    ctx = multiprocessing.get_context("spawn")   # no forked asyncio / thread state
+    with ProcessPoolExecutor(max_workers=shards, mp_context=ctx) as pool:
+        futures = {pool.submit(_run_shard, i, shards, part, args, cache, negative_cache,
+                               concurrency, adaptive, journal): i
+                   for i, part in enumerate(parts) if part}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"  ✗ shard s{shard} crashed ({type(e).__name__}: {e}) — "
+                      f"{len(parts[shard])} tickers failed", flush=True)
+                if failures is not None:
+                    failures.update({t: SHARD_FAILURE for t in parts[shard]})
+                continue
+            merged.update(result["data"])
+            if failures is not None:
+                failures.update(result["failures"])
+            if negative_cache is not None:
+                for t in parts[result["shard"]]:
+                    if t in result["blocked"]:
+                        negative_cache.entries[t] = result["blocked"][t]
+                    else:
+                        negative_cache.discard(t)
+            trace = get_tracer()
+            if isinstance(trace, RunTrace):
+                trace.merge(*result["trace"])
+            print(f"  ✓ shard s{result['shard']}: {len(result['data'])}/"
+                  f"{len(parts[result['shard']])} tickers", flush=True)
+    return {t: merged[t] for t in tickers if t in merged}
+
+
+def fetch_all(tickers: list[str],
+              cache: StatementCache | None = None,
+              concurrency: int = DEFAULT_CONCURRENCY,
+              negative_cache: NegativeCache | None = None,
+              adaptive: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Fetch all tickers once and compute both modes for the whole universe
+    with the batch engine.
+
+    Returns:
+        (df_normal, df_conservative)
+    """
+    return screen_batch(fetch_raw(tickers, cache, concurrency, negative_cache,
+                                  adaptive=adaptive))
+
+
+def refresh_quotes(tickers: list[str],
+                   cache: StatementCache | None,
+                   previous: pd.DataFrame) -> dict[str, dict]:
+    """
+    Bulk price refresh for tickers whose statements are current.
+
+    Market cap = shares × price, with shares from the cached profile or
+    implied by the previous snapshot (Market Cap / Preço).
+    """
+    shares = {}
+    if not previous.empty:
+        prev = previous.set_index('Ticker')
+        implied = (prev['Market Cap'] / prev['Preço']).replace([np.inf, -np.inf], np.nan)
+        shares = implied.dropna().to_dict()
+    if cache is not None:
+        for t in tickers:
+            profile = cache.get(t, 'profile')
+            if profile and profile.get('shares'):
+                shares[t] = profile['shares']
+
+    prices = download_prices(tickers)
+    quotes = build_quotes(prices, shares)
+    n_requests = math.ceil(len(tickers) / CHUNK_SIZE)
+    print(f"  {len(prices)}/{len(tickers)} prices in {n_requests} requests · "
+          f"{len(quotes)} repriced, {len(tickers) - len(quotes)} kept previous quote")
+    return quotes
+
+
+def refresh_ttm(tickers: list[str],
+                ledger: TTMLedger,
+                now: datetime,
+                concurrency: int = DEFAULT_CONCURRENCY,
+                adaptive: bool = False,
+                negative_cache: NegativeCache | None = None) -> list[str]:
+    """
+    Fetch quarterly statements where a new quarter is plausible and roll
+    those TTM windows forward (see ttm.py).
 
-    df = pd.DataFrame(results)
-    df['Status'] = df.apply(classify_status, axis=1)
+    Returns:
+        Tickers whose window gained a quarter
+    """
+    due = [t for t in tickers if ledger.due(t, now)
+           and (negative_cache is None or not negative_cache.get(t))]
+    print(f"\n── Quarterly statements (TTM): {len(due)} tickers due ──")
+    if ledger.offline or not due:
+        return []
+    rolled, failed = ledger.refresh(due, now, concurrency, adaptive)
+    print(f"  {len(rolled)} rolled forward · {len(failed)} failed (due again next run)")
+    return rolled
+
+
+def screen(data: dict[str, dict],
+           ledger: TTMLedger | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    screen_batch() on annual statements, or on TTM ones where the ledger
+    has a usable window (then the 'Base' column says which).
+
+    Returns:
+        (df_normal, df_conservative)
+    """
+    if ledger is None:
+        return screen_batch(data)
+    data, ttm_tickers = ledger.apply(data)
+    frames = screen_batch(data)
+    for df in frames:
+        if not df.empty:
+            df['Base'] = np.where(df['Ticker'].isin(ttm_tickers), 'TTM', 'Anual')
+    return frames
+
+
+def _merge(*frames: pd.DataFrame) -> pd.DataFrame:
+    """Concatenate ranked frames and re-rank by FCF Yield."""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
     df.sort_values('FCF Yield', ascending=False, inplace=True)
     df.reset_index(drop=True, inplace=True)
     return df
 
 
-def main():
+def fetch_cutoff(now: datetime, journal: RunJournal | None = None) -> datetime:
+    """
+    Earliest download time that belongs to this run: `now`, or the start of
+    the UTC day when resuming a journal (the run began in an earlier process).
+    Call it before fetching, while the journal holds only resumed tickers.
+    """
+    if journal is not None and journal.load():
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return now
+
+
+def record_downloaded(calendar: FiscalCalendar,
+                      data: dict[str, dict],
+                      cache: StatementCache | None,
+                      now: datetime,
+                      since: datetime) -> None:
+    """
+    Store the latest fiscal period of the tickers whose statements were
+    downloaded at or after `since` (see fetch_cutoff). Statements served from
+    the statement cache can predate a new filing, so they must not restart
+    the ticker's filing clock.
+    """
+    for t, d in data.items():
+        fetched = cache.fetched_at(t, 'cashflow') if cache is not None else now
+        if fetched is not None and fetched >= since:
+            calendar.record(t, latest_period(d), now)
+
+
+def update_incremental(tickers: list[str],
+                       cache: StatementCache | None,
+                       calendar: FiscalCalendar,
+                       now: datetime,
+                       quotes_only: bool = False,
+                       concurrency: int = DEFAULT_CONCURRENCY,
+                       negative_cache: NegativeCache | None = None,
+                       failures: dict | None = None,
+                       adaptive: bool | AdaptiveConcurrency = False,
+                       shards: int = 1,
+                       shard_args: argparse.Namespace | None = None,
+                       journal: RunJournal | None = None,
+                       ledger: TTMLedger | None = None,
+                       data_dir: str | Path = "data",
+                       on_done=None,
+                       progress_callback=None
+                       ) -> tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    Re-download statements only where a new filing is plausible; reprice
+    everyone else from the previous snapshots (in data_dir).
+
+    With quotes_only, statements are fetched only for tickers missing from
+    the previous snapshots. With a TTM ledger, quarterly statements are
+    fetched where a new quarter is plausible (none if the ledger is offline),
+    and tickers whose window rolled forward since the last snapshot are
+    recomputed too. on_done / progress_callback follow the statement
+    fetches (see fetch_raw).
+
+    Returns:
+        (df_normal, df_conservative, stats)
+    """
+    prev_normal = load_snapshot("normal", data_dir)
+    prev_conservative = load_snapshot("conservative", data_dir)
+    known = set()
+    if not prev_normal.empty and not prev_conservative.empty:
+        known = set(prev_normal['Ticker']) & set(prev_conservative['Ticker'])
+
+    stale = [t for t in tickers
+             if t not in known or (not quotes_only and calendar.needs_statements(t, now))]
+
+    # Recompute (from cached annual statements) where a new quarter came in
+    rolled = set()
+    if ledger is not None and not quotes_only:
+        refresh_ttm(tickers, ledger, now, concurrency, adaptive, negative_cache)
+        since = read_metadata(data_dir).get("last_updated")
+        rolled = {t for t in known if ledger.rolled_since(t, since)}
+    full_set = set(stale) | rolled
+    full = [t for t in tickers if t in full_set]
+    quote_only = [t for t in tickers if t not in full_set]
+
+    # The calendar, not the cache TTL, decides when statements are stale here
+    # (tickers this run already journaled were refetched before a restart)
+    journaled = journal.load() if journal is not None else {}
+    since = fetch_cutoff(now, journal)
+    if cache is not None and not cache.offline:
+        for t in stale:
+            if t in calendar.entries and t not in journaled:
+                cache.invalidate(t, STATEMENT_KINDS[1:])
+
+    print(f"── Statements: {len(full)} tickers"
+          f"{f' ({len(rolled)} for a new quarter)' if rolled else ''} ──")
+    data = fetch_raw(full, cache, concurrency, negative_cache, failures, adaptive,
+                     shards, shard_args, journal, on_done, progress_callback)
+    record_downloaded(calendar, data, cache, now, since)
+    new_normal, new_conservative = screen(data, ledger)
+
+    print(f"\n── Quotes only: {len(quote_only)} tickers ──")
+    quotes = {}
+    if quote_only and not (cache is not None and cache.offline):
+        quotes = refresh_quotes(quote_only, cache, prev_normal)
+
+    # Previous rows for repriced tickers and for statement fetches that failed
+    carried = set(quote_only) | (full_set - set(data))
+
+    def carry(prev: pd.DataFrame) -> pd.DataFrame:
+        if prev.empty:
+            return prev
+        return reprice(prev[prev['Ticker'].isin(carried)], quotes)
+
+    stats = {
+        "tickers_statements_fetched": len(data),
+        "tickers_repriced": len(quotes),
+    }
+    merged = []
+    for new, prev in ((new_normal, prev_normal), (new_conservative, prev_conservative)):
+        df = _merge(new, carry(prev))
+        if 'Base' in df.columns:   # rows screened before --ttm (or without it)
+            df['Base'] = df['Base'].fillna('Anual')
+        merged.append(df)
+    return (*merged, stats)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Daily data update for Screener FCF Yield")
+    parser.add_argument("--offline", action="store_true",
+                        help="Recompute from the statement cache only (no network)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore the statement cache and download everything")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR),
+                        help="Statement cache directory")
+    parser.add_argument("--statement-ttl-days", type=float, default=30,
+                        help="Expiry of cached annual statements")
+    parser.add_argument("--info-ttl-hours", type=float, default=12,
+                        help="Expiry of cached quote info")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only refetch statements where a new filing is plausible; "
+                             "reprice everyone else")
+    parser.add_argument("--quotes-only", action="store_true",
+                        help="Incremental run that only refreshes prices / market caps")
+    parser.add_argument("--rps", type=float, default=DEFAULT_RPS,
+                        help="Yahoo requests per second (shared token bucket)")
+    parser.add_argument("--burst", type=float, default=DEFAULT_BURST,
+                        help="Requests allowed in a burst after idle time")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum requests in flight (starting point with --adaptive)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Adjust requests in flight from observed latency and "
+                             "rate-limit / network errors")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Worker processes to split the universe across, each with "
+                             "its own rate budget and Yahoo session")
+    parser.add_argument("--shard-rps", type=float,
+                        help="Requests per second of each shard (default: --rps / --shards)")
+    parser.add_argument("--ttm", action="store_true",
+                        help="Screen on trailing-twelve-month sums of the last four "
+                             "quarters where available (annual otherwise)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Discard today's journal of an interrupted run and start over")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Ignore the negative cache and retry every failing ticker")
+    parser.add_argument("--export-csv", action="store_true",
+                        help="Also write CSV exports next to the Parquet snapshots")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="Write a Chrome trace-event JSON of the slowest tickers")
+    parser.add_argument("--trace-slowest", type=int, default=20,
+                        help="Tickers to include in --trace")
+    parser.add_argument("--source", choices=("live", "record", "replay"), default="live",
+                        help="Yahoo live, live + save responses as fixtures, or replay "
+                             "fixtures with simulated server behaviour (no network)")
+    parser.add_argument("--fixtures", default=str(DEFAULT_FIXTURES_DIR),
+                        help="Fixture directory for --source record / replay")
+    parser.add_argument("--replay-latency", type=float, default=0.3,
+                        help="Replay: mean seconds per request")
+    parser.add_argument("--replay-jitter", type=float, default=0.5,
+                        help="Replay: lognormal spread of the latency")
+    parser.add_argument("--replay-rps", type=float,
+                        help="Replay: server budget per second; excess requests get 429")
+    parser.add_argument("--replay-slots", type=int,
+                        help="Replay: requests the server handles at once (others queue)")
+    parser.add_argument("--replay-failure-rate", type=float, default=0.0,
+                        help="Replay: probability of a network error per request")
+    parser.add_argument("--replay-seed", type=int, help="Replay: RNG seed")
+    return parser.parse_args(argv)
+
+
+def build_source(args: argparse.Namespace) -> DataSource:
+    """Create the DataSource described by the CLI flags."""
+    if args.source == "record":
+        return RecordingSource(YahooSource(), args.fixtures)
+    if args.source == "replay":
+        return ReplaySource(args.fixtures, latency=args.replay_latency,
+                            jitter=args.replay_jitter, rps=args.replay_rps,
+                            slots=args.replay_slots, failure_rate=args.replay_failure_rate,
+                            seed=args.replay_seed)
+    return YahooSource()
+
+
+def build_cache(args: argparse.Namespace) -> StatementCache | None:
+    """Create the StatementCache described by the CLI flags."""
+    if args.no_cache:
+        return None
+    statement_ttl = timedelta(days=args.statement_ttl_days)
+    return StatementCache(
+        args.cache_dir,
+        ttl={
+            'info': timedelta(hours=args.info_ttl_hours),
+            'cashflow': statement_ttl,
+            'income_stmt': statement_ttl,
+            'balance_sheet': statement_ttl,
+        },
+        offline=args.offline,
+    )
+
+
+def build_negative_cache(args: argparse.Namespace) -> NegativeCache | None:
+    """Create the NegativeCache described by the CLI flags."""
+    if args.no_cache:
+        return None
+    negative_cache = NegativeCache(Path(args.cache_dir).parent / DEFAULT_NEGATIVE_CACHE_FILE.name)
+    if args.retry_failed:
+        negative_cache.entries.clear()
+    return negative_cache
+
+
+def build_journal(args: argparse.Namespace, now: datetime) -> RunJournal | None:
+    """Journal of today's run of this kind (resumed unless --no-resume)."""
+    if args.offline:
+        return None   # nothing to lose: an offline run only reads the cache
+    kind = "quotes" if args.quotes_only else "incremental" if args.incremental else "full"
+    journal = RunJournal(Path(args.cache_dir).parent / DEFAULT_JOURNAL_DIR.name,
+                         f"{now:%Y-%m-%d}-{kind}")
+    journal.prune()
+    if args.no_resume:
+        journal.discard()
+    return journal
+
+
+def build_ledger(args: argparse.Namespace) -> TTMLedger | None:
+    """TTM ledger next to the statement cache (--ttm only)."""
+    if not args.ttm:
+        return None
+    return TTMLedger(Path(args.cache_dir).parent / DEFAULT_TTM_DIR.name, offline=args.offline)
+
+
+def main(argv: list[str] | None = None):
     """Main entry point for the daily data update."""
+    args = parse_args(argv)
     os.makedirs("data", exist_ok=True)
-
+    cache = build_cache(args)
+    negative_cache = build_negative_cache(args)
+    failures = {}
+    configure_rate_limit(args.rps, args.burst)
+    source = build_source(args)
+    set_source(source)
     now = datetime.now(timezone.utc)
     print(f"=== Screener FCF Yield — Data Update ===")
     print(f"    Date: {now.strftime('%Y-%m-%d %H:%M UTC')}")
     print(f"    Tickers: {len(ALL_TICKERS)}")
+    print(f"    Cache: {'disabled' if cache is None else cache.root}"
+          f"{' (offline)' if args.offline else ''}")
+    print(f"    Rate limit: {args.rps:g} req/s · {args.concurrency} in flight"
+          f"{' (adaptive)' if args.adaptive else ''}"
+          f"{f' · {args.shards} shards' if args.shards > 1 else ''}")
+    print(f"    Source: {args.source}"
+          f"{'' if args.source == 'live' else f' ({args.fixtures})'}")
     print()
 
-    # ── Normal Mode ──────────────────────
-    print("── Fetching Normal Mode ──")
-    df_normal = fetch_all(ALL_TICKERS, conservative=False)
-    if not df_normal.empty:
-        df_normal.to_csv("data/screener_normal.csv", index=False)
-        print(f"\n✓ Saved data/screener_normal.csv ({len(df_normal)} tickers)")
-    else:
-        print("\n✗ No data fetched for normal mode")
+    calendar = FiscalCalendar("data/fiscal_calendar.json")
+    journal = build_journal(args, now)
+    ledger = build_ledger(args)
 
+    trace = RunTrace()
+    with tracing(trace):
+        if args.incremental or args.quotes_only:
+            # ── Incremental (statements where needed, quotes elsewhere) ──
+            df_normal, df_conservative, stats = update_incremental(
+                ALL_TICKERS, cache, calendar, now,
+                quotes_only=args.quotes_only, concurrency=args.concurrency,
+                negative_cache=negative_cache, failures=failures, adaptive=args.adaptive,
+                shards=args.shards, shard_args=args, journal=journal, ledger=ledger)
+        else:
+            # ── Fetch (single pass, both modes) ──
+            print("── Fetching Normal + Conservative Mode ──")
+            since = fetch_cutoff(now, journal)
+            data = fetch_raw(ALL_TICKERS, cache, args.concurrency, negative_cache, failures,
+                             args.adaptive, args.shards, args, journal)
+            record_downloaded(calendar, data, cache, now, since)
+            if ledger is not None:
+                refresh_ttm(list(data), ledger, now, args.concurrency, args.adaptive)
+            df_normal, df_conservative = screen(data, ledger)
+            stats = {"tickers_statements_fetched": len(data), "tickers_repriced": 0}
+    if not args.offline:
+        calendar.save()  # offline runs learn nothing new about filings
+        if negative_cache is not None:
+            negative_cache.save()
+    if isinstance(source, ReplaySource):
+        print(f"\n── Replay server: {source.stats()} ──")
+    failure_counts = dict(Counter(failures.values()))
+    if failure_counts:
+        print("\n── Failures ──")
+        for kind, n in sorted(failure_counts.items()):
+            print(f"  {kind}: {n}")
+    timings = trace.summary()
+    print("\n── Timings (p50 / p90 / max ms) ──")
+    for name, t in timings['spans'].items():
+        print(f"  {name:<20} {t['p50_ms']:>8} / {t['p90_ms']:>8} / {t['max_ms']:>8}"
+              f"  ×{t['count']}")
+    print(f"  retries: {timings['retries']} ({timings['tickers_retried']} tickers)")
+    if timings['slowest']:
+        print("  slowest: " + ", ".join(f"{t} {s:.1f}s" for t, s in timings['slowest'].items()))
+    if args.trace:
+        print(f"✓ Trace written to {trace.export_trace(args.trace, args.trace_slowest)}")
     print()
 
-    # ── Conservative Mode ────────────────
-    print("── Fetching Conservative Mode ──")
-    df_conservative = fetch_all(ALL_TICKERS, conservative=True)
-    if not df_conservative.empty:
-        df_conservative.to_csv("data/screener_conservative.csv", index=False)
-        print(f"\n✓ Saved data/screener_conservative.csv ({len(df_conservative)} tickers)")
-    else:
-        print("\n✗ No data fetched for conservative mode")
+    # ── Snapshots ────────────────────────
+    for mode, df in (("normal", df_normal), ("conservative", df_conservative)):
+        if df.empty:
+            print(f"✗ No data fetched for {mode} mode")
+            continue
+        path = snapshot_path(mode, "data")
+        write_snapshot(df, path)
+        print(f"✓ Saved {path} ({len(df)} tickers)")
+        if args.export_csv:
+            export_csv(df, csv_path(mode, "data"))
+            print(f"✓ Exported {csv_path(mode, 'data')}")
+        print(f"✓ Appended to {append_history(df, mode, now.date(), 'data/history')}")
 
     # ── Metadata ─────────────────────────
     meta = {
         "last_updated": now.isoformat(),
+        "basis": "ttm" if ledger is not None else "annual",
+        "tickers_ttm": int((df_normal['Base'] == 'TTM').sum()) if 'Base' in df_normal else 0,
         "tickers_total": len(ALL_TICKERS),
         "tickers_normal_ok": len(df_normal) if not df_normal.empty else 0,
         "tickers_conservative_ok": len(df_conservative) if not df_conservative.empty else 0,
+        **stats,
+        "failures": failure_counts,
+        "timings": timings,
     }
-    pd.Series(meta).to_json("data/metadata.json")
-    print(f"\n✓ Metadata saved to data/metadata.json")
+    meta = write_metadata(meta, "data")
+    print(f"\n✓ Metadata saved to data/metadata.json (data version {meta['data_version']}, "
+          f"generation {meta['generation']})")
+    if journal is not None:
+        journal.discard()   # run complete: nothing left to resume
     print(f"\n=== Done! ===")
 
 